@@ -1,24 +1,198 @@
-import requests
+import argparse
+import asyncio
+import codecs
+import csv
+import itertools
 import json
+import re
+import sqlite3
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from balance_providers import ESPLORA_URL, Pacer, ProviderChain, ProviderError, make_providers
+from ratelimit import RETRY_STATUS, TokenBucket, retry_after, retry_delay
+
+RAWADDR_URL = "https://blockchain.info/rawaddr/{address}"
+SUMMARY_FIELDS = ("final_balance", "total_received", "total_sent", "n_tx")
+PAGE_SIZE = 50  # rawaddr returns at most 50 transactions per request
+CSV_FIELDS = ["address", "balance_satoshis", "balance_btc", "total_received",
+              "total_sent", "transaction_count", "source", "error"]
+
+
+def balance_info_from(address, data):
+    # Create balance information
+    return {
+        "address": address,
+        "balance_satoshis": data["final_balance"],
+        "balance_btc": data["final_balance"] / 100000000,
+        "total_received": data["total_received"],
+        "total_sent": data["total_sent"],
+        "transaction_count": data["n_tx"]
+    }
+
+
+# ---- streaming summary ----
+# rawaddr puts the summary first and the full transaction list ("txs") last,
+# which for busy addresses is hundreds of MB. The parser below reads the
+# top-level object incrementally, keeps only scalar fields, skips nested
+# values without storing them and stops as soon as it has what it needs, so
+# the rest of the body is never downloaded.
+
+_SCALAR = re.compile(r"[^\s,\]}]+")  # number / true / false / null up to a delimiter
+_STRUCTURAL = re.compile(r'["\[\]{}]')
+
+
+class SummaryParser:
+    def __init__(self, wanted=SUMMARY_FIELDS, stop_keys=("txs",)):
+        self.wanted = set(wanted)
+        self.stop_keys = set(stop_keys)
+        self.fields = {}
+        self.done = False
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._state = "start"
+        self._key = None
+        self._depth = 0
+
+    def feed(self, data):
+        """Consume the next chunk; returns True once nothing more is needed."""
+        if not self.done:
+            self._buf += self._decoder.decode(data)
+            self._parse()
+        return self.done
+
+    def _finish(self):
+        self.done = True
+        self._buf = ""
+
+    def _parse(self):
+        buf, pos, n = self._buf, 0, len(self._buf)
+        while not self.done:
+            if self._state == "skip":
+                # inside a nested value: only brackets and strings matter
+                m = _STRUCTURAL.search(buf, pos)
+                if m is None:
+                    pos = n
+                    break
+                ch, pos = m.group(), m.end()
+                if ch == '"':
+                    try:
+                        _, pos = json.decoder.scanstring(buf, pos)
+                    except ValueError:
+                        pos = m.start()  # string continues in the next chunk
+                        break
+                elif ch in "[{":
+                    self._depth += 1
+                else:
+                    self._depth -= 1
+                    if self._depth == 0:
+                        self._state = "comma"
+                continue
+
+            while pos < n and buf[pos] in " \t\r\n":
+                pos += 1
+            if pos >= n:
+                break
+            ch = buf[pos]
+            if self._state == "start":
+                if ch != "{":
+                    raise ValueError("Expected a JSON object")
+                self._state, pos = "key", pos + 1
+            elif self._state == "key":
+                if ch == "}":
+                    self._finish()
+                    break
+                if ch != '"':
+                    raise ValueError(f"Unexpected {ch!r} in JSON object")
+                try:
+                    self._key, pos = json.decoder.scanstring(buf, pos + 1)
+                except ValueError:
+                    break
+                self._state = "colon"
+            elif self._state == "colon":
+                if ch != ":":
+                    raise ValueError(f"Unexpected {ch!r} after key")
+                self._state, pos = "value", pos + 1
+            elif self._state == "value":
+                if self._key in self.stop_keys:
+                    self._finish()
+                    break
+                if ch in "[{":
+                    self._state, self._depth, pos = "skip", 1, pos + 1
+                    continue
+                if ch == '"':
+                    try:
+                        value, pos = json.decoder.scanstring(buf, pos + 1)
+                    except ValueError:
+                        break
+                else:
+                    m = _SCALAR.match(buf, pos)
+                    if m is None:
+                        raise ValueError(f"Unexpected {ch!r} where a value was expected")
+                    if m.end() >= n:
+                        break  # token may continue in the next chunk
+                    value, pos = json.loads(m.group()), m.end()
+                self.fields[self._key] = value
+                self._state = "comma"
+                if self.wanted and self.wanted <= self.fields.keys():
+                    self._finish()
+                    break
+            elif self._state == "comma":
+                if ch == "}":
+                    self._finish()
+                    break
+                if ch != ",":
+                    raise ValueError(f"Unexpected {ch!r} after value")
+                self._state, pos = "key", pos + 1
+        if not self.done:
+            self._buf = buf[pos:]
+
+
+def fetch_summary(address, session=requests, url=RAWADDR_URL, timeout=30, chunk_size=16384):
+    # the connection is closed early instead of draining the transaction list
+    with session.get(url.format(address=address), stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        parser = SummaryParser()
+        for chunk in response.iter_content(chunk_size):
+            if parser.feed(chunk):
+                break
+    missing = [k for k in SUMMARY_FIELDS if k not in parser.fields]
+    if missing:
+        raise KeyError(missing[0])
+    return parser.fields
+
+
+def iter_transactions(address, session=requests, url=RAWADDR_URL, page_size=PAGE_SIZE, timeout=30):
+    # history page by page (newest first); only one page is held at a time.
+    # A transaction arriving mid-walk shifts offsets by one, so hashes of the
+    # previous page are remembered to drop the repeat.
+    offset, previous = 0, set()
+    while True:
+        response = session.get(url.format(address=address),
+                               params={"limit": page_size, "offset": offset}, timeout=timeout)
+        response.raise_for_status()
+        page = response.json()["txs"]
+        current = set()
+        for tx in page:
+            current.add(tx["hash"])
+            if tx["hash"] not in previous:
+                yield tx
+        if len(page) < page_size:
+            return
+        offset += len(page)
+        previous = current
+
 
 def get_bitcoin_balance(address):
     try:
         # Get data from blockchain.info API
-        url = f"https://blockchain.info/rawaddr/{address}"
-        response = requests.get(url)
-        response.raise_for_status()
-        
-        data = response.json()
+        data = fetch_summary(address)
         
-        # Create balance information
-        balance_info = {
-            "address": address,
-            "balance_satoshis": data["final_balance"],
-            "balance_btc": data["final_balance"] / 100000000,
-            "total_received": data["total_received"],
-            "total_sent": data["total_sent"],
-            "transaction_count": data["n_tx"]
-        }
+        balance_info = balance_info_from(address, data)
         
         # Save to JSON file
         filename = f"bitcoin_balance_{address}.json"
@@ -37,19 +211,366 @@ def get_bitcoin_balance(address):
         print(f"Error: {e}")
         return None, None
 
+
+# ---- bulk mode ----
+# Many addresses at once: a fixed number of asyncio workers share one pooled
+# requests.Session (each blocking GET runs in a thread), a token bucket keeps
+# the request rate under the API limit, and 429/5xx answers are retried with
+# backoff (Retry-After is honoured). Results are streamed into one JSONL or
+# CSV file as they arrive, so memory does not grow with the address list.
+
+class BulkFetcher:
+    def __init__(self, concurrency=8, rate=5.0, retries=5, backoff=1.0, max_backoff=60.0,
+                 timeout=30.0, url=RAWADDR_URL):
+        self.concurrency = concurrency
+        self.bucket = TokenBucket(rate)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.url = url
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.stats = {"requests": 0, "retries": 0, "ok": 0, "failed": 0}
+
+    def _delay(self, attempt, response):
+        server_delay = retry_after(response.headers) if response is not None else None
+        return retry_delay(attempt, self.backoff, self.max_backoff, server_delay)
+
+    async def fetch(self, address):
+        error = None
+        for attempt in range(self.retries + 1):
+            await self.bucket.acquire()
+            response = None
+            try:
+                self.stats["requests"] += 1
+                # limit=0: summary fields only, without the transaction list
+                response = await asyncio.to_thread(
+                    self.session.get, self.url.format(address=address), params={"limit": 0},
+                    timeout=self.timeout)
+                if response.status_code not in RETRY_STATUS:
+                    response.raise_for_status()
+                    return balance_info_from(address, response.json())
+                error = f"HTTP {response.status_code}"
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = f"{type(e).__name__}: {e}"
+            except requests.exceptions.RequestException as e:
+                return {"address": address, "error": str(e)}
+            except (KeyError, ValueError) as e:
+                return {"address": address, "error": f"Unexpected API response format - {e}"}
+            if attempt < self.retries:
+                self.stats["retries"] += 1
+                await asyncio.sleep(self._delay(attempt, response))
+        return {"address": address, "error": error}
+
+    async def run(self, addresses, write):
+        # bounded queue: the address list is consumed lazily
+        queue = asyncio.Queue(maxsize=self.concurrency * 4)
+        # the default executor (cpu + 4 threads) would cap concurrency
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=self.concurrency))
+
+        async def worker():
+            while True:
+                address = await queue.get()
+                if address is None:
+                    return
+                result = await self.fetch(address)
+                self.stats["failed" if "error" in result else "ok"] += 1
+                write(result)
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        for address in addresses:
+            await queue.put(address)
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+
+    def close(self):
+        self.session.close()
+
+
+# ---- address state cache ----
+# Last seen summary per address in SQLite. Entries younger than the TTL are
+# answered from disk; stale ones are re-queried (summary only), and if n_tx
+# did not move only the check time is bumped, so changed_at tells when the
+# address really had activity.
+
+class BalanceCache:
+    COMMIT_EVERY = 500
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS addresses (
+                address TEXT PRIMARY KEY,
+                balance_satoshis INTEGER NOT NULL,
+                total_received INTEGER NOT NULL,
+                total_sent INTEGER NOT NULL,
+                transaction_count INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                changed_at REAL NOT NULL
+            )""")
+        self.pending = 0
+        self.stats = {"changed": 0, "unchanged": 0, "new": 0}
+
+    def get_many(self, addresses):
+        rows = {}
+        # stay under SQLite's bound-parameter limit
+        for i in range(0, len(addresses), 900):
+            part = addresses[i:i + 900]
+            marks = ",".join("?" * len(part))
+            for row in self.db.execute(f"SELECT * FROM addresses WHERE address IN ({marks})", part):
+                rows[row["address"]] = row
+        return rows
+
+    def put(self, info, previous=None):
+        now = time.time()
+        changed_at = now
+        if previous is None:
+            self.stats["new"] += 1
+        elif previous["transaction_count"] == info["transaction_count"]:
+            self.stats["unchanged"] += 1
+            changed_at = previous["changed_at"]
+        else:
+            self.stats["changed"] += 1
+        self.db.execute(
+            "INSERT OR REPLACE INTO addresses VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (info["address"], info["balance_satoshis"], info["total_received"], info["total_sent"],
+             info["transaction_count"], now, changed_at))
+        self.pending += 1
+        if self.pending >= self.COMMIT_EVERY:
+            self.commit()
+
+    def commit(self):
+        self.db.commit()
+        self.pending = 0
+
+    def close(self):
+        self.commit()
+        self.db.close()
+
+
+def info_from_cache(row):
+    return {
+        "address": row["address"],
+        "balance_satoshis": row["balance_satoshis"],
+        "balance_btc": row["balance_satoshis"] / 100000000,
+        "total_received": row["total_received"],
+        "total_sent": row["total_sent"],
+        "transaction_count": row["transaction_count"]
+    }
+
+
+def chunks(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def split_cached(addresses, cache, ttl, write, stale, chunk=1000):
+    # answer fresh entries from the cache right away and yield the rest for
+    # fetching; stale keeps their cached rows so the refresh can compare n_tx
+    for batch in chunks(addresses, chunk):
+        known = cache.get_many(batch)
+        now = time.time()
+        for address in batch:
+            row = known.get(address)
+            if row is not None and now - row["fetched_at"] < ttl:
+                write(info_from_cache(row))
+            else:
+                stale[address] = row
+                yield address
+
+
+def read_addresses(path):
+    # one address per line (or first CSV column); blanks, comments and repeats skipped
+    seen = set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            address = line.split(",", 1)[0].strip()
+            if not address or address.startswith("#") or address.lower() == "address":
+                continue
+            if address not in seen:
+                seen.add(address)
+                yield address
+
+
+def fetch_via_providers(chain, addresses, write, batch_size, workers, pacer):
+    # batches go to the fastest healthy provider, sized for it (bitcoind takes
+    # thousands per scan, HTTP APIs batch_size); a batch that every provider
+    # failed on is reported per address instead of aborting the run. Request
+    # rate, requests in flight and 429 retries are all the pacer's job.
+    # At most `workers` batches exist at a time: addresses are read only as
+    # workers free up, and each batch is cut when it is about to start, for
+    # the provider ranked first at that moment.
+    stats = {"requests": 0, "retries": 0, "ok": 0, "failed": 0}
+    it = iter(addresses)
+
+    def job(part):
+        try:
+            return chain.balances(part)
+        except ProviderError as e:
+            return {a: {"address": a, "error": str(e)} for a in part}
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        while True:
+            while len(pending) < workers:
+                part = list(itertools.islice(it, chain.batch_size(batch_size)))
+                if not part:
+                    break
+                pending.add(pool.submit(job, part))
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                for row in future.result().values():
+                    stats["failed" if "error" in row else "ok"] += 1
+                    write(row)
+    # HTTP requests actually sent (retries included), not batches
+    stats["requests"] = chain.requests()
+    stats["retries"] = pacer.stats["retries"]
+    return stats
+
+
+def bulk_main(args):
+    fetcher = BulkFetcher(args.concurrency, args.rate, args.retries, url=args.api_url)
+    chain = None
+    if args.providers:
+        # the same --rate/--concurrency/--retries as the rawaddr fetcher
+        pacer = Pacer(args.rate, args.concurrency, args.retries)
+        try:
+            providers = make_providers(args.providers.split(","), esplora_url=args.esplora_url,
+                                       rpc_url=args.rpc_url, rpc_user=args.rpc_user,
+                                       rpc_password=args.rpc_password, pacer=pacer)
+            chain = ProviderChain(providers)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return 2
+        ranking = chain.probe()
+        print("providers:", ", ".join(
+            f"{name} {'down' if t is None else f'{t * 1000:.0f}ms'}" for name, t in ranking.items()))
+    cache = BalanceCache(args.cache) if args.cache else None
+    as_csv = args.output.lower().endswith(".csv")
+    served = 0
+    t0 = time.perf_counter()
+    with open(args.output, "w", encoding="utf-8", newline="") as out:
+        if as_csv:
+            writer = csv.DictWriter(out, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+            write = writer.writerow
+        else:
+            def write(row):
+                out.write(json.dumps(row) + "\n")
+
+        addresses = read_addresses(args.file)
+        if cache is None:
+            on_fetched = write
+        else:
+            stale = {}
+
+            def from_cache(row):
+                nonlocal served
+                served += 1
+                write(row)
+
+            def on_fetched(row):
+                previous = stale.pop(row["address"], None)
+                # a UTXO-set scan has no n_tx to compare, such rows are not cached
+                if "error" not in row and row.get("transaction_count") is not None:
+                    cache.put(row, previous)
+                write(row)
+
+            addresses = split_cached(addresses, cache, args.ttl, from_cache, stale)
+        try:
+            if chain is not None:
+                stats = fetch_via_providers(chain, addresses, on_fetched, args.batch_size,
+                                            args.concurrency, pacer)
+            else:
+                asyncio.run(fetcher.run(addresses, on_fetched))
+                stats = fetcher.stats
+        finally:
+            fetcher.close()
+            if chain is not None:
+                chain.close()
+            if cache is not None:
+                cache.close()
+    elapsed = time.perf_counter() - t0
+    s = stats
+    print(f"{s['ok']} ok, {s['failed']} failed, {s['requests']} requests "
+          f"({s['retries']} retries) in {elapsed:.1f}s -> {args.output}")
+    if cache is not None:
+        c = cache.stats
+        print(f"cache: {served} served from disk, refreshed {c['changed']} changed / "
+              f"{c['unchanged']} unchanged, {c['new']} new")
+    return 0 if s["failed"] == 0 else 1
+
+
+def history_main(args):
+    path = args.output or f"transactions_{args.history}.jsonl"
+    count = 0
+    with requests.Session() as session, open(path, "w", encoding="utf-8") as out:
+        try:
+            for tx in iter_transactions(args.history, session, args.api_url):
+                out.write(json.dumps(tx) + "\n")
+                count += 1
+        except requests.exceptions.RequestException as e:
+            print(f"Error: Failed to fetch data - {e}")
+            return 1
+    print(f"{count} transactions -> {path}")
+    return 0
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Bitcoin address balance via blockchain.info")
+    parser.add_argument("--file", help="bulk mode: file with one address per line")
+    parser.add_argument("--history", metavar="ADDRESS", help="stream the full transaction history of ADDRESS")
+    parser.add_argument("--output", help="output file: bulk .jsonl/.csv (default balances.jsonl), "
+                                         "history .jsonl (default transactions_{address}.jsonl)")
+    parser.add_argument("--concurrency", type=int, default=8, help="max requests in flight")
+    parser.add_argument("--rate", type=float, default=5.0, help="max requests per second (0 = unlimited)")
+    parser.add_argument("--retries", type=int, default=5, help="retries on 429/5xx/connection errors")
+    parser.add_argument("--cache", metavar="PATH", help="SQLite address state cache for bulk mode")
+    parser.add_argument("--ttl", type=float, default=3600, help="seconds a cached address counts as fresh")
+    parser.add_argument("--api-url", default=RAWADDR_URL, help="rawaddr URL template with {address}")
+    parser.add_argument("--providers", help="bulk mode via balance providers, fastest first with failover: "
+                                            "comma list of esplora, blockchain.info, bitcoind")
+    parser.add_argument("--batch-size", type=int, default=100,
+                        help="addresses per HTTP provider call (bitcoind scans up to 10000 at once)")
+    parser.add_argument("--esplora-url", default=ESPLORA_URL, help="Esplora API base URL")
+    parser.add_argument("--rpc-url", help="bitcoind JSON-RPC URL, e.g. http://127.0.0.1:8332/")
+    parser.add_argument("--rpc-user", help="bitcoind RPC user")
+    parser.add_argument("--rpc-password", help="bitcoind RPC password")
+    args = parser.parse_args()
+
+    if args.file:
+        args.output = args.output or "balances.jsonl"
+        sys.exit(bulk_main(args))
+    if args.history:
+        sys.exit(history_main(args))
+
     # Get Bitcoin address from user input
     address = input("Enter Bitcoin address: ").strip()
-    
+
     if not address:
         print("Error: No address provided!")
         return
-    
+
     print(f"Fetching balance for: {address}")
-    
+
     # Get balance and save to JSON
     balance_data, filename = get_bitcoin_balance(address)
-    
+
     if balance_data and filename:
         print(f"\nBalance information saved to: {filename}")
         print(f"Balance: {balance_data['balance_btc']:.8f} BTC")
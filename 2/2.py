@@ -1,20 +1,25 @@
 from __future__ import annotations
 
 import argparse
+import os
 import sys
 from dataclasses import dataclass
-from typing import List, Tuple
+from typing import List, Optional
 
-import requests
 from bitcoinutils.setup import setup
-from bitcoinutils.transactions import Transaction, TxInput, TxOutput, TxWitnessInput
 from bitcoinutils.keys import PrivateKey, P2wpkhAddress
-from bitcoinutils.script import Script
 
+from broadcast import STATUS_SENT, broadcast_all
+from coinselect import Selection
+from ecbackend import get_backend
+from esplora import MEMPOOL_TESTNET4, EsploraClient
+from payouts import MAX_STANDARD_TX_WEIGHT, Payout, load_payouts, plan_batches
+from txbuilder import SEQUENCE_FINAL, SEQUENCE_RBF, Tx, TxIn, TxOut
+from txsize import p2wpkh_input
+from utxotracker import UtxoTracker
 
-WIF = "cTq..."
 
-MEMPOOL_TESTNET4 = "https://mempool.space/testnet4/api"
+WIF = "cTq..."
 
 
 @dataclass(frozen=True)
@@ -24,65 +29,79 @@ class UTXO:
     value: int  # satoshis
 
 
-def http_get_json(url: str, timeout: int = 20):
-    r = requests.get(url, timeout=timeout)
-    r.raise_for_status()
-    return r.json()
-
-
-def http_post_text(url: str, body: str, timeout: int = 20):
-    r = requests.post(url, data=body.encode("utf-8"), timeout=timeout)
-    if not r.ok:
-        raise RuntimeError(f"Broadcast failed: HTTP {r.status_code}\nResponse: {r.text}\n")
-    return r.text.strip()
-
-
-def fetch_utxos(address: str) -> List[UTXO]:
-    data = http_get_json(f"{MEMPOOL_TESTNET4}/address/{address}/utxo")
+def fetch_utxos(client: EsploraClient, address: str, tracker: Optional[UtxoTracker] = None) -> List[UTXO]:
+    data = client.address_utxos(address)
+    if tracker is not None:
+        # неподтверждённая сдача наших прошлых отправок доступна сразу
+        tracker.sync(data, client.tx_status)
+        data = tracker.available(data)
     utxos = [UTXO(txid=x["txid"], vout=int(x["vout"]), value=int(x["value"])) for x in data]
     utxos.sort(key=lambda u: u.value, reverse=True)
     return utxos
 
 
-def fetch_fee_rate_sat_vb() -> int:
-    fees = http_get_json(f"{MEMPOOL_TESTNET4}/v1/fees/recommended")
+def fetch_fee_rate_sat_vb(client: EsploraClient) -> int:
+    fees = client.fee_recommended()
     return int(fees.get("halfHourFee", fees.get("minimumFee", 1)))
 
 
-def estimate_vbytes_p2wpkh(n_in: int, n_out: int) -> int:
-    # приближённо
-    return 10 + n_in * 68 + n_out * 31
+def build_signed_tx(sel: Selection, payouts: List[Payout], change_spk: bytes, sequence: int,
+                    secret: bytes, pub_bytes: bytes, script_code: bytes, ec) -> Tx:
+    outputs = [TxOut(p.amount, p.script) for p in payouts]
+    if sel.change > 0:
+        outputs.append(TxOut(sel.change, change_spk))
+    tx = Tx([TxIn.from_hex(u.txid, u.vout, sequence) for u in sel.picked], outputs)
 
+    # BIP143: общие хэши считаются один раз, подпись (low-R, low-S DER) — бэкенд
+    hasher = tx.sighasher()
+    for idx, u in enumerate(sel.picked):
+        digest = hasher.digest(idx, script_code, u.value)
+        sig = ec.sign(secret, digest) + b"\x01"  # SIGHASH_ALL
+        tx.inputs[idx].witness = [sig, pub_bytes]
+    return tx
 
-def select_coins(utxos: List[UTXO], target_plus_fee: int) -> Tuple[List[UTXO], int]:
-    picked, total = [], 0
-    for u in utxos:
-        picked.append(u)
-        total += u.value
-        if total >= target_plus_fee:
-            return picked, total
-    raise RuntimeError("Недостаточно средств (UTXO) для суммы + комиссии")
 
 def main():
     parser = argparse.ArgumentParser(description="Create/sign/broadcast a Bitcoin testnet4 P2WPKH tx (tb1q -> tb1q)")
-    parser.add_argument("--to", required=True, help="Recipient address (tb1q...)")
-    parser.add_argument("--amount-sats", type=int, required=True, help="Amount to send in satoshis")
+    parser.add_argument("--to", help="Recipient address (tb1q...)")
+    parser.add_argument("--amount-sats", type=int, help="Amount to send in satoshis")
+    parser.add_argument("--batch", metavar="PATH",
+                        help="payout queue: CSV (address,amount) or JSONL {address, amount}; replaces --to/--amount-sats")
+    parser.add_argument("--max-weight", type=int, default=MAX_STANDARD_TX_WEIGHT,
+                        help="weight limit per batch transaction")
     parser.add_argument("--fee-rate", type=int, default=0, help="Fee rate in sat/vB (0 = auto)")
     parser.add_argument("--rbf", action="store_true", help="Enable RBF")
     parser.add_argument("--broadcast", action="store_true", help="Broadcast via mempool.space testnet4")
+    parser.add_argument("--esplora-url", default=MEMPOOL_TESTNET4, help="Esplora API base URL")
+    parser.add_argument("--cache", metavar="PATH", help="persist fee/UTXO TTL cache between runs")
+    parser.add_argument("--chain", metavar="PATH",
+                        help="track own unconfirmed txs in PATH and spend their change right away")
     parser.add_argument("--dry-run", action="store_true", help="Just print raw tx/txid, do not broadcast")
+    parser.add_argument("--ec-backend", choices=["coincurve", "ecdsa", "pure"],
+                        help="secp256k1 backend for signing (default: fastest available / EC_BACKEND)")
     args = parser.parse_args()
 
+    if args.ec_backend:
+        os.environ["EC_BACKEND"] = args.ec_backend
+    ec = get_backend()
+
     if not WIF or WIF.startswith("cV....") or len(WIF) < 20:
         print("ERROR: Set WIF constant in code (testnet WIF).", file=sys.stderr)
         sys.exit(2)
 
-    if not args.to.startswith("tb1q"):
-        raise RuntimeError("Ожидается адрес получателя tb1q... (P2WPKH).")
-
-    send_value = int(args.amount_sats)
-    if send_value <= 0:
-        raise RuntimeError("amount-sats должен быть > 0")
+    if args.batch:
+        if args.to or args.amount_sats:
+            parser.error("--batch нельзя совмещать с --to/--amount-sats")
+        payouts = load_payouts(args.batch)
+        if not payouts:
+            raise RuntimeError(f"В {args.batch} нет выплат")
+    else:
+        if not args.to or args.amount_sats is None:
+            parser.error("нужны --to и --amount-sats (или --batch)")
+        if not args.to.startswith("tb1q"):
+            raise RuntimeError("Ожидается адрес получателя tb1q... (P2WPKH).")
+        if args.amount_sats <= 0:
+            raise RuntimeError("amount-sats должен быть > 0")
 
     setup("testnet")
 
@@ -91,79 +110,100 @@ def main():
     from_addr_obj = pub.get_segwit_address()  # tb1q...
     from_addr = from_addr_obj.to_string()
 
-    fee_rate = args.fee_rate if args.fee_rate > 0 else fetch_fee_rate_sat_vb()
-    utxos = fetch_utxos(from_addr)
+    client = EsploraClient(args.esplora_url, cache_file=args.cache)
+    fee_rate = args.fee_rate if args.fee_rate > 0 else fetch_fee_rate_sat_vb(client)
+    tracker = UtxoTracker(args.chain) if args.chain else None
+    utxos = fetch_utxos(client, from_addr, tracker)
+    if not utxos and tracker is not None and tracker.pending:
+        raise RuntimeError("Все доступные выходы в цепочках на лимите mempool — дождитесь подтверждения.")
     if not utxos:
         raise RuntimeError(f"Нет UTXO на адресе {from_addr}. Пополните testnet4 BTC.")
 
-    to_addr_obj = P2wpkhAddress(args.to)
-
-    # подберём UTXO итеративно
-    n_in_guess = 1
-    while True:
-        vbytes_guess = estimate_vbytes_p2wpkh(n_in_guess, 2)  # to + change
-        fee_guess = fee_rate * vbytes_guess
-        picked, picked_total = select_coins(utxos, send_value + fee_guess)
-        if len(picked) == n_in_guess:
-            break
-        n_in_guess = len(picked)
-
-    # финальный расчёт
-    vbytes = estimate_vbytes_p2wpkh(len(picked), 2)
-    fee = fee_rate * vbytes
-    change = picked_total - send_value - fee
-
-    dust_like = 330
-    include_change = change >= dust_like
-
-    outputs: List[TxOutput] = [TxOutput(send_value, to_addr_obj.to_script_pub_key())]
-    if include_change:
-        outputs.append(TxOutput(change, from_addr_obj.to_script_pub_key()))
-    else:
-        fee = picked_total - send_value
-        change = 0
+    from_spk = from_addr_obj.to_script_pub_key().to_bytes()
+    if not args.batch:
+        to_spk = P2wpkhAddress(args.to).to_script_pub_key().to_bytes()
+        payouts = [Payout(args.to, int(args.amount_sats), to_spk)]
 
-    txins: List[TxInput] = []
-    for u in picked:
-        txin = TxInput(u.txid, u.vout)
-        if args.rbf:
-            txin.sequence = 0xFFFFFFFD
-        txins.append(txin)
+    # пакеты в пределах --max-weight; в каждом подбор входов BnB -> knapsack ->
+    # largest-first и комиссия по точному весу шаблонов P2WPKH (подпись <= 71 байт)
+    batches = plan_batches(payouts, utxos, fee_rate, p2wpkh_input(), from_spk, args.max_weight)
 
-    tx = Transaction(txins, outputs, has_segwit=True)
+    # без --rbf: 0xFFFFFFFE (final для RBF, но locktime учитывается)
+    sequence = SEQUENCE_RBF if args.rbf else SEQUENCE_FINAL - 1
 
     # scriptCode для P2WPKH
-    h160 = pub.to_hash160()
-    script_code = Script(["OP_DUP", "OP_HASH160", h160, "OP_EQUALVERIFY", "OP_CHECKSIG"])
-
-    tx.witnesses = []
-    for idx, u in enumerate(picked):
-        sig = priv.sign_segwit_input(tx, idx, script_code, u.value)
-        tx.witnesses.append(TxWitnessInput([sig, pub.to_hex()]))
-
-    raw = tx.serialize()
-    txid = tx.get_txid()
+    pub_bytes = bytes.fromhex(pub.to_hex())
+    script_code = b"\x76\xa9\x14" + bytes.fromhex(pub.to_hash160()) + b"\x88\xac"
+    secret = priv.to_bytes()
 
+    print("ec backend:", ec.name)
     print("FROM:", from_addr)
-    print("TO:  ", args.to)
     print("fee_rate(sat/vB):", fee_rate)
-    print("inputs:")
-    for u in picked:
-        print(f"  - {u.txid}:{u.vout} value={u.value}")
-    print("outputs:")
-    print("  - to:", send_value)
-    if include_change:
-        print("  - change:", change)
-    print("fee(sats):", fee)
-    print("txid:", txid)
-    print("raw:", raw)
+    if args.batch:
+        print(f"payouts: {len(payouts)} -> {len(batches)} tx")
+
+    raws = []
+    planned = {}  # пакеты этого запуска: у общих предков они все — потомки
+    for n, (chunk, sel) in enumerate(batches, 1):
+        tx = build_signed_tx(sel, chunk, from_spk, sequence, secret, pub_bytes, script_code, ec)
+        if tracker is not None:
+            parents = {u.txid for u in sel.picked}
+            if not tracker.limits_ok(parents, tx.vsize(), planned):
+                raise RuntimeError("Цепочка неподтверждённых транзакций упёрлась в лимит mempool (25 tx / 101 kvB)")
+            planned[tx.txid()] = {"vsize": tx.vsize(), "parents": sorted(parents & tracker.pending.keys())}
+        buf = tx.serialize()
+        raw = buf.hex()  # hex только для вывода и отправки
+        raws.append((raw, tx, sel, len(chunk)))
+
+        if args.batch:
+            print(f"=== tx {n}/{len(batches)} ===")
+        print("coin selection:", sel.algorithm)
+        print("inputs:")
+        for u in sel.picked:
+            print(f"  - {u.txid}:{u.vout} value={u.value}")
+        print("outputs:")
+        if args.batch:
+            print(f"  - payouts: {len(chunk)} ({sum(p.amount for p in chunk)} sats)")
+        else:
+            print("  - to:", chunk[0].address, chunk[0].amount)
+        if sel.change > 0:
+            print("  - change:", sel.change)
+        if args.batch:
+            print("fee(sats):", sel.fee, f"({sel.fee / len(chunk):.1f}/payout)")
+        else:
+            print("fee(sats):", sel.fee)
+        print(f"vsize: {tx.vsize()} (weight {tx.weight()})")
+        print("txid:", tx.txid(buf))
+        print("wtxid:", tx.wtxid(buf))
+        print("raw:", raw)
 
     if args.dry_run and not args.broadcast:
         return
 
     if args.broadcast:
-        result = http_post_text(f"{MEMPOOL_TESTNET4}/tx", raw)
-        print("broadcast:", result)
+        # партия уходит параллельно; повторы делает очередь, у клиента их нет
+        sender = EsploraClient(args.esplora_url, retries=0, cache_file=args.cache)
+        try:
+            jobs = broadcast_all(sender, [r[0] for r in raws])
+        finally:
+            sender.close()
+        failed = 0
+        for raw, tx, sel, n_payouts in raws:
+            job = jobs[tx.txid()]
+            if job.status != STATUS_SENT:
+                failed += 1
+                print(f"broadcast {job.txid}: {job.status} ({job.error})")
+                continue
+            print("broadcast:", job.txid)
+            if tracker is not None:
+                # сдача — последний выход, сразу после выплат
+                change = [(n_payouts, sel.change)] if sel.change > 0 else []
+                tracker.record(tx.txid(), tx.vsize(), sel.fee,
+                               [(u.txid, u.vout) for u in sel.picked], change)
+                tracker.save()
+
+        if failed:
+            raise RuntimeError(f"Не отправлено транзакций: {failed} из {len(raws)}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import heapq
+import mmap
+import multiprocessing as mp
+import os
+import struct
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Tuple
+
+from derive import PURPOSE_NUM, path_str
+
+# Формат файла индекса (всё little-endian):
+#   заголовок: magic, отпечаток ключа-источника, account_max, scan,
+#              include_internal, маска purpose, число записей
+#   записи:    hash160 | purpose | account | change | index, отсортированы
+#              по hash160 — поиск бинарный прямо по mmap
+MAGIC = b"WIFIDX1\0"
+HEADER = struct.Struct("<8s4sIIBBxxQ")
+RECORD = struct.Struct("<20sBIBI")
+
+_PURPOSE_BY_NUM = {num: name for name, num in PURPOSE_NUM.items()}
+_PURPOSE_BIT = {"BIP44": 1, "BIP49": 2, "BIP84": 4}
+
+Record = Tuple[bytes, int, int, int, int]
+
+
+@dataclass(frozen=True)
+class IndexHeader:
+    fingerprint: bytes
+    account_max: int
+    scan: int
+    include_internal: bool
+    purpose_mask: int
+    count: int
+
+    def covers(self, purpose: str, account: int, change: int, index: int) -> bool:
+        return (
+            self.purpose_mask & _PURPOSE_BIT[purpose] != 0
+            and account <= self.account_max
+            and index <= self.scan
+            and (change == 0 or self.include_internal)
+        )
+
+
+def _purpose_mask(purposes: List[str]) -> int:
+    mask = 0
+    for p in purposes:
+        mask |= _PURPOSE_BIT[p]
+    return mask
+
+
+def read_header(path: str) -> Optional[IndexHeader]:
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        raw = f.read(HEADER.size)
+    if len(raw) < HEADER.size:
+        raise ValueError(f"{path}: повреждённый заголовок индекса")
+    magic, fp, account_max, scan, internal, mask, count = HEADER.unpack(raw)
+    if magic != MAGIC:
+        raise ValueError(f"{path}: не файл индекса")
+    return IndexHeader(fp, account_max, scan, bool(internal), mask, count)
+
+
+# --- построение ---
+
+_W_SOURCE = None
+
+
+def _init_worker(source) -> None:
+    global _W_SOURCE
+    _W_SOURCE = source
+
+
+def _derive_records(task: Tuple[str, int, int, List[int]]) -> List[Record]:
+    purpose, account, change, indexes = task
+    node = _W_SOURCE.chain(purpose, account, change)
+    num = PURPOSE_NUM[purpose]
+    return [(node.hash160(i), num, account, change, i) for i in indexes]
+
+
+def _missing_tasks(source, old: Optional[IndexHeader], account_max: int, scan: int,
+                   include_internal: bool, chunk: int) -> Iterator[Tuple[str, int, int, List[int]]]:
+    # только те пути, которых ещё нет в старом индексе
+    changes = [0, 1] if include_internal else [0]
+    for purpose in source.purposes():
+        for account in source.accounts(account_max):
+            for change in changes:
+                todo = [
+                    i for i in range(scan + 1)
+                    if old is None or not old.covers(purpose, account, change, i)
+                ]
+                for start in range(0, len(todo), chunk):
+                    yield purpose, account, change, todo[start:start + chunk]
+
+
+def _iter_file_records(path: str, count: int) -> Iterator[Record]:
+    with open(path, "rb") as f:
+        f.seek(HEADER.size)
+        for _ in range(count):
+            yield RECORD.unpack(f.read(RECORD.size))
+
+
+def build_index(
+    path: str,
+    source,
+    account_max: int,
+    scan: int,
+    include_internal: bool,
+    workers: int = 1,
+    chunk: int = 2000,
+) -> IndexHeader:
+    """Создать индекс hash160 -> путь или дополнить существующий.
+
+    Если файл уже есть и построен для того же ключа, выводятся только новые
+    пути (выросли scan/account_max или добавился change=1), а старые записи
+    сливаются с новыми без повторной деривации.
+    """
+    fp = source.fingerprint()
+    mask = _purpose_mask(source.purposes())
+    old = read_header(path)
+    if old is not None:
+        if old.fingerprint != fp:
+            raise ValueError(f"{path}: индекс построен для другого ключа")
+        if old.purpose_mask != mask:
+            raise ValueError(f"{path}: индекс построен для другого набора purpose")
+        account_max = max(account_max, old.account_max)
+        scan = max(scan, old.scan)
+        include_internal = include_internal or old.include_internal
+
+    tasks = _missing_tasks(source, old, account_max, scan, include_internal, chunk)
+    # xpub даёт один аккаунт, и он может быть больше --account-max: в
+    # заголовок пишем реально покрытый, иначе covers() при каждой
+    # пересборке считал бы его новым
+    account_max = max(account_max, *source.accounts(account_max))
+    new: List[Record] = []
+    if workers > 1:
+        with mp.get_context().Pool(workers, initializer=_init_worker, initargs=(source,)) as pool:
+            for recs in pool.imap_unordered(_derive_records, tasks):
+                new.extend(recs)
+    else:
+        _init_worker(source)
+        for task in tasks:
+            new.extend(_derive_records(task))
+    new.sort()
+
+    old_count = old.count if old is not None else 0
+
+    # новый файл пишется рядом и атомарно подменяет старый; одинаковые
+    # записи (индекс старого формата с дублями) сливаются в одну
+    tmp = path + ".tmp"
+    count = 0
+    with open(tmp, "wb") as out:
+        out.seek(HEADER.size)
+        old_records = _iter_file_records(path, old_count) if old_count else iter(())
+        prev = None
+        for rec in heapq.merge(old_records, new):
+            if rec != prev:
+                out.write(RECORD.pack(*rec))
+                count += 1
+                prev = rec
+        out.seek(0)
+        out.write(HEADER.pack(MAGIC, fp, account_max, scan, int(include_internal), mask, count))
+    os.replace(tmp, path)
+    return IndexHeader(fp, account_max, scan, include_internal, mask, count)
+
+
+# --- поиск ---
+
+class AddrIndex:
+    """Поиск по индексу через mmap, без мнемоники и без деривации."""
+
+    def __init__(self, path: str):
+        self.header = read_header(path)
+        if self.header is None:
+            raise FileNotFoundError(path)
+        self._f = open(path, "rb")
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mm) != HEADER.size + self.header.count * RECORD.size:
+            self.close()
+            raise ValueError(f"{path}: размер файла не совпадает с заголовком")
+
+    def close(self) -> None:
+        self._mm.close()
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _key(self, i: int) -> bytes:
+        off = HEADER.size + i * RECORD.size
+        return self._mm[off:off + 20]
+
+    def lookup(self, h160: bytes) -> List[Tuple[str, int, int, int]]:
+        lo, hi = 0, self.header.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < h160:
+                lo = mid + 1
+            else:
+                hi = mid
+        hits = []
+        while lo < self.header.count and self._key(lo) == h160:
+            _, num, account, change, index = RECORD.unpack_from(self._mm, HEADER.size + lo * RECORD.size)
+            hits.append((_PURPOSE_BY_NUM[num], account, change, index))
+            lo += 1
+        return hits
+
+    def lookup_path(self, h160: bytes) -> List[str]:
+        return [path_str(*hit) for hit in self.lookup(h160)]
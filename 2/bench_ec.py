@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import time
+from typing import Callable, Dict, List
+
+from ecbackend import available_backends, get_backend, hash160
+
+
+def _rate(fn: Callable[[int], object], seconds: float) -> float:
+    # крутим fn, пока не истечёт время; возвращаем операций в секунду
+    n = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while True:
+        for _ in range(16):
+            fn(n)
+            n += 1
+        now = time.perf_counter()
+        if now >= deadline:
+            return n / (now - start)
+
+
+def _secret(i: int) -> bytes:
+    return hashlib.sha256(i.to_bytes(8, "big")).digest()
+
+
+def bench_backend(name: str, seconds: float) -> Dict[str, float]:
+    ec = get_backend(name)
+    secrets = [_secret(i) for i in range(64)]
+    pub = ec.pubkey(secrets[0])
+    digests = [hashlib.sha256(s).digest() for s in secrets]
+
+    return {
+        "keys_per_sec": _rate(lambda i: ec.pubkey(secrets[i & 63]), seconds),
+        "ckd_pub_per_sec": _rate(lambda i: ec.pub_tweak_add(pub, secrets[i & 63]), seconds),
+        "sigs_per_sec": _rate(lambda i: ec.sign(secrets[i & 63], digests[i & 63]), seconds),
+    }
+
+
+def check_agreement(names: List[str], vectors: int = 16) -> None:
+    # все бэкенды обязаны давать побайтно одинаковые ключи и подписи
+    backends = [get_backend(n) for n in names]
+    for i in range(vectors):
+        secret, digest = _secret(1000 + i), _secret(2000 + i)
+        pubs = {b.pubkey(secret) for b in backends}
+        sigs = {b.sign(secret, digest) for b in backends}
+        if len(pubs) != 1 or len(sigs) != 1:
+            raise SystemExit(f"бэкенды расходятся на векторе {i}")
+        pub = pubs.pop()
+        sig = sigs.pop()
+        for b in backends:
+            if not b.verify(pub, digest, sig):
+                raise SystemExit(f"{b.name}: подпись не проверилась на векторе {i}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="secp256k1 backend benchmark (keys/sec, CKDpub/sec, sigs/sec)")
+    ap.add_argument("--backend", action="append", help="backend to benchmark (repeatable; default: all available)")
+    ap.add_argument("--seconds", type=float, default=1.0, help="time per measurement")
+    ap.add_argument("--json", metavar="PATH", help="write results as JSON")
+    args = ap.parse_args()
+
+    names = args.backend or available_backends()
+    check_agreement(names)
+
+    results = {"default": get_backend().name, "backends": {}}
+    results["hash160_per_sec"] = _rate(lambda i: hash160(_secret(i & 63)), args.seconds)
+    print(f"default backend: {results['default']}")
+    print(f"hash160: {results['hash160_per_sec']:,.0f}/s")
+    print(f"{'backend':<10} {'keys/s':>12} {'ckd_pub/s':>12} {'sigs/s':>12}")
+    for name in names:
+        r = bench_backend(name, args.seconds)
+        results["backends"][name] = r
+        print(f"{name:<10} {r['keys_per_sec']:>12,.0f} {r['ckd_pub_per_sec']:>12,.0f} {r['sigs_per_sec']:>12,.0f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
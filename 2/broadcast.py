@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+import requests
+
+from esplora import MEMPOOL_TESTNET4, EsploraClient, EsploraError
+from ratelimit import RETRY_STATUS, TokenBucket, retry_delay
+from txbuilder import Tx
+
+# Массовая отправка транзакций: asyncio-очередь поверх синхронного
+# EsploraClient (каждый POST — в своём потоке), не больше concurrency
+# запросов одновременно и не чаще rate в секунду (token bucket).
+# Временные ошибки (429/5xx, обрыв соединения) повторяются с задержкой,
+# не занимая слот, — медленный ответ не задерживает остальные. Дочерняя
+# транзакция уходит только после того, как принят её родитель из той же
+# партии. Статусы сохраняются в JSON: повторный запуск не шлёт принятое.
+
+# родитель мог ещё не разойтись по узлам за балансировщиком
+MISSING_INPUTS = ("missingorspent", "missing-inputs")
+
+STATUS_PENDING = "pending"
+STATUS_SENT = "sent"
+STATUS_FAILED = "failed"
+STATUS_SKIPPED = "skipped"  # не отправлялась: родитель не принят
+
+SAVE_INTERVAL = 1.0  # потеря статусов при падении — максимум за секунду; повтор даст already-known
+
+
+@dataclass
+class Job:
+    txid: str
+    raw: str
+    parents: Set[str] = field(default_factory=set)
+    status: str = STATUS_PENDING
+    attempts: int = 0
+    error: Optional[str] = None
+
+
+class BroadcastQueue:
+    """Партия сырых транзакций -> отправка с лимитами, повторами и порядком родителей.
+
+    Клиенту лучше задать retries=0: повторы делает очередь, не блокируя поток.
+    """
+
+    def __init__(self, client: EsploraClient, concurrency: int = 8, rate: float = 5.0,
+                 burst: Optional[float] = None, retries: int = 5, backoff: float = 0.5,
+                 max_backoff: float = 30.0, status_file: Optional[str] = None):
+        self.client = client
+        self.concurrency = concurrency
+        self.bucket = TokenBucket(rate, burst)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.status_file = status_file
+        self.jobs: Dict[str, Job] = {}
+        self._saved: Dict[str, dict] = {}
+        self._last_save = 0.0
+        if status_file and os.path.exists(status_file):
+            with open(status_file, "r", encoding="utf-8") as f:
+                self._saved = json.load(f)
+
+    def add(self, raw_hex: str) -> str:
+        """Поставить транзакцию в очередь; вернуть её txid."""
+        raw = bytes.fromhex(raw_hex.strip())
+        tx = Tx.parse(raw)
+        txid = tx.txid(bytearray(raw))
+        parents = {i.txid[::-1].hex() for i in tx.inputs}
+        job = Job(txid, raw.hex(), parents)
+        prev = self._saved.get(txid)
+        if prev and prev["status"] == STATUS_SENT:
+            job.status, job.attempts = STATUS_SENT, prev.get("attempts", 0)
+        self.jobs[txid] = job
+        return txid
+
+    # ---- статусы ----
+
+    def save(self, force: bool = False) -> None:
+        if not self.status_file:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_save < SAVE_INTERVAL:
+            return
+        self._last_save = now
+        data = dict(self._saved)
+        for j in self.jobs.values():
+            data[j.txid] = {"status": j.status, "attempts": j.attempts, "error": j.error,
+                            "parents": sorted(j.parents)}
+        tmp = self.status_file + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1)
+        os.replace(tmp, self.status_file)
+
+    # ---- отправка ----
+
+    def _delay(self, attempt: int, err: Optional[EsploraError]) -> float:
+        return retry_delay(attempt, self.backoff, self.max_backoff, err.retry_after if err is not None else None)
+
+    async def _send(self, job: Job, sem: asyncio.Semaphore) -> None:
+        for attempt in range(self.retries + 1):
+            await self.bucket.acquire()
+            err: Optional[EsploraError] = None
+            async with sem:
+                job.attempts += 1
+                try:
+                    await asyncio.to_thread(self.client.broadcast, job.raw)
+                    # «уже известна» клиент тоже возвращает как успех
+                    job.status, job.error = STATUS_SENT, None
+                    return
+                except EsploraError as e:
+                    text = str(e)
+                    job.error = " ".join(text.split())
+                    transient = e.status in RETRY_STATUS or (
+                        bool(job.parents & self.jobs.keys()) and any(s in text for s in MISSING_INPUTS))
+                    if not transient:
+                        break
+                    err = e
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    job.error = f"{type(e).__name__}: {e}"
+            if attempt < self.retries:
+                # ждём вне семафора: слот свободен для других транзакций
+                await asyncio.sleep(self._delay(attempt, err))
+        job.status = STATUS_FAILED
+
+    async def _run_job(self, job: Job, done: Dict[str, asyncio.Event], sem: asyncio.Semaphore) -> None:
+        try:
+            inner = [p for p in job.parents if p in self.jobs]
+            for p in inner:
+                await done[p].wait()
+            failed = [p for p in inner if self.jobs[p].status != STATUS_SENT]
+            if failed:
+                job.status, job.error = STATUS_SKIPPED, f"родитель {failed[0]} не принят"
+            elif job.status != STATUS_SENT:
+                await self._send(job, sem)
+            self.save()
+        finally:
+            done[job.txid].set()
+
+    async def run(self) -> Dict[str, Job]:
+        loop = asyncio.get_running_loop()
+        # пул потоков по умолчанию (cpu + 4) урезал бы параллельность
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=self.concurrency))
+        sem = asyncio.Semaphore(self.concurrency)
+        done = {txid: asyncio.Event() for txid in self.jobs}
+        try:
+            await asyncio.gather(*(self._run_job(j, done, sem) for j in self.jobs.values()))
+        finally:
+            self.save(force=True)
+        return self.jobs
+
+    def run_sync(self) -> Dict[str, Job]:
+        return asyncio.run(self.run())
+
+
+def broadcast_all(client: EsploraClient, raws: List[str], **kw) -> Dict[str, Job]:
+    """Отправить партию и вернуть задания по txid (в порядке raws)."""
+    queue = BroadcastQueue(client, **kw)
+    for raw in raws:
+        queue.add(raw)
+    return queue.run_sync()
+
+
+def _read_raws(path: str) -> List[str]:
+    # строка — hex транзакции или JSON-объект с полем "raw"
+    raws = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            raws.append(json.loads(line)["raw"] if line.startswith("{") else line)
+    return raws
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Broadcast many raw transactions with bounded concurrency and retries")
+    ap.add_argument("files", nargs="+", help="files with one raw tx hex (or JSON {raw}) per line")
+    ap.add_argument("--esplora-url", default=MEMPOOL_TESTNET4, help="Esplora API base URL")
+    ap.add_argument("--concurrency", type=int, default=8, help="max requests in flight")
+    ap.add_argument("--rate", type=float, default=5.0, help="max requests per second (0 = unlimited)")
+    ap.add_argument("--retries", type=int, default=5, help="retries per tx on transient errors")
+    ap.add_argument("--status", metavar="PATH", default="broadcast_status.json",
+                    help="per-tx status file (resumes: accepted txs are not resent)")
+    args = ap.parse_args()
+
+    raws = [r for path in args.files for r in _read_raws(path)]
+    if not raws:
+        raise SystemExit("Нет транзакций для отправки")
+    client = EsploraClient(args.esplora_url, retries=0, pool_size=args.concurrency)
+    t0 = time.perf_counter()
+    try:
+        jobs = broadcast_all(client, raws, concurrency=args.concurrency, rate=args.rate,
+                             retries=args.retries, status_file=args.status)
+    except ValueError as e:
+        raise SystemExit(f"Некорректная транзакция: {e}")
+    finally:
+        client.close()
+    elapsed = time.perf_counter() - t0
+
+    counts: Dict[str, int] = {}
+    for j in jobs.values():
+        counts[j.status] = counts.get(j.status, 0) + 1
+        if j.status != STATUS_SENT:
+            print(f"{j.txid}: {j.status} ({j.error})")
+    print(", ".join(f"{k}: {v}" for k, v in sorted(counts.items())), f"in {elapsed:.1f}s")
+    if counts.get(STATUS_SENT, 0) != len(jobs):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
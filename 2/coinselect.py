@@ -0,0 +1,259 @@
+from __future__ import annotations
+
+import bisect
+import random
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+from txsize import WITNESS_SCALE, InputSize, output_weight, varint_size
+
+# Подбор входов: branch-and-bound без сдачи, knapsack и largest-first как
+# запасные варианты. UTXO — любой объект с полем value (сатоши).
+# Монеты сортируются один раз (O(n log n)); перебор BnB и случайные
+# проходы knapsack ограничены, так что время не растёт квадратично даже
+# на 100k+ UTXO.
+
+BNB_MAX_TRIES = 100_000
+KNAPSACK_BUDGET = 1_000_000  # суммарно просмотренных монет во всех проходах
+DUST_CHANGE = 330
+
+
+@dataclass(frozen=True)
+class FeeModel:
+    """Комиссия как функция от числа входов и наличия сдачи.
+
+    Веса в weight units: base_weight — version/locktime/marker и выходы
+    получателей (без счётчиков входов и выходов), input_weight — один вход,
+    change_weight — выход сдачи, change_spend_weight — будущая трата сдачи,
+    outputs — число выходов получателей.
+    """
+
+    fee_rate: float  # sat/vB
+    base_weight: int
+    input_weight: int
+    change_weight: int
+    change_spend_weight: int
+    outputs: int = 1
+
+    @classmethod
+    def from_templates(cls, fee_rate: float, spend: InputSize, outputs: Sequence[bytes],
+                       change_script: bytes, change_spend: Optional[InputSize] = None) -> "FeeModel":
+        """Точные веса из txsize: все входы типа spend, выходы outputs + сдача."""
+        if not spend.witness:
+            raise ValueError("FeeModel рассчитан на segwit-входы")
+        base = (4 + 4) * WITNESS_SCALE + 2 + sum(output_weight(s) for s in outputs)
+        return cls(
+            fee_rate=fee_rate,
+            base_weight=base,
+            input_weight=spend.weight,
+            change_weight=output_weight(change_script),
+            change_spend_weight=(change_spend or spend).weight,
+            outputs=len(outputs),
+        )
+
+    def _fee(self, weight: int) -> int:
+        vbytes = (weight + 3) // 4
+        return int(-(-self.fee_rate * vbytes // 1))
+
+    def weight(self, n_in: int, with_change: bool) -> int:
+        n_out = self.outputs + (1 if with_change else 0)
+        weight = self.base_weight + n_in * self.input_weight
+        weight += (varint_size(n_in) + varint_size(n_out)) * WITNESS_SCALE
+        if with_change:
+            weight += self.change_weight
+        return weight
+
+    def fee(self, n_in: int, with_change: bool) -> int:
+        return self._fee(self.weight(n_in, with_change))
+
+    def input_fee(self) -> int:
+        # сверху: сумма по входам не меньше точной комиссии за все входы вместе
+        return self._fee(self.input_weight) + 1
+
+    def cost_of_change(self) -> int:
+        return self._fee(self.change_weight) + self._fee(self.change_spend_weight)
+
+
+@dataclass
+class Selection:
+    picked: list
+    total: int
+    fee: int
+    change: int
+    algorithm: str
+
+
+def _bnb(values: Sequence[int], target: int, upper: int, max_tries: int) -> Optional[List[int]]:
+    # Поиск в глубину по монетам, отсортированным по убыванию эффективной
+    # стоимости; ветка отсекается, если сумма перескочила upper или остатка
+    # уже не хватает до target. Лучшее — наименьший перебор над target.
+    # Монеты крупнее upper в решение не войдут: начинаем сразу после них,
+    # иначе на фрагментированном кошельке весь лимит попыток уходит на них.
+    skip = 0
+    while skip < len(values) and values[skip] > upper:
+        skip += 1
+    offset, values = skip, values[skip:]
+    n = len(values)
+    remaining = [0] * (n + 1)
+    for i in range(n - 1, -1, -1):
+        remaining[i] = remaining[i + 1] + values[i]
+    if remaining[0] < target:
+        return None
+
+    best: Optional[List[int]] = None
+    best_excess = upper - target + 1
+    stack: List[int] = []
+    total = 0
+    i = 0
+    tries = 0
+    while tries < max_tries:
+        tries += 1
+        backtrack = False
+        if total + remaining[i] < target or total > upper:
+            backtrack = True
+        elif total >= target:
+            excess = total - target
+            if excess < best_excess:
+                best_excess = excess
+                best = [offset + k for k in stack]
+                if excess == 0:
+                    break
+            backtrack = True
+        elif i >= n:
+            backtrack = True
+
+        if backtrack:
+            # снимаем последнюю взятую монету и пробуем ветку без неё
+            if not stack:
+                break
+            j = stack.pop()
+            total -= values[j]
+            i = j + 1
+            # монеты с той же стоимостью дают ту же ветку — пропускаем
+            while i < n and values[i] == values[j]:
+                i += 1
+            continue
+
+        stack.append(i)
+        total += values[i]
+        i += 1
+    return best
+
+
+def _approximate_subset(values: Sequence[int], target: int, rng: random.Random,
+                        iterations: int) -> Tuple[List[int], int]:
+    # стохастический knapsack (как ApproximateBestSubset в Bitcoin Core).
+    # Взятые монеты копятся в chosen; монета, на которой сумма дошла до цели,
+    # в набор не кладётся, поэтому лучшее решение — префикс chosen плюс эта
+    # монета, и копировать весь набор на каждом улучшении не нужно.
+    n = len(values)
+    best = list(range(n))
+    best_total = sum(values)
+    for _ in range(iterations):
+        if best_total == target:
+            break
+        included = [False] * n
+        chosen: List[int] = []
+        found: Optional[Tuple[int, int]] = None  # (длина префикса chosen, монета)
+        total = 0
+        reached = False
+        for npass in range(2):
+            if reached:
+                break
+            for i in range(n):
+                if included[i] or (npass == 0 and rng.random() >= 0.5):
+                    continue
+                if total + values[i] >= target:
+                    reached = True
+                    if total + values[i] < best_total:
+                        best_total = total + values[i]
+                        found = (len(chosen), i)
+                else:
+                    total += values[i]
+                    included[i] = True
+                    chosen.append(i)
+        if found is not None:
+            best = chosen[:found[0]] + [found[1]]
+    return best, best_total
+
+
+def _knapsack(values: Sequence[int], target: int, rng: random.Random) -> Optional[List[int]]:
+    # values отсортированы по убыванию
+    asc = values[::-1]
+    pos = bisect.bisect_left(asc, target)
+    if pos < len(asc) and asc[pos] == target:
+        return [len(values) - 1 - pos]
+    smallest_larger = len(values) - 1 - pos if pos < len(asc) else None
+    smaller_count = pos  # монеты < target: хвост values
+    smaller = values[len(values) - smaller_count:]
+    smaller_sum = sum(smaller)
+    offset = len(values) - smaller_count
+
+    if smaller_sum == target:
+        return list(range(offset, len(values)))
+    if smaller_sum < target:
+        return None if smallest_larger is None else [smallest_larger]
+
+    if len(smaller) > KNAPSACK_BUDGET:
+        # бюджета не хватает даже на один проход — выбирает largest-first
+        return None
+    iterations = min(1000, KNAPSACK_BUDGET // len(smaller))
+    subset, subset_total = _approximate_subset(smaller, target, rng, iterations)
+    if smallest_larger is not None and values[smallest_larger] <= subset_total:
+        return [smallest_larger]
+    return [offset + k for k in subset]
+
+
+def _largest_first(values: Sequence[int], target: int) -> Optional[List[int]]:
+    total = 0
+    for i, v in enumerate(values):
+        total += v
+        if total >= target:
+            return list(range(i + 1))
+    return None
+
+
+def select_coins(utxos: Sequence, amount: int, fees: FeeModel, min_change: int = DUST_CHANGE,
+                 rng: Optional[random.Random] = None) -> Selection:
+    """Подобрать входы под сумму amount (без учёта комиссии).
+
+    Комиссия считается сразу по числу выбранных входов через FeeModel —
+    итеративный пересчёт «угадали число входов / не угадали» не нужен.
+    """
+    in_fee = fees.input_fee()
+    coins = sorted((u for u in utxos if u.value > in_fee), key=lambda u: u.value, reverse=True)
+    eff = [u.value - in_fee for u in coins]
+    rng = rng or random.Random()
+
+    # 1) ровно без сдачи: перебор над целью уходит в комиссию, если он
+    #    меньше стоимости создания и последующей траты сдачи
+    target = amount + fees.fee(0, with_change=False)
+    idx = _bnb(eff, target, target + fees.cost_of_change(), BNB_MAX_TRIES)
+    algorithm = "bnb"
+    if idx is not None and sum(coins[i].value for i in idx) - amount < fees.fee(len(idx), False):
+        # счётчик входов вырос до 3 байт (>252 входов) и съел запас — ищем со сдачей
+        idx = None
+
+    # 2) со сдачей: knapsack, а если на него не хватило бюджета — просто
+    #    самые крупные монеты
+    if idx is None:
+        target = amount + fees.fee(0, with_change=True) + min_change
+        idx = _knapsack(eff, target, rng)
+        algorithm = "knapsack"
+        if idx is None:
+            idx = _largest_first(eff, target)
+            algorithm = "largest_first"
+    if idx is None:
+        raise RuntimeError("Недостаточно средств (UTXO) для суммы + комиссии")
+
+    picked = [coins[i] for i in sorted(idx)]
+    total = sum(u.value for u in picked)
+    if algorithm == "bnb":
+        return Selection(picked, total, total - amount, 0, algorithm)
+
+    fee = fees.fee(len(picked), with_change=True)
+    change = total - amount - fee
+    if change < min_change:
+        # сдача меньше пыли — отдаём её в комиссию
+        fee, change = total - amount, 0
+    return Selection(picked, total, fee, change, algorithm)
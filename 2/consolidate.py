@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from bip_utils import SegwitBech32Encoder
+
+from broadcast import STATUS_SENT, broadcast_all
+from coinselect import DUST_CHANGE, FeeModel
+from discovery import address_script
+from ecbackend import get_backend, hash160
+from esplora import MEMPOOL_TESTNET4, EsploraClient
+from payouts import MAX_STANDARD_TX_WEIGHT
+from signpipe import PartialTx, finalize, parse_multisig, sign_partial
+from txbuilder import SEQUENCE_RBF, Tx, TxIn, TxOut
+from txsize import InputSize, p2wpkh_input, p2wsh_multisig_input
+
+# План консолидации: мелкие UTXO P2WPKH- или P2WSH-multisig адреса
+# сметаются в один выход серией транзакций не тяжелее лимита, пока
+# комиссия ниже порога. Экономия — сколько стоило бы потратить эти входы
+# по будущей ставке минус стоимость сметания сейчас.
+
+
+@dataclass
+class Sweep:
+    inputs: List[dict]
+    fee: int
+    vsize: int
+    output: int
+    raw: Optional[str] = None
+    txid: Optional[str] = None
+
+
+@dataclass
+class Plan:
+    address: str
+    fee_rate: float
+    future_fee_rate: float
+    utxos_total: int
+    sweeps: List[Sweep] = field(default_factory=list)
+    kept: List[dict] = field(default_factory=list)
+    uneconomic: List[dict] = field(default_factory=list)
+
+    def summary(self, spend: InputSize) -> dict:
+        swept = sum(len(s.inputs) for s in self.sweeps)
+        fee_now = sum(s.fee for s in self.sweeps)
+        in_vb = spend.weight / 4
+        # без консолидации: swept входов по будущей ставке; с ней — по одному
+        # входу на каждое сметание плюс комиссия сметания сейчас
+        future_before = swept * in_vb * self.future_fee_rate
+        future_after = len(self.sweeps) * in_vb * self.future_fee_rate
+        return {
+            "address": self.address,
+            "fee_rate": self.fee_rate,
+            "future_fee_rate": self.future_fee_rate,
+            "utxos_before": self.utxos_total,
+            "utxos_after": self.utxos_total - swept + len(self.sweeps),
+            "sweeps": len(self.sweeps),
+            "inputs_swept": swept,
+            "fee_now": fee_now,
+            "future_spend_cost_before": round(future_before),
+            "future_spend_cost_after": round(future_after),
+            "projected_savings": round(future_before - future_after - fee_now),
+        }
+
+    def to_json(self, spend: InputSize) -> dict:
+        return {
+            "summary": self.summary(spend),
+            "sweeps": [s.__dict__ for s in self.sweeps],
+            "kept": self.kept,
+            "uneconomic": self.uneconomic,
+        }
+
+
+def plan_consolidation(utxos: List[dict], address: str, spend: InputSize, dest_script: bytes,
+                       fee_rate: float, future_fee_rate: float, max_value: Optional[int] = None,
+                       keep: int = 0, max_weight: int = MAX_STANDARD_TX_WEIGHT) -> Plan:
+    """Минимальное число сметаний, входы поровну между ними."""
+    plan = Plan(address, fee_rate, future_fee_rate, len(utxos))
+    fees = FeeModel.from_templates(fee_rate, spend, [], dest_script)
+    in_fee = fees.input_fee()
+
+    coins = sorted(utxos, key=lambda u: u["value"])
+    if keep:
+        coins, plan.kept = coins[:-keep], coins[-keep:]
+    if max_value is not None:
+        plan.kept += [u for u in coins if u["value"] > max_value]
+        coins = [u for u in coins if u["value"] <= max_value]
+    # вход дороже своей стоимости — сметать его себе в убыток
+    plan.uneconomic = [u for u in coins if u["value"] <= in_fee]
+    coins = [u for u in coins if u["value"] > in_fee]
+    if len(coins) < 2:
+        return plan
+
+    cap = (max_weight - fees.weight(0, True) - 16) // spend.weight
+    if cap < 2:
+        raise RuntimeError("В лимит веса не помещаются даже два входа")
+    n_tx = -(-len(coins) // cap)
+    base, extra = divmod(len(coins), n_tx)
+    pos = 0
+    for k in range(n_tx):
+        size = base + (1 if k < extra else 0)
+        chunk = coins[pos:pos + size]
+        pos += size
+        if len(chunk) < 2:
+            plan.kept += chunk
+            continue
+        total = sum(u["value"] for u in chunk)
+        fee = fees.fee(len(chunk), True)
+        if total - fee < DUST_CHANGE:
+            plan.uneconomic += chunk
+            continue
+        plan.sweeps.append(Sweep(chunk, fee, (fees.weight(len(chunk), True) + 3) // 4, total - fee))
+    return plan
+
+
+def hold_reason(summary: dict, max_fee_rate: float, force: bool = False) -> Optional[str]:
+    """Почему сметания сейчас не строить; None — можно.
+
+    force снимает только проверку окупаемости, не порог ставки.
+    """
+    if summary["fee_rate"] > max_fee_rate:
+        return f"ставка {summary['fee_rate']} sat/vB выше порога {max_fee_rate} — консолидация отложена"
+    if summary["projected_savings"] <= 0 and not force:
+        return "консолидация не окупается при заданной будущей ставке (--force — всё равно сметать)"
+    return None
+
+
+def _unsigned(sweep: Sweep, dest_script: bytes) -> Tx:
+    return Tx([TxIn.from_hex(u["txid"], int(u["vout"]), SEQUENCE_RBF) for u in sweep.inputs],
+              [TxOut(sweep.output, dest_script)])
+
+
+def sign_p2wpkh(sweep: Sweep, dest_script: bytes, secret: bytes) -> Tx:
+    ec = get_backend()
+    pub = ec.pubkey(secret)
+    script_code = b"\x76\xa9\x14" + hash160(pub) + b"\x88\xac"
+    tx = _unsigned(sweep, dest_script)
+    hasher = tx.sighasher()
+    for idx, u in enumerate(sweep.inputs):
+        sig = ec.sign(secret, hasher.digest(idx, script_code, u["value"])) + b"\x01"
+        tx.inputs[idx].witness = [sig, pub]
+    return tx
+
+
+def main():
+    ap = argparse.ArgumentParser(description="UTXO consolidation planner for a P2WPKH or P2WSH multisig address")
+    ap.add_argument("--wif", action="append", default=[], help="signing key (repeatable; P2WSH: cosigner keys)")
+    ap.add_argument("--witness-script", help="P2WSH m-of-n witnessScript hex (omit for P2WPKH of --wif)")
+    ap.add_argument("--hrp", default="tb", help="bech32 prefix")
+    ap.add_argument("--to", help="sweep destination (default: the same address)")
+    ap.add_argument("--fee-rate", type=float, default=0, help="sat/vB now (0 = economyFee from API)")
+    ap.add_argument("--max-fee-rate", type=float, default=5, help="do not consolidate above this sat/vB")
+    ap.add_argument("--future-fee-rate", type=float, default=25, help="expected sat/vB when coins get spent later")
+    ap.add_argument("--max-value", type=int, help="only sweep UTXOs up to this value (sats)")
+    ap.add_argument("--keep", type=int, default=0, help="leave the N largest UTXOs untouched")
+    ap.add_argument("--max-weight", type=int, default=MAX_STANDARD_TX_WEIGHT, help="weight limit per sweep")
+    ap.add_argument("--force", action="store_true", help="sweep even when projected savings are not positive")
+    ap.add_argument("--plan-out", help="write the plan as JSON")
+    ap.add_argument("--sign", action="store_true", help="build and sign the sweeps")
+    ap.add_argument("--broadcast", action="store_true", help="broadcast signed sweeps (implies --sign)")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="signing processes (P2WSH)")
+    ap.add_argument("--partial-dir", default=".", help="where to save partial multisig sweeps missing signatures")
+    ap.add_argument("--esplora-url", default=MEMPOOL_TESTNET4, help="Esplora API base URL")
+    args = ap.parse_args()
+
+    from bitcoinutils.keys import PrivateKey
+    from bitcoinutils.setup import setup
+    setup("testnet")
+    secrets = [PrivateKey(w).to_bytes() for w in args.wif]
+
+    if args.witness_script:
+        witness_script = bytes.fromhex(args.witness_script)
+        m, pubs = parse_multisig(witness_script)
+        spend = p2wsh_multisig_input(m, len(pubs), len(witness_script))
+        address = SegwitBech32Encoder.Encode(args.hrp, 0, hashlib.sha256(witness_script).digest())
+    else:
+        if len(secrets) != 1:
+            raise SystemExit("Для P2WPKH нужен ровно один --wif")
+        witness_script = None
+        spend = p2wpkh_input()
+        address = SegwitBech32Encoder.Encode(args.hrp, 0, hash160(get_backend().pubkey(secrets[0])))
+    dest = args.to or address
+    dest_script = address_script(dest)
+
+    client = EsploraClient(args.esplora_url)
+    try:
+        fee_rate = args.fee_rate or float(client.fee_recommended().get("economyFee", 1))
+        # сметаем только подтверждённое: неподтверждённые цепочки упираются в лимиты mempool
+        utxos = [u for u in client.address_utxos(address) if u.get("status", {}).get("confirmed", True)]
+    finally:
+        client.close()
+
+    plan = plan_consolidation(utxos, address, spend, dest_script, fee_rate, args.future_fee_rate,
+                              args.max_value, args.keep, args.max_weight)
+    summary = plan.summary(spend)
+    for k, v in summary.items():
+        print(f"{k}: {v}")
+    reason = hold_reason(summary, args.max_fee_rate, args.force)
+    if reason:
+        print(reason)
+        plan.sweeps = []
+
+    if (args.sign or args.broadcast) and plan.sweeps:
+        for n, sweep in enumerate(plan.sweeps, 1):
+            if witness_script is None:
+                tx = sign_p2wpkh(sweep, dest_script, secrets[0])
+            else:
+                ptx = PartialTx.from_tx(_unsigned(sweep, dest_script),
+                                        [u["value"] for u in sweep.inputs], witness_script)
+                sign_partial(ptx, secrets, args.workers)
+                try:
+                    tx = finalize(ptx)
+                except ValueError as e:
+                    path = os.path.join(args.partial_dir, f"sweep_{n}.json")
+                    ptx.save(path)
+                    print(f"sweep {n}: {e}; частичная подпись -> {path}")
+                    continue
+            buf = tx.serialize()
+            sweep.raw, sweep.txid = buf.hex(), tx.txid(buf)
+            print(f"sweep {n}: {len(sweep.inputs)} inputs, fee {sweep.fee}, vsize {tx.vsize()}, txid {sweep.txid}")
+        signed = [s.raw for s in plan.sweeps if s.raw]
+        if args.broadcast and signed:
+            # сметания независимы — отправляются параллельно
+            sender = EsploraClient(args.esplora_url, retries=0)
+            try:
+                jobs = broadcast_all(sender, signed)
+            finally:
+                sender.close()
+            for job in jobs.values():
+                print("broadcast:", job.txid if job.status == STATUS_SENT else f"{job.txid} {job.status} ({job.error})")
+
+    if args.plan_out:
+        with open(args.plan_out, "w", encoding="utf-8") as f:
+            json.dump(plan.to_json(spend), f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import hashlib
+import hmac
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from bip_utils import (
+    Base58Decoder,
+    Base58Encoder,
+    Bip44, Bip49, Bip84,
+    Bip44Coins, Bip49Coins, Bip84Coins,
+    Bip44Changes,
+    Bip44Levels,
+    Bip32Slip10Secp256k1,
+    SegwitBech32Decoder,
+)
+
+from ecbackend import get_backend, hash160
+
+PURPOSES = [
+    ("BIP44", Bip44, Bip44Coins.BITCOIN_TESTNET),
+    ("BIP49", Bip49, Bip49Coins.BITCOIN_TESTNET),
+    ("BIP84", Bip84, Bip84Coins.BITCOIN_TESTNET),
+]
+
+PURPOSE_NUM = {"BIP44": 44, "BIP49": 49, "BIP84": 84}
+
+# версии публичных расширенных ключей testnet, которые ждёт bip_utils
+# для каждого purpose (tpub / upub / vpub)
+XPUB_VERSIONS = {
+    "BIP44": bytes.fromhex("043587cf"),
+    "BIP49": bytes.fromhex("044a5262"),
+    "BIP84": bytes.fromhex("045f1cf6"),
+}
+
+_PURPOSE_CLS = {name: (cls, coin) for name, cls, coin in PURPOSES}
+
+
+def path_str(purpose: str, account: int, change: int, index: int) -> str:
+    return f"m/{PURPOSE_NUM[purpose]}'/1'/{account}'/{change}/{index}"
+
+
+def decode_target(addr: str) -> bytes:
+    # tb1q... -> 20-байтовая witness program (= hash160 сжатого pubkey)
+    try:
+        wit_ver, program = SegwitBech32Decoder.Decode("tb", addr.strip().lower())
+    except Exception as e:
+        raise ValueError(f"Не удалось разобрать адрес {addr}: {e}")
+    if wit_ver != 0 or len(program) != 20:
+        raise ValueError(f"Ожидается P2WPKH адрес tb1q...: {addr}")
+    return bytes(program)
+
+
+def parse_xpub(xpub: str) -> Tuple[bytes, bytes]:
+    """Расширенный публичный ключ любой версии -> (сжатый pubkey, chain code)."""
+    raw = Base58Decoder.CheckDecode(xpub.strip())
+    if len(raw) != 78 or raw[45] not in (2, 3):
+        raise ValueError("Ожидается расширенный публичный ключ (xpub/tpub/vpub/...)")
+    return bytes(raw[45:78]), bytes(raw[13:45])
+
+
+def ckd_pub(parent: bytes, chain_code: bytes, index: int, ec=None) -> Tuple[bytes, bytes]:
+    """BIP32 CKDpub: I = HMAC-SHA512(c, K || ser32(i)), K_i = K + I_L*G, c_i = I_R.
+
+    ValueError, если I_L >= n или результат — бесконечность (BIP32 велит
+    пропустить такой индекс).
+    """
+    if index >= 0x80000000:
+        raise ValueError("публичная деривация невозможна для hardened-индекса")
+    i = hmac.new(chain_code, parent + index.to_bytes(4, "big"), hashlib.sha512).digest()
+    return (ec or get_backend()).pub_tweak_add(parent, i[:32]), i[32:]
+
+
+@dataclass
+class ChainNode:
+    """Публичный узел m/purpose'/1'/account'/change.
+
+    Узел выводится один раз; каждый индекс адреса — одна публичная
+    (non-hardened) деривация ребёнка от него. Деривация идёт через
+    ecbackend, так что горячий цикл использует выбранный бэкенд secp256k1.
+    """
+
+    purpose: str
+    account: int
+    change: int
+    bip32: object  # Bip32Slip10Secp256k1, только публичная часть
+    _parent: bytes = field(init=False, repr=False)
+    _chain_code: bytes = field(init=False, repr=False)
+    _ec: object = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self._parent = self.bip32.PublicKey().RawCompressed().ToBytes()
+        self._chain_code = self.bip32.ChainCode().ToBytes()
+        self._ec = get_backend()
+
+    def pubkey(self, index: int) -> bytes:
+        try:
+            return ckd_pub(self._parent, self._chain_code, index, self._ec)[0]
+        except ValueError as e:
+            # I_L >= n или точка на бесконечности (вероятность ~2^-127): по
+            # BIP32 ключа с таким индексом нет вовсе, подставлять другой нельзя
+            path = path_str(self.purpose, self.account, self.change, index)
+            raise ValueError(f"{path}: недопустимый индекс BIP32 ({e})") from None
+
+    def hash160(self, index: int) -> bytes:
+        return hash160(self.pubkey(index))
+
+
+def _change_enum(change: int):
+    return Bip44Changes.CHAIN_EXT if change == 0 else Bip44Changes.CHAIN_INT
+
+
+def _public_chain(acc, purpose: str, account: int, change: int) -> ChainNode:
+    ch = acc.Change(_change_enum(change)).Bip32Object()
+    if not ch.IsPublicOnly():
+        ch.ConvertToPublic()
+    return ChainNode(purpose, account, change, ch)
+
+
+class SeedSource:
+    """Ключи из BIP39 seed: все purpose, аккаунты 0..account_max."""
+
+    def __init__(self, seed_bytes: bytes):
+        self.seed_bytes = seed_bytes
+        self._coins: Dict[str, object] = {}
+        self._chains: Dict[Tuple[str, int, int], ChainNode] = {}
+
+    def __getstate__(self):
+        # в воркеры уходит только seed, кэши строятся там заново
+        return {"seed_bytes": self.seed_bytes}
+
+    def __setstate__(self, state):
+        self.__init__(state["seed_bytes"])
+
+    def purposes(self) -> List[str]:
+        return [name for name, _, _ in PURPOSES]
+
+    def fingerprint(self) -> bytes:
+        # отпечаток мастер-ключа BIP32 (первые 4 байта hash160 его pubkey)
+        return Bip32Slip10Secp256k1.FromSeed(self.seed_bytes).FingerPrint().ToBytes()
+
+    def accounts(self, account_max: int) -> range:
+        return range(account_max + 1)
+
+    def _coin(self, purpose: str):
+        coin = self._coins.get(purpose)
+        if coin is None:
+            cls, coin_enum = _PURPOSE_CLS[purpose]
+            coin = cls.FromSeed(self.seed_bytes, coin_enum).Purpose().Coin()
+            self._coins[purpose] = coin
+        return coin
+
+    def chain(self, purpose: str, account: int, change: int) -> ChainNode:
+        key = (purpose, account, change)
+        node = self._chains.get(key)
+        if node is None:
+            node = _public_chain(self._coin(purpose).Account(account), purpose, account, change)
+            self._chains[key] = node
+        return node
+
+    def wif(self, purpose: str, account: int, change: int, index: int) -> Optional[str]:
+        # приватный ключ выводится только для найденного индекса
+        acc = self._coin(purpose).Account(account)
+        return acc.Change(_change_enum(change)).AddressIndex(index).PrivateKey().ToWif()
+
+
+class XpubSource:
+    """Ключи из публичного ключа аккаунта (xpub/tpub/upub/vpub).
+
+    Мнемоника не нужна; приватные ключи, соответственно, недоступны.
+    """
+
+    def __init__(self, xpub: str, purpose: str):
+        if purpose not in _PURPOSE_CLS:
+            raise ValueError(f"Неизвестный purpose: {purpose}")
+        self.xpub = xpub.strip()
+        self.purpose = purpose
+        cls, coin_enum = _PURPOSE_CLS[purpose]
+
+        # bip_utils проверяет префикс под purpose, поэтому tpub для BIP84
+        # перекодируется в vpub (и т.п.) — сами ключ и chain code не меняются
+        raw = Base58Decoder.CheckDecode(self.xpub)
+        normalized = Base58Encoder.CheckEncode(XPUB_VERSIONS[purpose] + raw[4:])
+        self._acc = cls.FromExtendedKey(normalized, coin_enum)
+        if not self._acc.IsLevel(Bip44Levels.ACCOUNT):
+            raise ValueError("Ожидается ключ уровня аккаунта (m/purpose'/coin'/account')")
+        self.account = self._acc.Bip32Object().Index().Unharden().ToInt()
+        self._chains: Dict[int, ChainNode] = {}
+
+    def __getstate__(self):
+        return {"xpub": self.xpub, "purpose": self.purpose}
+
+    def __setstate__(self, state):
+        self.__init__(state["xpub"], state["purpose"])
+
+    def purposes(self) -> List[str]:
+        return [self.purpose]
+
+    def fingerprint(self) -> bytes:
+        return self._acc.Bip32Object().FingerPrint().ToBytes()
+
+    def accounts(self, account_max: int) -> range:
+        return range(self.account, self.account + 1)
+
+    def chain(self, purpose: str, account: int, change: int) -> ChainNode:
+        node = self._chains.get(change)
+        if node is None:
+            node = _public_chain(self._acc, purpose, account, change)
+            self._chains[change] = node
+        return node
+
+    def wif(self, purpose: str, account: int, change: int, index: int) -> Optional[str]:
+        return None
+
+
+def iter_chains(source, account_max: int, include_internal: bool) -> Iterator[ChainNode]:
+    changes = [0, 1] if include_internal else [0]
+    for purpose in source.purposes():
+        for account in source.accounts(account_max):
+            for change in changes:
+                yield source.chain(purpose, account, change)
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from bip_utils import Base58ChecksumError, Base58Decoder, Bech32ChecksumError, SegwitBech32Decoder
+
+from ecbackend import hash160
+
+# верхняя граница номера аккаунта (hardened-индексы); сам перебор
+# останавливается на первом пустом аккаунте
+MAX_ACCOUNT = 2 ** 31 - 1
+
+_P2PKH_VERSIONS = (0x00, 0x6F)
+_P2SH_VERSIONS = (0x05, 0xC4)
+
+# сеть -> (bech32 HRP, версии base58 P2PKH/P2SH)
+NETWORKS = {
+    "mainnet": ("bc", (0x00, 0x05)),
+    "testnet": ("tb", (0x6F, 0xC4)),
+    "regtest": ("bcrt", (0x6F, 0xC4)),
+}
+
+
+def address_script(addr: str, network: Optional[str] = None) -> bytes:
+    """Адрес -> scriptPubKey.
+
+    Сравнение идёт по скриптам, поэтому один и тот же файл истории годится
+    и для testnet (tb1/m/n/2), и для regtest (bcrt1). С network адрес
+    другой сети отклоняется — для выплат, где ошибка стоит денег.
+    """
+    addr = addr.strip()
+    lower = addr.lower()
+    hrp = lower.rsplit("1", 1)[0] if "1" in lower else ""
+    want_hrp, want_versions = NETWORKS[network] if network else (None, None)
+    if hrp in ("bc", "tb", "bcrt"):
+        if want_hrp is not None and hrp != want_hrp:
+            raise ValueError(f"Адрес {addr} не из сети {network}")
+        try:
+            wit_ver, program = SegwitBech32Decoder.Decode(hrp, lower)
+        except Bech32ChecksumError as e:
+            raise ValueError(f"Неверная контрольная сумма адреса {addr}: {e}") from None
+        op = 0 if wit_ver == 0 else 0x50 + wit_ver
+        return bytes([op, len(program)]) + bytes(program)
+    try:
+        raw = Base58Decoder.CheckDecode(addr)
+    except Base58ChecksumError as e:
+        raise ValueError(f"Неверная контрольная сумма адреса {addr}: {e}") from None
+    if want_versions is not None and raw[:1] and raw[0] not in want_versions:
+        raise ValueError(f"Адрес {addr} не из сети {network}")
+    if len(raw) != 21:
+        raise ValueError(f"Неизвестный формат адреса: {addr}")
+    if raw[0] in _P2PKH_VERSIONS:
+        return b"\x76\xa9\x14" + raw[1:] + b"\x88\xac"
+    if raw[0] in _P2SH_VERSIONS:
+        return b"\xa9\x14" + raw[1:] + b"\x87"
+    raise ValueError(f"Неизвестная версия адреса: {addr}")
+
+
+def purpose_script(purpose: str, pubkey: bytes) -> bytes:
+    # тип выхода, который кошелёк использует для данного purpose
+    h160 = hash160(pubkey)
+    if purpose == "BIP44":
+        return b"\x76\xa9\x14" + h160 + b"\x88\xac"
+    if purpose == "BIP49":
+        return b"\xa9\x14" + hash160(b"\x00\x14" + h160) + b"\x87"
+    return b"\x00\x14" + h160
+
+
+def load_history_file(path: str) -> Dict[bytes, str]:
+    """Использованные адреса из файла: по адресу на строку или JSONL с полем "address"."""
+    used: Dict[bytes, str] = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            addr = json.loads(line)["address"] if line.startswith("{") else line
+            try:
+                used[address_script(addr)] = addr
+            except Exception as e:
+                raise ValueError(f"{path}:{lineno}: {e}")
+    return used
+
+
+def load_node_activity(rpc_url: str) -> Dict[bytes, str]:
+    """Использованные адреса из кошелька bitcoind (regtest/testnet).
+
+    Кошелёк должен знать адреса (например, watch-only с импортированными
+    дескрипторами); учитываются все адреса, у которых есть транзакции.
+    """
+    from bitcoinrpc.authproxy import AuthServiceProxy
+
+    rpc = AuthServiceProxy(rpc_url)
+    used: Dict[bytes, str] = {}
+    for item in rpc.listreceivedbyaddress(0, False, True):
+        if item.get("txids"):
+            used[address_script(item["address"])] = item["address"]
+    return used
+
+
+@dataclass(frozen=True)
+class UsedPath:
+    purpose: str
+    account: int
+    change: int
+    index: int
+    address: str
+
+
+def scan_chain(node, used: Dict[bytes, str], gap: int) -> List[UsedPath]:
+    # идём по индексам, пока не встретим gap неиспользованных подряд
+    hits: List[UsedPath] = []
+    index = 0
+    unused = 0
+    while unused < gap:
+        script = purpose_script(node.purpose, node.pubkey(index))
+        addr = used.get(script)
+        if addr is not None:
+            hits.append(UsedPath(node.purpose, node.account, node.change, index, addr))
+            unused = 0
+        else:
+            unused += 1
+        index += 1
+    return hits
+
+
+def discover(source, used: Dict[bytes, str], gap: int = 20, include_internal: bool = True,
+             max_account: Optional[int] = None) -> List[UsedPath]:
+    """Обход дерева по правилам BIP44 account discovery.
+
+    Чейн заканчивается после gap неиспользованных адресов подряд, перебор
+    аккаунтов — на первом аккаунте без истории на внешнем чейне. Время
+    пропорционально реальному использованию кошелька.
+    """
+    found: List[UsedPath] = []
+    for purpose in source.purposes():
+        for account in source.accounts(MAX_ACCOUNT if max_account is None else max_account):
+            external = scan_chain(source.chain(purpose, account, 0), used, gap)
+            if not external:
+                break
+            found.extend(external)
+            if include_internal:
+                found.extend(scan_chain(source.chain(purpose, account, 1), used, gap))
+    return found
@@ -0,0 +1,336 @@
+from __future__ import annotations
+
+import hashlib
+import hmac
+import os
+from typing import Dict, List, Optional, Tuple
+
+# Общая точка входа для операций secp256k1 в горячих циклах:
+# вычисление pubkey, публичная деривация BIP32 (tweak-add), hash160 и
+# подпись ECDSA. Бэкенд выбирается явно (EC_BACKEND=coincurve|ecdsa|pure
+# или get_backend(name)) либо автоматически — первый доступный из
+# PREFERENCE, они перечислены от быстрого к медленному (см. bench_ec.py).
+
+PREFERENCE = ("coincurve", "ecdsa", "pure")
+
+P = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEFFFFFC2F
+N = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+GX = 0x79BE667EF9DCBBAC55A06295CE870B07029BFCDB2DCE28D959F2815B16F81798
+GY = 0x483ADA7726A3C4655DA4FBFC0E1108A8FD17B448A68554199C47D08FFB10D4B8
+
+
+def _ripemd160_hashlib(data: bytes) -> bytes:
+    return hashlib.new("ripemd160", data).digest()
+
+
+def _ripemd160_fallback(data: bytes) -> bytes:
+    # в OpenSSL 3 ripemd160 может быть отключён — тогда чистый Python из bip_utils
+    from bip_utils import Ripemd160
+
+    return Ripemd160.QuickDigest(data)
+
+
+try:
+    hashlib.new("ripemd160", b"")
+    _ripemd160 = _ripemd160_hashlib
+except ValueError:
+    _ripemd160 = _ripemd160_fallback
+
+
+def hash160(data: bytes) -> bytes:
+    return _ripemd160(hashlib.sha256(data).digest())
+
+
+def _grind_counter(attempt: int) -> bytes:
+    # как в Bitcoin Core: счётчик little-endian в 32 байтах extra data RFC6979
+    return attempt.to_bytes(4, "little") + b"\x00" * 28
+
+
+def _is_low_r(der: bytes) -> bool:
+    # SigHasLowR из Bitcoin Core: r < 2^255, то есть в DER r занимает не
+    # больше 32 байт (короткий r тоже low R) и подпись не длиннее 71 байта
+    return der[3] <= 32
+
+
+class CoincurveBackend:
+    """libsecp256k1 через coincurve."""
+
+    name = "coincurve"
+
+    def __init__(self):
+        import coincurve
+        from coincurve._libsecp256k1 import ffi
+
+        self._cc = coincurve
+        self._ffi = ffi
+
+    def pubkey(self, secret: bytes) -> bytes:
+        return self._cc.PrivateKey(secret).public_key.format(compressed=True)
+
+    def pub_tweak_add(self, pub: bytes, tweak: bytes) -> bytes:
+        return self._cc.PublicKey(pub).add(tweak).format(compressed=True)
+
+    def sign(self, secret: bytes, digest: bytes) -> bytes:
+        key = self._cc.PrivateKey(secret)
+        # libsecp256k1 сам нормализует S; low R добирается перебором extra data
+        sig = key.sign(digest, hasher=None)
+        attempt = 1
+        while not _is_low_r(sig):
+            nonce = (self._ffi.NULL, self._ffi.new("unsigned char[32]", _grind_counter(attempt)))
+            sig = key.sign(digest, hasher=None, custom_nonce=nonce)
+            attempt += 1
+        return sig
+
+    def verify(self, pub: bytes, digest: bytes, sig: bytes) -> bool:
+        return self._cc.PublicKey(pub).verify(sig, digest, hasher=None)
+
+
+class EcdsaBackend:
+    """python-ecdsa (использует gmpy2, если он установлен)."""
+
+    name = "ecdsa"
+
+    def __init__(self):
+        import ecdsa
+        from ecdsa.util import sigdecode_der, sigencode_der_canonize
+
+        self._ecdsa = ecdsa
+        self._curve = ecdsa.SECP256k1
+        self._enc = sigencode_der_canonize
+        self._dec = sigdecode_der
+
+    def pubkey(self, secret: bytes) -> bytes:
+        sk = self._ecdsa.SigningKey.from_string(secret, curve=self._curve)
+        return sk.get_verifying_key().to_string("compressed")
+
+    def pub_tweak_add(self, pub: bytes, tweak: bytes) -> bytes:
+        t = int.from_bytes(tweak, "big")
+        if t >= N:
+            raise ValueError("tweak вне диапазона")
+        point = self._ecdsa.VerifyingKey.from_string(pub, curve=self._curve).pubkey.point
+        point = point + self._curve.generator * t
+        if point == self._ecdsa.ellipticcurve.INFINITY:
+            raise ValueError("результат — бесконечно удалённая точка")
+        vk = self._ecdsa.VerifyingKey.from_public_point(point, curve=self._curve)
+        return vk.to_string("compressed")
+
+    def sign(self, secret: bytes, digest: bytes) -> bytes:
+        sk = self._ecdsa.SigningKey.from_string(secret, curve=self._curve)
+        attempt = 0
+        while True:
+            extra = _grind_counter(attempt) if attempt else b""
+            sig = sk.sign_digest_deterministic(
+                digest, hashfunc=hashlib.sha256, sigencode=self._enc, extra_entropy=extra
+            )
+            if _is_low_r(sig):
+                return sig
+            attempt += 1
+
+    def verify(self, pub: bytes, digest: bytes, sig: bytes) -> bool:
+        vk = self._ecdsa.VerifyingKey.from_string(pub, curve=self._curve)
+        try:
+            return vk.verify_digest(sig, digest, sigdecode=self._dec)
+        except self._ecdsa.BadSignatureError:
+            return False
+
+
+# --- чистый Python: якобиевы координаты, без внешних зависимостей ---
+
+_Jac = Tuple[int, int, int]
+_INF: _Jac = (0, 1, 0)
+
+
+def _jac_double(p: _Jac) -> _Jac:
+    x, y, z = p
+    if not y or not z:
+        return _INF
+    ysq = y * y % P
+    s = 4 * x * ysq % P
+    m = 3 * x * x % P
+    nx = (m * m - 2 * s) % P
+    ny = (m * (s - nx) - 8 * ysq * ysq) % P
+    nz = 2 * y * z % P
+    return nx, ny, nz
+
+
+def _jac_add(p: _Jac, q: _Jac) -> _Jac:
+    if not p[2]:
+        return q
+    if not q[2]:
+        return p
+    x1, y1, z1 = p
+    x2, y2, z2 = q
+    z1sq, z2sq = z1 * z1 % P, z2 * z2 % P
+    u1, u2 = x1 * z2sq % P, x2 * z1sq % P
+    s1, s2 = y1 * z2sq * z2 % P, y2 * z1sq * z1 % P
+    if u1 == u2:
+        return _jac_double(p) if s1 == s2 else _INF
+    h, r = u2 - u1, s2 - s1
+    h2 = h * h % P
+    h3 = h * h2 % P
+    u1h2 = u1 * h2 % P
+    nx = (r * r - h3 - 2 * u1h2) % P
+    ny = (r * (u1h2 - nx) - s1 * h3) % P
+    nz = h * z1 * z2 % P
+    return nx, ny, nz
+
+
+def _jac_mul(p: _Jac, k: int) -> _Jac:
+    result = _INF
+    addend = p
+    while k:
+        if k & 1:
+            result = _jac_add(result, addend)
+        addend = _jac_double(addend)
+        k >>= 1
+    return result
+
+
+def _to_affine(p: _Jac) -> Tuple[int, int]:
+    zinv = pow(p[2], -1, P)
+    zinv2 = zinv * zinv % P
+    return p[0] * zinv2 % P, p[1] * zinv2 * zinv % P
+
+
+def _compress(p: _Jac) -> bytes:
+    x, y = _to_affine(p)
+    return bytes([2 + (y & 1)]) + x.to_bytes(32, "big")
+
+
+def _decompress(pub: bytes) -> _Jac:
+    if len(pub) != 33 or pub[0] not in (2, 3):
+        raise ValueError("ожидается сжатый pubkey")
+    x = int.from_bytes(pub[1:], "big")
+    y = pow((x * x * x + 7) % P, (P + 1) // 4, P)
+    if (y * y - x * x * x - 7) % P:
+        raise ValueError("точка не на кривой")
+    if (y & 1) != (pub[0] & 1):
+        y = P - y
+    return x, y, 1
+
+
+_G: _Jac = (GX, GY, 1)
+
+
+def _der_int(v: int) -> bytes:
+    b = v.to_bytes(32, "big").lstrip(b"\x00") or b"\x00"
+    if b[0] & 0x80:
+        b = b"\x00" + b
+    return b"\x02" + bytes([len(b)]) + b
+
+
+def _der_decode(sig: bytes) -> Tuple[int, int]:
+    if sig[0] != 0x30 or sig[1] != len(sig) - 2 or sig[2] != 0x02:
+        raise ValueError("некорректная DER-подпись")
+    rlen = sig[3]
+    r = int.from_bytes(sig[4:4 + rlen], "big")
+    if sig[4 + rlen] != 0x02:
+        raise ValueError("некорректная DER-подпись")
+    slen = sig[5 + rlen]
+    s = int.from_bytes(sig[6 + rlen:6 + rlen + slen], "big")
+    return r, s
+
+
+def _rfc6979_k(secret: int, digest: bytes, extra: bytes = b"") -> int:
+    x = secret.to_bytes(32, "big")
+    h = (int.from_bytes(digest, "big") % N).to_bytes(32, "big")
+    v = b"\x01" * 32
+    k = b"\x00" * 32
+    k = hmac.new(k, v + b"\x00" + x + h + extra, hashlib.sha256).digest()
+    v = hmac.new(k, v, hashlib.sha256).digest()
+    k = hmac.new(k, v + b"\x01" + x + h + extra, hashlib.sha256).digest()
+    v = hmac.new(k, v, hashlib.sha256).digest()
+    while True:
+        v = hmac.new(k, v, hashlib.sha256).digest()
+        cand = int.from_bytes(v, "big")
+        if 1 <= cand < N:
+            return cand
+        k = hmac.new(k, v + b"\x00", hashlib.sha256).digest()
+        v = hmac.new(k, v, hashlib.sha256).digest()
+
+
+class PurePythonBackend:
+    """Без зависимостей; медленно, но всегда доступен."""
+
+    name = "pure"
+
+    def pubkey(self, secret: bytes) -> bytes:
+        d = int.from_bytes(secret, "big")
+        if not 1 <= d < N:
+            raise ValueError("приватный ключ вне диапазона")
+        return _compress(_jac_mul(_G, d))
+
+    def pub_tweak_add(self, pub: bytes, tweak: bytes) -> bytes:
+        t = int.from_bytes(tweak, "big")
+        if t >= N:
+            raise ValueError("tweak вне диапазона")
+        point = _jac_add(_decompress(pub), _jac_mul(_G, t))
+        if not point[2]:
+            raise ValueError("результат — бесконечно удалённая точка")
+        return _compress(point)
+
+    def sign(self, secret: bytes, digest: bytes) -> bytes:
+        d = int.from_bytes(secret, "big")
+        z = int.from_bytes(digest, "big") % N
+        attempt = 0
+        while True:
+            k = _rfc6979_k(d, digest, _grind_counter(attempt) if attempt else b"")
+            attempt += 1
+            r = _to_affine(_jac_mul(_G, k))[0] % N
+            if not r or r >= 2 ** 255:
+                continue
+            s = pow(k, -1, N) * (z + r * d) % N
+            if not s:
+                continue
+            if s > N // 2:
+                s = N - s
+            body = _der_int(r) + _der_int(s)
+            return b"\x30" + bytes([len(body)]) + body
+
+    def verify(self, pub: bytes, digest: bytes, sig: bytes) -> bool:
+        r, s = _der_decode(sig)
+        if not (1 <= r < N and 1 <= s < N):
+            return False
+        z = int.from_bytes(digest, "big") % N
+        w = pow(s, -1, N)
+        point = _jac_add(_jac_mul(_G, z * w % N), _jac_mul(_decompress(pub), r * w % N))
+        if not point[2]:
+            return False
+        return _to_affine(point)[0] % N == r
+
+
+_FACTORIES = {
+    "coincurve": CoincurveBackend,
+    "ecdsa": EcdsaBackend,
+    "pure": PurePythonBackend,
+}
+
+_cache: Dict[str, object] = {}
+
+
+def available_backends() -> List[str]:
+    names = []
+    for name in PREFERENCE:
+        try:
+            get_backend(name)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def get_backend(name: Optional[str] = None):
+    """Бэкенд по имени, из EC_BACKEND или самый быстрый из установленных."""
+    name = name or os.environ.get("EC_BACKEND") or None
+    if name is None:
+        for candidate in PREFERENCE:
+            try:
+                return get_backend(candidate)
+            except ImportError:
+                continue
+        raise RuntimeError("Нет доступного бэкенда secp256k1")
+    if name not in _FACTORIES:
+        raise ValueError(f"Неизвестный бэкенд secp256k1: {name} (есть: {', '.join(PREFERENCE)})")
+    if name not in _cache:
+        _cache[name] = _FACTORIES[name]()
+    return _cache[name]
@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ratelimit import RETRY_STATUS, retry_after, retry_delay
+from txbuilder import Tx
+
+# Общий клиент Esplora (mempool.space / blockstream / локальный mock):
+# одна requests.Session с keep-alive пулом, повторы с экспоненциальной
+# задержкой и jitter, TTL-кэш рекомендаций комиссии и списков UTXO.
+# Кэш можно сохранять в файл, чтобы повторные запуски его переиспользовали;
+# успешная отправка транзакции сбрасывает закэшированные UTXO.
+
+MEMPOOL_TESTNET4 = "https://mempool.space/testnet4/api"
+
+FEE_TTL = 60.0    # рекомендации комиссии меняются не чаще блока/минуты
+UTXO_TTL = 30.0
+# ответы узла, означающие, что транзакция уже у него
+ALREADY_KNOWN = ("txn-already-known", "txn-already-in-mempool", "already in block chain")
+
+
+class EsploraError(RuntimeError):
+    def __init__(self, message: str, status: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status  # HTTP-код ответа; None — ответа не было
+        self.retry_after = retry_after
+
+
+class EsploraClient:
+    def __init__(self, base_url: str = MEMPOOL_TESTNET4, timeout: float = 20.0, retries: int = 4,
+                 backoff: float = 0.5, max_backoff: float = 10.0, pool_size: int = 8,
+                 fee_ttl: float = FEE_TTL, utxo_ttl: float = UTXO_TTL,
+                 cache_file: Optional[str] = None):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.fee_ttl = fee_ttl
+        self.utxo_ttl = utxo_ttl
+        self.cache_file = cache_file
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._lock = threading.Lock()
+        # ключ -> (истекает в, значение); время — wall clock, чтобы пережить перезапуск
+        self._cache: Dict[str, Tuple[float, Any]] = {}
+        self.stats = {"requests": 0, "retries": 0, "cache_hits": 0}
+        self._load_cache()
+
+    # ---- кэш ----
+
+    def _key(self, path: str) -> str:
+        return self.base_url + path
+
+    def _load_cache(self) -> None:
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return  # битый кэш просто игнорируем
+        now = time.time()
+        self._cache = {k: (exp, v) for k, (exp, v) in data.items() if exp > now}
+
+    def _save_cache(self) -> None:
+        if not self.cache_file:
+            return
+        tmp = self.cache_file + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({k: [exp, v] for k, (exp, v) in self._cache.items()}, f)
+        os.replace(tmp, self.cache_file)
+
+    def _cached(self, path: str, ttl: float):
+        key = self._key(path)
+        with self._lock:
+            hit = self._cache.get(key)
+            if hit and hit[0] > time.time():
+                self.stats["cache_hits"] += 1
+                return hit[1]
+        value = self.get_json(path)
+        with self._lock:
+            self._cache[key] = (time.time() + ttl, value)
+            self._save_cache()
+        return value
+
+    def invalidate(self, prefix: str = "") -> None:
+        with self._lock:
+            full = self._key(prefix)
+            self._cache = {k: v for k, v in self._cache.items() if not k.startswith(full)}
+            self._save_cache()
+
+    # ---- HTTP ----
+
+    @staticmethod
+    def _retry_after(resp: Optional[requests.Response]) -> Optional[float]:
+        return retry_after(resp.headers) if resp is not None else None
+
+    def _sleep_before_retry(self, attempt: int, resp: Optional[requests.Response]) -> None:
+        self.stats["retries"] += 1
+        time.sleep(retry_delay(attempt, self.backoff, self.max_backoff, self._retry_after(resp)))
+
+    def _request(self, method: str, path: str, **kw) -> requests.Response:
+        url = self.base_url + path
+        for attempt in range(self.retries + 1):
+            resp = None
+            try:
+                self.stats["requests"] += 1
+                resp = self.session.request(method, url, timeout=self.timeout, **kw)
+                if resp.status_code not in RETRY_STATUS:
+                    return resp
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.retries:
+                    raise
+            if attempt == self.retries:
+                return resp
+            self._sleep_before_retry(attempt, resp)
+        raise AssertionError("unreachable")
+
+    def get_json(self, path: str):
+        r = self._request("GET", path)
+        if not r.ok:
+            raise EsploraError(f"GET {path}: HTTP {r.status_code}\nResponse: {r.text}\n",
+                               r.status_code, self._retry_after(r))
+        return r.json()
+
+    def post_text(self, path: str, body: str) -> str:
+        r = self._request("POST", path, data=body.encode("utf-8"))
+        if not r.ok:
+            raise EsploraError(f"Broadcast failed: HTTP {r.status_code}\nResponse: {r.text}\n",
+                               r.status_code, self._retry_after(r))
+        return r.text.strip()
+
+    # ---- API ----
+
+    def fee_recommended(self) -> Dict[str, int]:
+        return self._cached("/v1/fees/recommended", self.fee_ttl)
+
+    def address_utxos(self, address: str) -> List[dict]:
+        return self._cached(f"/address/{address}/utxo", self.utxo_ttl)
+
+    def tx_status(self, txid: str) -> Optional[dict]:
+        """{"confirmed", "block_height", ...}; None — транзакцию узел не знает."""
+        try:
+            return self.get_json(f"/tx/{txid}/status")
+        except EsploraError as e:
+            if e.status == 404:
+                return None
+            raise
+
+    def broadcast(self, raw_hex: str) -> str:
+        try:
+            txid = self.post_text("/tx", raw_hex)
+        except EsploraError as e:
+            # POST повторяется после таймаута, а первая попытка могла дойти:
+            # «уже есть» — это успех, а не ошибка
+            if not any(s in str(e) for s in ALREADY_KNOWN):
+                raise
+            txid = Tx.parse(bytes.fromhex(raw_hex.strip())).txid()
+        # потраченные входы больше не UTXO — следующий подбор должен их не видеть
+        self.invalidate("/address/")
+        return txid
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __enter__(self) -> "EsploraClient":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -3,7 +3,10 @@ from bitcoinutils.keys import PrivateKey
 from bitcoinutils.script import Script
 from bitcoinutils.keys import P2wshAddress
 
+from ecbackend import get_backend
+
 setup("testnet")
+ec = get_backend()
 
 # 1) генерим 2 ключа (для двух пользователей)
 k1 = PrivateKey()         # random
@@ -12,8 +15,9 @@ k2 = PrivateKey()         # random
 wif1 = k1.to_wif()
 wif2 = k2.to_wif()
 
-pub1 = k1.get_public_key().to_hex()
-pub2 = k2.get_public_key().to_hex()
+# pubkey считаются выбранным бэкендом secp256k1 (EC_BACKEND)
+pub1 = ec.pubkey(k1.to_bytes()).hex()
+pub2 = ec.pubkey(k2.to_bytes()).hex()
 
 # 2) witnessScript для 2-of-2: 2 <pub1> <pub2> 2 CHECKMULTISIG
 # ВАЖНО: порядок pubkey фиксирует порядок подписей при трате.
@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+# Локальный Esplora для тестов и бенчмарков: рекомендации комиссии,
+# UTXO адресов, статус транзакции и POST /tx. Принятая транзакция помечает свои входы
+# потраченными, так что видно и инвалидацию кэша клиента. Можно добавить
+# задержку и долю ответов 503/429, чтобы проверить повторы.
+
+_UTXO_RE = re.compile(r"^/address/([^/]+)/utxo$")
+_TX_STATUS_RE = re.compile(r"^/tx/([0-9a-f]{64})/status$")
+
+
+def _read_varint(raw: bytes, pos: int) -> Tuple[int, int]:
+    b = raw[pos]
+    if b < 0xFD:
+        return b, pos + 1
+    size = {0xFD: 2, 0xFE: 4, 0xFF: 8}[b]
+    return int.from_bytes(raw[pos + 1:pos + 1 + size], "little"), pos + 1 + size
+
+
+def parse_tx(raw: bytes) -> Tuple[str, List[Tuple[str, int]]]:
+    """(txid, потраченные outpoint'ы) из сырой транзакции (legacy или segwit)."""
+    segwit = raw[4:6] == b"\x00\x01"
+    pos = 6 if segwit else 4
+    io_start = pos
+    n_in, pos = _read_varint(raw, pos)
+    spent = []
+    for _ in range(n_in):
+        spent.append((raw[pos:pos + 32][::-1].hex(), struct.unpack_from("<I", raw, pos + 32)[0]))
+        size, pos = _read_varint(raw, pos + 36)
+        pos += size + 4
+    n_out, pos = _read_varint(raw, pos)
+    for _ in range(n_out):
+        size, pos = _read_varint(raw, pos + 8)
+        pos += size
+    stripped = raw[:4] + raw[io_start:pos] + raw[-4:]
+    txid = hashlib.sha256(hashlib.sha256(stripped).digest()).digest()[::-1].hex()
+    return txid, spent
+
+
+class MockState:
+    def __init__(self, utxos: Dict[str, List[dict]], fees: Optional[dict] = None,
+                 latency: float = 0.0, fail_rate: float = 0.0, seed: Optional[int] = None):
+        self.utxos = utxos
+        self.fees = fees or {"fastestFee": 5, "halfHourFee": 3, "hourFee": 2,
+                             "economyFee": 1, "minimumFee": 1}
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.mempool: Dict[str, str] = {}
+        self.confirmed: Dict[str, int] = {}  # txid -> высота блока
+        self.hits = 0
+
+    def should_fail(self) -> bool:
+        with self.lock:
+            self.hits += 1
+            return self.rng.random() < self.fail_rate
+
+
+def make_handler(state: MockState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, как у настоящего сервера
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def _send(self, code: int, body: str, ctype: str = "application/json", headers=()):
+            data = body.encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(data)))
+            for k, v in headers:
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _prologue(self) -> bool:
+            if state.latency:
+                time.sleep(state.latency)
+            if state.should_fail():
+                if state.rng.random() < 0.5:
+                    self._send(429, "rate limited", "text/plain", [("Retry-After", "0")])
+                else:
+                    self._send(503, "unavailable", "text/plain")
+                return False
+            return True
+
+        def do_GET(self):
+            if not self._prologue():
+                return
+            path = self.path.split("?", 1)[0]
+            # пути как у mempool.space: /api/..., /testnet4/api/... и без префикса
+            path = re.sub(r"^(/[a-z0-9]+)?/api", "", path)
+            if path == "/v1/fees/recommended":
+                return self._send(200, json.dumps(state.fees))
+            m = _UTXO_RE.match(path)
+            if m:
+                with state.lock:
+                    body = json.dumps(state.utxos.get(m.group(1), []))
+                return self._send(200, body)
+            m = _TX_STATUS_RE.match(path)
+            if m:
+                with state.lock:
+                    height = state.confirmed.get(m.group(1))
+                    known = height is not None or m.group(1) in state.mempool
+                if not known:
+                    return self._send(404, "Transaction not found", "text/plain")
+                status = {"confirmed": True, "block_height": height} if height else {"confirmed": False}
+                return self._send(200, json.dumps(status))
+            self._send(404, "not found", "text/plain")
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+            if not self._prologue():
+                return
+            if re.sub(r"^(/[a-z0-9]+)?/api", "", self.path) != "/tx":
+                return self._send(404, "not found", "text/plain")
+            try:
+                txid, spent = parse_tx(bytes.fromhex(body.strip()))
+            except (ValueError, IndexError, KeyError, struct.error):
+                return self._send(400, "sendrawtransaction RPC error: TX decode failed", "text/plain")
+            with state.lock:
+                if txid in state.mempool or txid in state.confirmed:
+                    return self._send(400, 'sendrawtransaction RPC error: {"code":-26,'
+                                           '"message":"txn-already-in-mempool"}', "text/plain")
+                spent_set = set(spent)
+                for addr, lst in state.utxos.items():
+                    state.utxos[addr] = [u for u in lst if (u["txid"], u["vout"]) not in spent_set]
+                state.mempool[txid] = body.strip()
+            self._send(200, txid, "text/plain")
+
+    return Handler
+
+
+def serve(state: MockState, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Запустить сервер в фоновом потоке; port=0 — любой свободный."""
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def random_utxos(address: str, count: int, seed: int = 0) -> Dict[str, List[dict]]:
+    rng = random.Random(seed)
+    return {address: [
+        {"txid": rng.randbytes(32).hex(), "vout": rng.randrange(4), "value": rng.randint(1_000, 2_000_000),
+         "status": {"confirmed": True}}
+        for _ in range(count)
+    ]}
+
+
+def bench(requests_n: int, address: str) -> None:
+    # новый коннект на каждый запрос (как было) против общего пула и кэша
+    import requests
+    from esplora import EsploraClient
+
+    state = MockState(random_utxos(address, 500), latency=0.002)
+    server = serve(state)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        t0 = time.perf_counter()
+        for _ in range(requests_n):
+            requests.get(f"{base}/address/{address}/utxo", timeout=20).json()
+        fresh = time.perf_counter() - t0
+
+        with EsploraClient(base, utxo_ttl=0) as client:
+            t0 = time.perf_counter()
+            for _ in range(requests_n):
+                client.address_utxos(address)
+            pooled = time.perf_counter() - t0
+
+        with EsploraClient(base) as client:
+            t0 = time.perf_counter()
+            for _ in range(requests_n):
+                client.address_utxos(address)
+            cached = time.perf_counter() - t0
+    finally:
+        server.shutdown()
+    for name, el in (("fresh connection", fresh), ("pooled", pooled), ("pooled + TTL cache", cached)):
+        print(f"{name:<20} {requests_n / el:>10,.0f} req/s  ({el * 1000 / requests_n:.2f} ms/req)")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Local mock Esplora API (fees, address UTXOs, tx broadcast)")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=3002)
+    ap.add_argument("--utxos", help='JSON file {"address": [{"txid", "vout", "value"}, ...]}')
+    ap.add_argument("--address", help="generate random UTXOs for this address")
+    ap.add_argument("--count", type=int, default=1000, help="number of generated UTXOs")
+    ap.add_argument("--latency", type=float, default=0.0, help="added latency per request, seconds")
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="share of requests answered 429/503")
+    ap.add_argument("--bench", type=int, metavar="N", help="run a client benchmark with N requests and exit")
+    args = ap.parse_args()
+
+    if args.bench:
+        bench(args.bench, args.address or "tb1qmock")
+        return
+
+    utxos: Dict[str, List[dict]] = {}
+    if args.utxos:
+        with open(args.utxos, "r", encoding="utf-8") as f:
+            utxos = json.load(f)
+    if args.address:
+        utxos.update(random_utxos(args.address, args.count, seed=int.from_bytes(os.urandom(4), "little")))
+
+    state = MockState(utxos, latency=args.latency, fail_rate=args.fail_rate)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(state))
+    print(f"mock esplora on http://{args.host}:{args.port}/api ({sum(map(len, utxos.values()))} utxos)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
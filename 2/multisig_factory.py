@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import hashlib
+import multiprocessing as mp
+import os
+import sqlite3
+import time
+from typing import Iterator, List, Sequence, Tuple
+
+from bip_utils import SegwitBech32Encoder
+
+from derive import ckd_pub, parse_xpub
+from ecbackend import get_backend
+
+OP_CHECKMULTISIG = 0xAE
+
+Row = Tuple[int, str, bytes]  # index, P2WSH адрес, witnessScript
+
+
+def multisig_script(m: int, pubkeys: Sequence[bytes]) -> bytes:
+    # BIP67: ключи сортируются лексикографически, порядок cosigner'ов не важен
+    n = len(pubkeys)
+    if not 1 <= m <= n <= 16:
+        raise ValueError(f"Некорректные m-of-n: {m}-of-{n}")
+    script = bytearray([0x50 + m])
+    for pub in sorted(pubkeys):
+        script.append(len(pub))
+        script += pub
+    script += bytes([0x50 + n, OP_CHECKMULTISIG])
+    return bytes(script)
+
+
+def p2wsh_address(script: bytes, hrp: str) -> str:
+    return SegwitBech32Encoder.Encode(hrp, 0, hashlib.sha256(script).digest())
+
+
+# состояние процесса-воркера (заполняется в _init_worker)
+_W_CHAINS: List[Tuple[bytes, bytes]] = []
+_W_M = 0
+_W_HRP = "tb"
+
+
+def _init_worker(chains: List[Tuple[bytes, bytes]], m: int, hrp: str) -> None:
+    global _W_CHAINS, _W_M, _W_HRP
+    _W_CHAINS, _W_M, _W_HRP = chains, m, hrp
+
+
+def _make_rows(span: Tuple[int, int]) -> List[Row]:
+    start, stop = span
+    ec = get_backend()
+    rows: List[Row] = []
+    for index in range(start, stop):
+        # по одной публичной деривации на cosigner'а от закэшированного change-узла
+        pubs = [ckd_pub(pub, cc, index, ec)[0] for pub, cc in _W_CHAINS]
+        script = multisig_script(_W_M, pubs)
+        rows.append((index, p2wsh_address(script, _W_HRP), script))
+    return rows
+
+
+def change_chains(xpubs: Sequence[str], change: int) -> List[Tuple[bytes, bytes]]:
+    # xpub -> узел .../change, который дальше переиспользуется для всех индексов
+    chains = []
+    for x in xpubs:
+        pub, cc = parse_xpub(x)
+        chains.append(ckd_pub(pub, cc, change))
+    return chains
+
+
+def generate(xpubs: Sequence[str], m: int, start: int, count: int, change: int = 0,
+             hrp: str = "tb", workers: int = 1, chunk: int = 2000) -> Iterator[List[Row]]:
+    """Пачки строк (index, адрес, witnessScript) по возрастанию index."""
+    chains = change_chains(xpubs, change)
+    spans = [(s, min(s + chunk, start + count)) for s in range(start, start + count, chunk)]
+    if workers > 1:
+        with mp.get_context().Pool(workers, initializer=_init_worker, initargs=(chains, m, hrp)) as pool:
+            # imap сохраняет порядок пачек, воркеры при этом считают впереди
+            yield from pool.imap(_make_rows, spans)
+    else:
+        _init_worker(chains, m, hrp)
+        for span in spans:
+            yield _make_rows(span)
+
+
+class CsvSink:
+    def __init__(self, path: str):
+        self._f = open(path, "w", newline="", encoding="utf-8")
+        self._w = csv.writer(self._f)
+        self._w.writerow(["index", "address", "witness_script"])
+
+    def write(self, rows: List[Row]) -> None:
+        self._w.writerows((i, addr, script.hex()) for i, addr, script in rows)
+
+    def close(self) -> None:
+        self._f.close()
+
+
+class SqliteSink:
+    def __init__(self, path: str):
+        self._db = sqlite3.connect(path)
+        # массовая запись: одна транзакция, без fsync на каждую пачку
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=OFF")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS addresses ("
+            " idx INTEGER PRIMARY KEY,"
+            " address TEXT NOT NULL UNIQUE,"
+            " witness_script BLOB NOT NULL)"
+        )
+
+    def write(self, rows: List[Row]) -> None:
+        self._db.executemany("INSERT OR REPLACE INTO addresses VALUES (?, ?, ?)", rows)
+
+    def close(self) -> None:
+        self._db.commit()
+        self._db.close()
+
+
+def open_sink(path: str):
+    if path.endswith((".sqlite", ".sqlite3", ".db")):
+        return SqliteSink(path)
+    return CsvSink(path)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Batch m-of-n P2WSH (BIP67 sorted) address generator from cosigner xpubs")
+    ap.add_argument("--xpub", action="append", default=[], help="cosigner account xpub/tpub/vpub (repeatable)")
+    ap.add_argument("--xpubs-file", help="file with cosigner xpubs, one per line")
+    ap.add_argument("-m", type=int, required=True, help="required signatures")
+    ap.add_argument("--start", type=int, default=0, help="first address index")
+    ap.add_argument("--count", type=int, required=True, help="number of addresses")
+    ap.add_argument("--change", type=int, choices=[0, 1], default=0, help="branch under each xpub")
+    ap.add_argument("--hrp", default="tb", help="bech32 prefix (tb, bc, bcrt)")
+    ap.add_argument("--out", required=True, help="output .csv or .sqlite/.db")
+    ap.add_argument("--workers", type=int, default=0, help="worker processes (0 = all cores)")
+    ap.add_argument("--chunk", type=int, default=2000, help="addresses per work unit")
+    args = ap.parse_args()
+
+    xpubs = list(args.xpub)
+    if args.xpubs_file:
+        with open(args.xpubs_file, "r", encoding="utf-8") as f:
+            xpubs += [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    if not xpubs:
+        raise SystemExit("Нужен хотя бы один --xpub")
+    if args.start + args.count > 0x80000000:
+        raise SystemExit("Индексы должны быть non-hardened (< 2^31)")
+
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    sink = open_sink(args.out)
+    t0 = time.monotonic()
+    done = 0
+    try:
+        for rows in generate(xpubs, args.m, args.start, args.count, args.change,
+                             args.hrp, workers, max(1, args.chunk)):
+            sink.write(rows)
+            done += len(rows)
+    finally:
+        sink.close()
+    el = time.monotonic() - t0
+    print(f"{done} x {args.m}-of-{len(xpubs)} P2WSH -> {args.out} за {el:.1f}s "
+          f"({done / el if el else 0:,.0f} addr/s, {workers} workers)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import csv
+import json
+from dataclasses import dataclass
+from typing import List, Sequence, Tuple
+
+from coinselect import DUST_CHANGE, FeeModel, Selection, select_coins
+from discovery import address_script
+from txsize import InputSize, dust_threshold, output_weight
+
+# Пакетные выплаты: очередь (адрес, сумма) режется на транзакции не тяжелее
+# max_weight, у каждой — один выход сдачи. Порядок очереди сохраняется,
+# чтобы ранние заявки не обгонялись поздними.
+
+MAX_STANDARD_TX_WEIGHT = 400_000
+
+
+@dataclass(frozen=True)
+class Payout:
+    address: str
+    amount: int  # satoshis
+    script: bytes
+
+
+def _payout(address: str, amount, where: str, network: str) -> Payout:
+    try:
+        value = int(amount)
+        script = address_script(address, network)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"{where}: {e}") from None
+    if value <= 0:
+        raise ValueError(f"{where}: сумма должна быть > 0")
+    dust = dust_threshold(script)
+    if value < dust:
+        raise ValueError(f"{where}: сумма {value} меньше порога пыли {dust} для {address.strip()}")
+    return Payout(address.strip(), value, script)
+
+
+def load_payouts(path: str, network: str = "testnet") -> List[Payout]:
+    """CSV (address,amount; заголовок необязателен) или JSONL {"address", "amount"}.
+
+    Адреса не из network и суммы ниже порога пыли отклоняются с указанием строки.
+    """
+    out: List[Payout] = []
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.endswith((".jsonl", ".json")):
+            for lineno, line in enumerate(f, 1):
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                row = json.loads(line)
+                out.append(_payout(row["address"], row["amount"], f"{path}:{lineno}", network))
+        else:
+            for lineno, row in enumerate(csv.reader(f), 1):
+                if not row or row[0].startswith("#"):
+                    continue
+                if lineno == 1 and row[0].strip().lower() == "address":
+                    continue
+                if len(row) != 2:
+                    raise ValueError(f"{path}:{lineno}: ожидается 2 колонки (address,amount), получено {len(row)}")
+                out.append(_payout(row[0], row[1], f"{path}:{lineno}", network))
+    return out
+
+
+def plan_batches(payouts: Sequence[Payout], utxos: Sequence, fee_rate: float, spend: InputSize,
+                 change_script: bytes, max_weight: int = MAX_STANDARD_TX_WEIGHT,
+                 min_change: int = DUST_CHANGE) -> List[Tuple[List[Payout], Selection]]:
+    """Разбить выплаты на транзакции и подобрать входы для каждой.
+
+    UTXO, ушедшие в одну транзакцию, в следующих не используются; сдачу
+    предыдущих пакетов не тратим — она ещё не подтверждена.
+    """
+    pool = list(utxos)
+    # минимальный вес без выходов получателей: заголовок, один вход, сдача
+    overhead = FeeModel.from_templates(fee_rate, spend, [], change_script).weight(1, True)
+    batches: List[Tuple[List[Payout], Selection]] = []
+    i = 0
+    while i < len(payouts):
+        # сначала столько выходов, сколько влезает при одном входе
+        take, budget = 0, max_weight - overhead - 16  # 16 — запас на рост счётчиков
+        while i + take < len(payouts) and output_weight(payouts[i + take].script) <= budget:
+            budget -= output_weight(payouts[i + take].script)
+            take += 1
+        if take == 0:
+            raise RuntimeError(f"Выплата {payouts[i].address} не помещается в {max_weight} WU")
+
+        while True:
+            chunk = list(payouts[i:i + take])
+            fees = FeeModel.from_templates(fee_rate, spend, [p.script for p in chunk], change_script)
+            try:
+                sel = select_coins(pool, sum(p.amount for p in chunk), fees, min_change)
+            except RuntimeError:
+                if not batches:
+                    raise
+                raise RuntimeError(f"Недостаточно средств: оплачено {i} из {len(payouts)} выплат") from None
+            weight = fees.weight(len(sel.picked), sel.change > 0)
+            if weight <= max_weight:
+                break
+            # входов оказалось больше одного — снимаем выходы с хвоста пакета.
+            # Каждая снятая выплата уносит и свою долю входов, поэтому пакет
+            # уменьшаем пропорционально перевесу, а входы подбираем заново
+            take = min(take - 1, take * max_weight // weight)
+            if take <= 0:
+                raise RuntimeError(f"Выплата {payouts[i].address} со своими входами "
+                                   f"не помещается в {max_weight} WU")
+
+        batches.append((chunk, sel))
+        used = {(u.txid, u.vout) for u in sel.picked}
+        pool = [u for u in pool if (u.txid, u.vout) not in used]
+        i += take
+    return batches
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+STAGES = ("derive", "hash", "compare")
+
+ShardKey = Tuple[str, int, int, int]  # purpose, account, change, start
+Hit = Tuple[str, int, int, int]  # purpose, account, change, index
+
+
+class ScanStats:
+    """Счётчики скорости перебора: ключи/сек, ETA и время по стадиям."""
+
+    def __init__(self, total_keys: int, done_keys: int = 0):
+        self.total_keys = total_keys
+        self.checked = done_keys
+        self._resumed = done_keys
+        self.found = 0
+        self.stages: Dict[str, float] = {s: 0.0 for s in STAGES}
+        self.started = time.monotonic()
+
+    def add(self, checked: int, stage_times: Iterable[float]) -> None:
+        self.checked += checked
+        for name, t in zip(STAGES, stage_times):
+            self.stages[name] += t
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def keys_per_sec(self) -> float:
+        el = self.elapsed()
+        return (self.checked - self._resumed) / el if el > 0 else 0.0
+
+    def eta(self) -> Optional[float]:
+        rate = self.keys_per_sec()
+        if rate <= 0:
+            return None
+        return max(0, self.total_keys - self.checked) / rate
+
+    def as_dict(self) -> dict:
+        # время стадий суммируется по всем воркерам (CPU-секунды)
+        stage_total = sum(self.stages.values()) or 1.0
+        return {
+            "checked": self.checked,
+            "total": self.total_keys,
+            "found": self.found,
+            "elapsed_sec": round(self.elapsed(), 3),
+            "keys_per_sec": round(self.keys_per_sec(), 1),
+            "eta_sec": None if self.eta() is None else round(self.eta(), 1),
+            "stages_sec": {k: round(v, 3) for k, v in self.stages.items()},
+            "stages_share": {k: round(v / stage_total, 4) for k, v in self.stages.items()},
+        }
+
+    def line(self) -> str:
+        d = self.as_dict()
+        eta = "?" if d["eta_sec"] is None else f"{d['eta_sec']:.0f}s"
+        shares = " ".join(f"{k}={v * 100:.0f}%" for k, v in d["stages_share"].items())
+        return (f"checked {d['checked']}/{d['total']} keys, {d['keys_per_sec']:.0f} keys/s, "
+                f"ETA {eta}, found={d['found']} [{shares}]")
+
+    def write_json(self, path: str) -> None:
+        _write_atomic(path, self.as_dict())
+
+
+def _write_atomic(path: str, data: dict) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+def targets_digest(targets: Iterable[bytes]) -> str:
+    h = hashlib.sha256()
+    for t in sorted(targets):
+        h.update(t)
+    return h.hexdigest()
+
+
+class Checkpoint:
+    """Курсор перебора: какие шарды уже пройдены и что найдено.
+
+    Параметры скана сохраняются вместе с курсором; --resume с другими
+    параметрами отклоняется, иначе пропущенные шарды не совпадут.
+    """
+
+    def __init__(self, path: str, params: dict):
+        self.path = path
+        self.params = params
+        self.done: Set[ShardKey] = set()
+        self.found: List[Tuple[Hit, bytes]] = []
+        self.checked = 0
+        self._saved_at = time.monotonic()
+
+    def load(self) -> None:
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("params") != self.params:
+            raise ValueError(f"{self.path}: чекпоинт сделан с другими параметрами скана")
+        self.done = {tuple(x) for x in data["done"]}
+        self.found = [(tuple(x[:4]), bytes.fromhex(x[4])) for x in data["found"]]
+        self.checked = int(data["checked"])
+
+    def mark(self, key: ShardKey, checked: int, hits: Iterable[Tuple[Hit, bytes]]) -> None:
+        self.done.add(key)
+        self.checked += checked
+        self.found.extend(hits)
+
+    def due(self, every_sec: float) -> bool:
+        return time.monotonic() - self._saved_at >= every_sec
+
+    def save(self) -> None:
+        _write_atomic(self.path, {
+            "params": self.params,
+            "done": sorted(self.done),
+            "found": [list(hit) + [h160.hex()] for hit, h160 in self.found],
+            "checked": self.checked,
+        })
+        self._saved_at = time.monotonic()
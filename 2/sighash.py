@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import hashlib
+import struct
+from typing import Iterable, Sequence, Tuple, Union
+
+# BIP143 (segwit v0) digest для SIGHASH_ALL. hashPrevouts, hashSequence и
+# hashOutputs не зависят от подписываемого входа, поэтому считаются один
+# раз на транзакцию; на каждый вход и каждого cosigner'а остаётся один
+# sha256d над ~180 байтами, и подпись N входов стоит O(N), а не O(N^2).
+
+SIGHASH_ALL = 1
+
+Outpoint = Tuple[bytes, int]  # txid (как в сети, little-endian), vout
+
+
+def hash256(data: bytes) -> bytes:
+    return hashlib.sha256(hashlib.sha256(data).digest()).digest()
+
+
+def compact_size(n: int) -> bytes:
+    if n < 0xFD:
+        return bytes([n])
+    if n <= 0xFFFF:
+        return b"\xfd" + struct.pack("<H", n)
+    if n <= 0xFFFFFFFF:
+        return b"\xfe" + struct.pack("<I", n)
+    return b"\xff" + struct.pack("<Q", n)
+
+
+def _sequence_bytes(seq: Union[int, bytes, str]) -> bytes:
+    # bitcoinutils хранит sequence байтами, но в коде встречается и int
+    if isinstance(seq, int):
+        return struct.pack("<I", seq)
+    if isinstance(seq, str):
+        seq = bytes.fromhex(seq)
+    if len(seq) != 4:
+        raise ValueError(f"Некорректный sequence: {seq.hex()}")
+    return bytes(seq)
+
+
+class SegwitSigHasher:
+    """Кэш BIP143 для одной транзакции (SIGHASH_ALL)."""
+
+    def __init__(self, version: int, prevouts: Sequence[Outpoint], sequences: Iterable,
+                 outputs: bytes, locktime: int):
+        # outputs — сериализованные выходы подряд, без счётчика
+        self._version = struct.pack("<i", version)
+        self._locktime = struct.pack("<I", locktime)
+        self._outpoints = [txid_le + struct.pack("<I", vout) for txid_le, vout in prevouts]
+        self._sequences = [_sequence_bytes(s) for s in sequences]
+        if len(self._sequences) != len(self._outpoints):
+            raise ValueError("Число sequence не совпадает с числом входов")
+        self.hash_prevouts = hash256(b"".join(self._outpoints))
+        self.hash_sequence = hash256(b"".join(self._sequences))
+        self.hash_outputs = hash256(outputs)
+        self._head = self._version + self.hash_prevouts + self.hash_sequence
+        self._tail = self.hash_outputs + self._locktime + struct.pack("<I", SIGHASH_ALL)
+
+    @classmethod
+    def from_tx(cls, tx) -> "SegwitSigHasher":
+        """Из bitcoinutils.Transaction (version/locktime там — байты LE)."""
+        prevouts = [(bytes.fromhex(i.txid)[::-1], i.txout_index) for i in tx.inputs]
+        outputs = b"".join(o.to_bytes() for o in tx.outputs)
+        return cls(
+            version=struct.unpack("<i", tx.version)[0],
+            prevouts=prevouts,
+            sequences=[i.sequence for i in tx.inputs],
+            outputs=outputs,
+            locktime=struct.unpack("<I", tx.locktime)[0],
+        )
+
+    def digest(self, index: int, script_code: bytes, amount: int) -> bytes:
+        """sighash входа index; script_code — сырой скрипт без префикса длины."""
+        return hash256(
+            self._head
+            + self._outpoints[index]
+            + compact_size(len(script_code)) + script_code
+            + struct.pack("<q", amount)
+            + self._sequences[index]
+            + self._tail
+        )
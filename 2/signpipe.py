@@ -0,0 +1,270 @@
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import struct
+from dataclasses import dataclass, field
+from typing import Dict, List, Sequence, Tuple
+
+from ecbackend import get_backend
+from sighash import SegwitSigHasher
+from txbuilder import Tx, TxIn, TxOut
+
+# Подпись P2WSH multisig на пуле процессов. Задание — (вход, ключ);
+# digest'ы считаются один раз в родителе (SegwitSigHasher), воркеры только
+# подписывают. Результат — частично подписанная транзакция (JSON), которую
+# cosigner'ы на разных машинах подписывают параллельно и потом сливают.
+
+OP_CHECKMULTISIG = 0xAE
+SIGHASH_ALL = 1
+
+Job = Tuple[int, int]  # (индекс входа, индекс ключа в _W_SECRETS)
+
+
+def parse_multisig(witness_script: bytes) -> Tuple[int, List[bytes]]:
+    """OP_m <pub>... OP_n OP_CHECKMULTISIG -> (m, pubkeys в порядке скрипта)."""
+    s = witness_script
+    if len(s) < 3 or s[-1] != OP_CHECKMULTISIG or not 0x51 <= s[0] <= 0x60:
+        raise ValueError("witnessScript не является m-of-n CHECKMULTISIG")
+    m, n = s[0] - 0x50, s[-2] - 0x50
+    pubs, pos = [], 1
+    while pos < len(s) - 2:
+        size = s[pos]
+        if size not in (33, 65):
+            raise ValueError(f"Неожиданный push длины {size} в witnessScript")
+        pubs.append(bytes(s[pos + 1:pos + 1 + size]))
+        pos += 1 + size
+    if len(pubs) != n or pos != len(s) - 2:
+        raise ValueError("Число pubkey не совпадает с n в witnessScript")
+    return m, pubs
+
+
+@dataclass
+class PartialTx:
+    """Неподписанная транзакция + witnessScript + уже собранные подписи."""
+
+    version: int
+    locktime: int
+    inputs: List[dict]   # txid, vout, sequence (hex LE), amount
+    outputs: List[dict]  # amount, script (hex)
+    witness_script: bytes
+    sigs: Dict[int, Dict[str, str]] = field(default_factory=dict)  # вход -> {pubkey: подпись}
+
+    @classmethod
+    def from_tx(cls, tx: Tx, amounts: Sequence[int], witness_script: bytes) -> "PartialTx":
+        # tx — txbuilder.Tx без witness'ов
+        return cls(
+            version=tx.version,
+            locktime=tx.locktime,
+            inputs=[
+                {"txid": i.txid[::-1].hex(), "vout": i.vout,
+                 "sequence": struct.pack("<I", i.sequence).hex(), "amount": int(a)}
+                for i, a in zip(tx.inputs, amounts)
+            ],
+            outputs=[{"amount": o.value, "script": o.script_pubkey.hex()} for o in tx.outputs],
+            witness_script=witness_script,
+        )
+
+    def unsigned_tx(self) -> Tx:
+        return Tx(
+            [TxIn.from_hex(i["txid"], i["vout"], struct.unpack("<I", bytes.fromhex(i["sequence"]))[0])
+             for i in self.inputs],
+            [TxOut(o["amount"], bytes.fromhex(o["script"])) for o in self.outputs],
+            self.version,
+            self.locktime,
+        )
+
+    def hasher(self) -> SegwitSigHasher:
+        return self.unsigned_tx().sighasher()
+
+    def txid(self) -> str:
+        # txid не зависит от witness'ов — по нему проверяем, что сливаем одно и то же
+        return self.unsigned_tx().txid()
+
+    def to_json(self) -> dict:
+        return {
+            "txid": self.txid(),
+            "version": self.version,
+            "locktime": self.locktime,
+            "inputs": self.inputs,
+            "outputs": self.outputs,
+            "witness_script": self.witness_script.hex(),
+            "sigs": {str(k): v for k, v in sorted(self.sigs.items())},
+        }
+
+    @classmethod
+    def from_json(cls, d: dict) -> "PartialTx":
+        p = cls(d["version"], d["locktime"], d["inputs"], d["outputs"],
+                bytes.fromhex(d["witness_script"]),
+                {int(k): dict(v) for k, v in d.get("sigs", {}).items()})
+        if d.get("txid") and d["txid"] != p.txid():
+            raise ValueError("txid в файле не совпадает с содержимым")
+        return p
+
+    def save(self, path: str) -> None:
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.to_json(), f, indent=2)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "PartialTx":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_json(json.load(f))
+
+
+# состояние процесса-воркера (заполняется в _init_worker)
+_W_SECRETS: List[bytes] = []
+_W_DIGESTS: List[bytes] = []
+
+
+def _init_worker(secrets: List[bytes], digests: List[bytes]) -> None:
+    global _W_SECRETS, _W_DIGESTS
+    _W_SECRETS, _W_DIGESTS = secrets, digests
+
+
+def _sign_jobs(jobs: List[Job]) -> List[Tuple[int, int, bytes]]:
+    ec = get_backend()
+    return [(idx, k, ec.sign(_W_SECRETS[k], _W_DIGESTS[idx])) for idx, k in jobs]
+
+
+def sign_partial(ptx: PartialTx, secrets: Sequence[bytes], workers: int = 1,
+                 chunk: int = 64) -> int:
+    """Подписать все входы ключами secrets, дописав подписи в ptx.sigs.
+
+    Ключи, которых нет в witnessScript, — ошибка; уже имеющиеся подписи не
+    пересчитываются. Возвращает число новых подписей.
+    """
+    ec = get_backend()
+    _, script_pubs = parse_multisig(ptx.witness_script)
+    pubs = [ec.pubkey(s).hex() for s in secrets]
+    for p in pubs:
+        if bytes.fromhex(p) not in script_pubs:
+            raise ValueError(f"Ключ {p} не входит в witnessScript")
+
+    script_code = ptx.witness_script
+    hasher = ptx.hasher()
+    digests = [hasher.digest(i, script_code, inp["amount"]) for i, inp in enumerate(ptx.inputs)]
+    jobs = [(i, k) for i in range(len(ptx.inputs)) for k, p in enumerate(pubs)
+            if p not in ptx.sigs.get(i, {})]
+    batches = [jobs[s:s + chunk] for s in range(0, len(jobs), chunk)]
+
+    if workers > 1 and len(batches) > 1:
+        with mp.get_context().Pool(workers, initializer=_init_worker,
+                                   initargs=(list(secrets), digests)) as pool:
+            results = pool.imap_unordered(_sign_jobs, batches)
+            added = _collect(ptx, pubs, results)
+    else:
+        _init_worker(list(secrets), digests)
+        added = _collect(ptx, pubs, map(_sign_jobs, batches))
+    return added
+
+
+def _collect(ptx: PartialTx, pubs: List[str], results) -> int:
+    added = 0
+    for batch in results:
+        for idx, k, der in batch:
+            ptx.sigs.setdefault(idx, {})[pubs[k]] = (der + bytes([SIGHASH_ALL])).hex()
+            added += 1
+    return added
+
+
+def merge(parts: Sequence[PartialTx]) -> PartialTx:
+    """Слить подписи cosigner'ов; транзакция и witnessScript должны совпадать."""
+    if not parts:
+        raise ValueError("Нечего сливать")
+    base = parts[0]
+    txid = base.txid()
+    out = PartialTx(base.version, base.locktime, base.inputs, base.outputs,
+                    base.witness_script, {})
+    for p in parts:
+        # суммы входов в txid не входят, но подписываются — сверяем отдельно
+        if p.txid() != txid or p.witness_script != base.witness_script or p.inputs != base.inputs:
+            raise ValueError("Частичные подписи относятся к разным транзакциям")
+        for idx, sigs in p.sigs.items():
+            out.sigs.setdefault(idx, {}).update(sigs)
+    return out
+
+
+def verify_partial(ptx: PartialTx) -> None:
+    # подписи из чужих файлов проверяем до того, как класть их в witness
+    ec = get_backend()
+    hasher = ptx.hasher()
+    for idx, sigs in ptx.sigs.items():
+        digest = hasher.digest(idx, ptx.witness_script, ptx.inputs[idx]["amount"])
+        for pub, sig in sigs.items():
+            raw = bytes.fromhex(sig)
+            if raw[-1] != SIGHASH_ALL or not ec.verify(bytes.fromhex(pub), digest, raw[:-1]):
+                raise ValueError(f"Неверная подпись входа {idx} ключом {pub}")
+
+
+def witness_stacks(ptx: PartialTx) -> List[List[str]]:
+    """Witness каждого входа: "", m подписей в порядке pubkey в скрипте, witnessScript."""
+    m, script_pubs = parse_multisig(ptx.witness_script)
+    stacks = []
+    for idx in range(len(ptx.inputs)):
+        have = ptx.sigs.get(idx, {})
+        # CHECKMULTISIG идёт по ключам слева направо, поэтому порядок подписей важен
+        ordered = [have[p.hex()] for p in script_pubs if p.hex() in have][:m]
+        if len(ordered) < m:
+            raise ValueError(f"Вход {idx}: подписей {len(ordered)} из {m}")
+        stacks.append([""] + ordered + [ptx.witness_script.hex()])
+    return stacks
+
+
+def finalize(ptx: PartialTx) -> Tx:
+    """Собрать подписанную транзакцию."""
+    tx = ptx.unsigned_tx()
+    for txin, stack in zip(tx.inputs, witness_stacks(ptx)):
+        txin.witness = [bytes.fromhex(item) for item in stack]
+    return tx
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Parallel P2WSH multisig signing / partial signature merging")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    s = sub.add_parser("sign", help="add signatures of the given keys to a partial tx")
+    s.add_argument("partial", help="partial tx JSON")
+    s.add_argument("--wif", action="append", required=True, help="cosigner WIF (repeatable)")
+    s.add_argument("--out", help="output file (default: overwrite input)")
+    s.add_argument("--workers", type=int, default=0, help="worker processes (0 = all cores)")
+
+    mg = sub.add_parser("merge", help="merge partial signatures from several cosigners")
+    mg.add_argument("partials", nargs="+")
+    mg.add_argument("--out", required=True)
+
+    fz = sub.add_parser("finalize", help="verify signatures and print the signed raw tx")
+    fz.add_argument("partial")
+    args = ap.parse_args()
+
+    if args.cmd == "sign":
+        from bitcoinutils.keys import PrivateKey
+        from bitcoinutils.setup import setup
+        setup("testnet")
+        ptx = PartialTx.load(args.partial)
+        secrets = [PrivateKey(w).to_bytes() for w in args.wif]
+        workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+        added = sign_partial(ptx, secrets, workers)
+        ptx.save(args.out or args.partial)
+        print(f"подписей добавлено: {added}, txid {ptx.txid()}")
+    elif args.cmd == "merge":
+        ptx = merge([PartialTx.load(p) for p in args.partials])
+        ptx.save(args.out)
+        print(f"слито {len(args.partials)} файлов -> {args.out}, txid {ptx.txid()}")
+    else:
+        ptx = PartialTx.load(args.partial)
+        try:
+            verify_partial(ptx)
+            tx = finalize(ptx)
+        except ValueError as e:
+            raise SystemExit(str(e))
+        buf = tx.serialize()
+        print("txid:", tx.txid(buf))
+        print("raw:", buf.hex())
+
+
+if __name__ == "__main__":
+    main()
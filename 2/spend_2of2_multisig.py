@@ -1,14 +1,19 @@
 from __future__ import annotations
+import os
 from dataclasses import dataclass
-from typing import List, Tuple
-import requests
+from typing import List
 from bitcoinutils.setup import setup
-from bitcoinutils.transactions import Transaction, TxInput, TxOutput, TxWitnessInput
 from bitcoinutils.keys import PrivateKey, P2wpkhAddress, P2wshAddress
 from bitcoinutils.script import Script
 
+from coinselect import DUST_CHANGE, FeeModel, select_coins
+from esplora import MEMPOOL_TESTNET4, EsploraClient
+from signpipe import PartialTx, finalize, parse_multisig, sign_partial
+from txbuilder import SEQUENCE_RBF, Tx, TxIn, TxOut
+from txsize import p2wsh_multisig_input
 
-# WIF двух участников (testnet)
+
+# WIF двух участников (testnet); пустая строка — ключ у другого cosigner'а
 WIF1 = "cT..."
 WIF2 = "cT..."
 
@@ -27,7 +32,16 @@ FEE_RATE_SAT_VB = 0
 # отправлять ли транзакцию
 BROADCAST = True
 
-MEMPOOL_TESTNET4 = "https://mempool.space/testnet4/api"
+# процессов для подписи (0 = все ядра)
+SIGN_WORKERS = 0
+
+# если подписей не хватает — частично подписанная транзакция сохраняется сюда
+# (дальше: signpipe.py sign / merge / finalize на машинах cosigner'ов)
+PARTIAL_OUT = "partial_2of2.json"
+
+# Esplora API и файл TTL-кэша комиссии/UTXO между запусками ("" — без файла)
+ESPLORA_URL = MEMPOOL_TESTNET4
+ESPLORA_CACHE = ""
 
 
 @dataclass(frozen=True)
@@ -37,68 +51,36 @@ class UTXO:
     value: int  # satoshis
 
 
-def http_get_json(url: str, timeout: int = 20):
-    r = requests.get(url, timeout=timeout)
-    r.raise_for_status()
-    return r.json()
-
-
-def http_post_text(url: str, body: str, timeout: int = 20):
-    r = requests.post(url, data=body.encode("utf-8"), timeout=timeout)
-    if not r.ok:
-        raise RuntimeError(
-            f"Broadcast failed: HTTP {r.status_code}\nResponse: {r.text}\n"
-        )
-    return r.text.strip()
-
-
-def fetch_utxos(address: str) -> List[UTXO]:
-    data = http_get_json(f"{MEMPOOL_TESTNET4}/address/{address}/utxo")
-    utxos = [
-        UTXO(txid=x["txid"], vout=int(x["vout"]), value=int(x["value"]))
-        for x in data
-    ]
+def fetch_utxos(client: EsploraClient, address: str) -> List[UTXO]:
+    data = client.address_utxos(address)
+    utxos = [UTXO(txid=x["txid"], vout=int(x["vout"]), value=int(x["value"])) for x in data]
     utxos.sort(key=lambda u: u.value, reverse=True)
     return utxos
 
 
-def fetch_fee_rate_sat_vb() -> int:
-    fees = http_get_json(f"{MEMPOOL_TESTNET4}/v1/fees/recommended")
+def fetch_fee_rate_sat_vb(client: EsploraClient) -> int:
+    fees = client.fee_recommended()
     return int(fees.get("halfHourFee", fees.get("minimumFee", 1)))
 
 
-def estimate_vbytes_p2wsh_2of2(n_in: int, n_out: int) -> int:
-    # Приближённая оценка для P2WSH 2-of-2
-    return 10 + n_in * 110 + n_out * 31
-
-
-def select_coins(utxos: List[UTXO], target_plus_fee: int) -> Tuple[List[UTXO], int]:
-    picked, total = [], 0
-    for u in utxos:
-        picked.append(u)
-        total += u.value
-        if total >= target_plus_fee:
-            return picked, total
-    raise RuntimeError("Недостаточно средств (UTXO) для суммы + комиссии")
-
-
 def main():
     setup("testnet")
+    client = EsploraClient(ESPLORA_URL, cache_file=ESPLORA_CACHE or None)
 
-    # ключи участников
-    k1 = PrivateKey(WIF1)
-    k2 = PrivateKey(WIF2)
+    # ключи участников, которые есть на этой машине
+    keys = [PrivateKey(w) for w in (WIF1, WIF2) if w]
 
     # восстановление witnessScript и multisig-адреса
+    witness_script_bytes = bytes.fromhex(WITNESS_SCRIPT_HEX)
     witness_script = Script.from_raw(WITNESS_SCRIPT_HEX)
     ms_addr = P2wshAddress.from_script(witness_script)
     ms_addr_str = ms_addr.to_string()
 
     # комиссия
-    fee_rate = FEE_RATE_SAT_VB if FEE_RATE_SAT_VB > 0 else fetch_fee_rate_sat_vb()
+    fee_rate = FEE_RATE_SAT_VB if FEE_RATE_SAT_VB > 0 else fetch_fee_rate_sat_vb(client)
 
     # UTXO multisig-адреса
-    utxos = fetch_utxos(ms_addr_str)
+    utxos = fetch_utxos(client, ms_addr_str)
     if not utxos:
         raise RuntimeError(f"Нет UTXO на multisig-адресе {ms_addr_str}")
 
@@ -111,59 +93,52 @@ def main():
 
     to_addr = P2wpkhAddress(TO_ADDRESS)
 
-    # подбор входов
-    n_in_guess = 1
-    while True:
-        vbytes_guess = estimate_vbytes_p2wsh_2of2(n_in_guess, 2)
-        fee_guess = fee_rate * vbytes_guess
-        picked, picked_total = select_coins(utxos, send_value + fee_guess)
-        if len(picked) == n_in_guess:
-            break
-        n_in_guess = len(picked)
-
-    vbytes = estimate_vbytes_p2wsh_2of2(len(picked), 2)
-    fee = fee_rate * vbytes + 2  # небольшой запас
-    change = picked_total - send_value - fee
+    to_spk = to_addr.to_script_pub_key().to_bytes()
+    ms_spk = ms_addr.to_script_pub_key().to_bytes()
 
-    dust_like = 330
-    include_change = change >= dust_like
+    # подбор входов; вес входа — точный по witnessScript (m подписей <= 71 байт),
+    # сдача возвращается на тот же multisig
+    m, script_pubs = parse_multisig(witness_script_bytes)
+    fees = FeeModel.from_templates(fee_rate, p2wsh_multisig_input(m, len(script_pubs), len(witness_script_bytes)), [to_spk], ms_spk)
+    sel = select_coins(utxos, send_value, fees, DUST_CHANGE)
+    picked, fee, change = sel.picked, sel.fee, sel.change
+    include_change = change > 0
 
-    outputs: List[TxOutput] = [TxOutput(send_value, to_addr.to_script_pub_key())]
+    outputs = [TxOut(send_value, to_spk)]
     if include_change:
-        outputs.append(TxOutput(change, ms_addr.to_script_pub_key()))
-    else:
-        fee = picked_total - send_value
-        change = 0
-
-    txins: List[TxInput] = [TxInput(u.txid, u.vout) for u in picked]
-    tx = Transaction(txins, outputs, has_segwit=True)
+        outputs.append(TxOut(change, ms_spk))
 
-    # для P2WSH scriptCode = witnessScript
-    script_code = witness_script
+    tx = Tx([TxIn.from_hex(u.txid, u.vout, SEQUENCE_RBF) for u in picked], outputs)
 
-    # подписи двумя ключами
-    tx.witnesses = []
-    for idx, u in enumerate(picked):
-        sig1 = k1.sign_segwit_input(tx, idx, script_code, u.value)
-        sig2 = k2.sign_segwit_input(tx, idx, script_code, u.value)
+    # подписи: задания (вход, ключ) на пуле процессов, BIP143 digest на вход
+    # считается один раз для всех cosigner'ов (scriptCode = witnessScript)
+    ptx = PartialTx.from_tx(tx, [u.value for u in picked], witness_script_bytes)
+    workers = SIGN_WORKERS if SIGN_WORKERS > 0 else (os.cpu_count() or 1)
+    sign_partial(ptx, [k.to_bytes() for k in keys], workers)
 
-        # witness stack: OP_0, sig1, sig2, witnessScript
-        tx.witnesses.append(
-            TxWitnessInput(["", sig1, sig2, WITNESS_SCRIPT_HEX])
-        )
+    try:
+        # witness stack: OP_0, подписи в порядке pubkey в witnessScript, witnessScript
+        tx = finalize(ptx)
+    except ValueError as e:
+        ptx.save(PARTIAL_OUT)
+        print(f"{e}; частично подписанная транзакция сохранена в {PARTIAL_OUT}")
+        return
 
-    raw = tx.serialize()
-    txid = tx.get_txid()
+    buf = tx.serialize()
+    txid = tx.txid(buf)
+    raw = buf.hex()
 
     print("FROM multisig:", ms_addr_str)
     print("TO:", TO_ADDRESS)
     print("fee_rate(sat/vB):", fee_rate)
+    print("coin selection:", sel.algorithm)
     print("fee(sats):", fee)
+    print(f"vsize: {tx.vsize()} (weight {tx.weight()})")
     print("txid:", txid)
     print("raw:", raw)
 
     if BROADCAST:
-        res = http_post_text(f"{MEMPOOL_TESTNET4}/tx", raw)
+        res = client.broadcast(raw)
         print("broadcast:", res)
 
 
@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+import hashlib
+import struct
+from typing import List, Optional, Sequence
+
+from sighash import SegwitSigHasher
+from txsize import varint_size
+
+# Сборка транзакций прямо в байты: записи входов/выходов на __slots__,
+# сериализация в заранее выделенный bytearray через struct.pack_into,
+# txid/wtxid — sha256d по memoryview-срезам того же буфера. Hex появляется
+# только на выходе (печать / отправка), а не на каждом шаге.
+
+SEQUENCE_FINAL = 0xFFFFFFFF
+SEQUENCE_RBF = 0xFFFFFFFD
+
+
+def _pack_varint(buf: bytearray, pos: int, n: int) -> int:
+    if n < 0xFD:
+        buf[pos] = n
+        return pos + 1
+    if n <= 0xFFFF:
+        buf[pos] = 0xFD
+        struct.pack_into("<H", buf, pos + 1, n)
+        return pos + 3
+    if n <= 0xFFFFFFFF:
+        buf[pos] = 0xFE
+        struct.pack_into("<I", buf, pos + 1, n)
+        return pos + 5
+    buf[pos] = 0xFF
+    struct.pack_into("<Q", buf, pos + 1, n)
+    return pos + 9
+
+
+def _read_varint(data: bytes, pos: int) -> tuple:
+    b = data[pos]
+    if b < 0xFD:
+        return b, pos + 1
+    size = {0xFD: 2, 0xFE: 4, 0xFF: 8}[b]
+    return int.from_bytes(data[pos + 1:pos + 1 + size], "little"), pos + 1 + size
+
+
+def _read_bytes(data: bytes, pos: int) -> tuple:
+    n, pos = _read_varint(data, pos)
+    if pos + n > len(data):
+        raise ValueError("Транзакция обрезана")
+    return bytes(data[pos:pos + n]), pos + n
+
+
+def _pack_bytes(buf: bytearray, pos: int, data: bytes) -> int:
+    pos = _pack_varint(buf, pos, len(data))
+    end = pos + len(data)
+    buf[pos:end] = data
+    return end
+
+
+class TxIn:
+    __slots__ = ("txid", "vout", "sequence", "script_sig", "witness")
+
+    def __init__(self, txid: bytes, vout: int, sequence: int = SEQUENCE_FINAL,
+                 script_sig: bytes = b"", witness: Optional[List[bytes]] = None):
+        # txid — 32 байта в порядке сериализации (обратном к hex из API)
+        self.txid = txid
+        self.vout = vout
+        self.sequence = sequence
+        self.script_sig = script_sig
+        self.witness = witness if witness is not None else []
+
+    @classmethod
+    def from_hex(cls, txid_hex: str, vout: int, sequence: int = SEQUENCE_FINAL) -> "TxIn":
+        return cls(bytes.fromhex(txid_hex)[::-1], vout, sequence)
+
+    def base_size(self) -> int:
+        return 32 + 4 + varint_size(len(self.script_sig)) + len(self.script_sig) + 4
+
+    def witness_size(self) -> int:
+        return varint_size(len(self.witness)) + sum(varint_size(len(w)) + len(w) for w in self.witness)
+
+
+class TxOut:
+    __slots__ = ("value", "script_pubkey")
+
+    def __init__(self, value: int, script_pubkey: bytes):
+        self.value = value
+        self.script_pubkey = script_pubkey
+
+    def size(self) -> int:
+        return 8 + varint_size(len(self.script_pubkey)) + len(self.script_pubkey)
+
+
+class Tx:
+    """Транзакция, сериализуемая в один буфер без промежуточных hex-строк."""
+
+    __slots__ = ("version", "locktime", "inputs", "outputs")
+
+    def __init__(self, inputs: Sequence[TxIn] = (), outputs: Sequence[TxOut] = (),
+                 version: int = 2, locktime: int = 0):
+        self.version = version
+        self.locktime = locktime
+        self.inputs: List[TxIn] = list(inputs)
+        self.outputs: List[TxOut] = list(outputs)
+
+    @classmethod
+    def parse(cls, data: bytes) -> "Tx":
+        """Разобрать сериализованную транзакцию (legacy или segwit)."""
+        try:
+            version = struct.unpack_from("<i", data, 0)[0]
+            pos = 4
+            segwit = data[4:6] == b"\x00\x01"
+            if segwit:
+                pos = 6
+            n_in, pos = _read_varint(data, pos)
+            inputs = []
+            for _ in range(n_in):
+                txid, vout = bytes(data[pos:pos + 32]), struct.unpack_from("<I", data, pos + 32)[0]
+                script_sig, pos = _read_bytes(data, pos + 36)
+                sequence = struct.unpack_from("<I", data, pos)[0]
+                inputs.append(TxIn(txid, vout, sequence, script_sig))
+                pos += 4
+            n_out, pos = _read_varint(data, pos)
+            outputs = []
+            for _ in range(n_out):
+                value = struct.unpack_from("<q", data, pos)[0]
+                script, pos = _read_bytes(data, pos + 8)
+                outputs.append(TxOut(value, script))
+            if segwit:
+                for i in inputs:
+                    n_items, pos = _read_varint(data, pos)
+                    for _ in range(n_items):
+                        item, pos = _read_bytes(data, pos)
+                        i.witness.append(item)
+            locktime = struct.unpack_from("<I", data, pos)[0]
+        except (struct.error, IndexError, KeyError):
+            raise ValueError("Некорректная сериализация транзакции") from None
+        if pos + 4 != len(data):
+            raise ValueError("Лишние байты после транзакции")
+        return cls(inputs, outputs, version, locktime)
+
+    def has_witness(self) -> bool:
+        return any(i.witness for i in self.inputs)
+
+    def _io_size(self) -> int:
+        return (varint_size(len(self.inputs)) + sum(i.base_size() for i in self.inputs)
+                + varint_size(len(self.outputs)) + sum(o.size() for o in self.outputs))
+
+    def base_size(self) -> int:
+        return 4 + self._io_size() + 4
+
+    def total_size(self) -> int:
+        if not self.has_witness():
+            return self.base_size()
+        return self.base_size() + 2 + sum(i.witness_size() for i in self.inputs)
+
+    def weight(self) -> int:
+        return self.base_size() * 3 + self.total_size()
+
+    def vsize(self) -> int:
+        return (self.weight() + 3) // 4
+
+    def _write_outputs(self, buf: bytearray, pos: int) -> int:
+        for o in self.outputs:
+            struct.pack_into("<q", buf, pos, o.value)
+            pos = _pack_bytes(buf, pos + 8, o.script_pubkey)
+        return pos
+
+    def serialize_into(self, buf: bytearray, pos: int = 0) -> int:
+        """Записать транзакцию в buf с позиции pos; вернуть позицию конца."""
+        segwit = self.has_witness()
+        struct.pack_into("<i", buf, pos, self.version)
+        pos += 4
+        if segwit:
+            buf[pos:pos + 2] = b"\x00\x01"
+            pos += 2
+        pos = _pack_varint(buf, pos, len(self.inputs))
+        for i in self.inputs:
+            buf[pos:pos + 32] = i.txid
+            struct.pack_into("<I", buf, pos + 32, i.vout)
+            pos = _pack_bytes(buf, pos + 36, i.script_sig)
+            struct.pack_into("<I", buf, pos, i.sequence)
+            pos += 4
+        pos = _pack_varint(buf, pos, len(self.outputs))
+        pos = self._write_outputs(buf, pos)
+        if segwit:
+            for i in self.inputs:
+                pos = _pack_varint(buf, pos, len(i.witness))
+                for item in i.witness:
+                    pos = _pack_bytes(buf, pos, item)
+        struct.pack_into("<I", buf, pos, self.locktime)
+        return pos + 4
+
+    def serialize(self) -> bytearray:
+        buf = bytearray(self.total_size())
+        self.serialize_into(buf)
+        return buf
+
+    def _hash_ids(self, buf: bytearray) -> tuple:
+        # txid — без marker/flag и witness'ов: хэшируем срезы того же буфера
+        view = memoryview(buf)
+        if self.has_witness():
+            io_end = 6 + self._io_size()
+            h = hashlib.sha256()
+            h.update(view[0:4])
+            h.update(view[6:io_end])
+            h.update(view[-4:])
+            txid = hashlib.sha256(h.digest()).digest()
+            wtxid = hashlib.sha256(hashlib.sha256(view).digest()).digest()
+        else:
+            txid = wtxid = hashlib.sha256(hashlib.sha256(view).digest()).digest()
+        return txid[::-1], wtxid[::-1]
+
+    def txid(self, buf: Optional[bytearray] = None) -> str:
+        return self._hash_ids(buf if buf is not None else self.serialize())[0].hex()
+
+    def wtxid(self, buf: Optional[bytearray] = None) -> str:
+        return self._hash_ids(buf if buf is not None else self.serialize())[1].hex()
+
+    def sighasher(self) -> SegwitSigHasher:
+        """BIP143-кэш по текущим входам/выходам (witness'ы не влияют)."""
+        buf = bytearray(sum(o.size() for o in self.outputs))
+        self._write_outputs(buf, 0)
+        return SegwitSigHasher(
+            self.version,
+            [(i.txid, i.vout) for i in self.inputs],
+            [i.sequence for i in self.inputs],
+            buf,
+            self.locktime,
+        )
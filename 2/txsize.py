@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+# Точный вес транзакции по шаблонам скриптов, до подписи.
+# Подписи — low-R + low-S (ecbackend): DER не длиннее 70 байт + 1 байт
+# sighash. Короче они бывают только если r или s случайно начинаются с
+# нулевого байта (~1/256), тогда оценка больше реальной на 1 байт.
+
+SIG_SIZE = 71       # DER (<= 70) + SIGHASH_ALL
+PUBKEY_SIZE = 33    # сжатый ключ
+WITNESS_SCALE = 4
+
+
+def varint_size(n: int) -> int:
+    return 1 if n < 0xFD else 3 if n <= 0xFFFF else 5 if n <= 0xFFFFFFFF else 9
+
+
+def _push_size(n: int) -> int:
+    # длина push-операции в скрипте (opcode + данные)
+    return (1 if n < 0x4C else 2 if n <= 0xFF else 3) + n
+
+
+@dataclass(frozen=True)
+class InputSize:
+    """Размер входа: base — байты вне witness, witness — стек (с его счётчиком)."""
+
+    name: str
+    base: int
+    witness: int  # 0 — вход без witness
+
+    @property
+    def weight(self) -> int:
+        # в segwit-транзакции вход без witness всё равно несёт пустой стек (0x00)
+        return self.base * WITNESS_SCALE + (self.witness or 1)
+
+
+def _input(name: str, script_sig: int, witness_items: Sequence[int]) -> InputSize:
+    base = 32 + 4 + varint_size(script_sig) + script_sig + 4
+    witness = 0
+    if witness_items:
+        witness = varint_size(len(witness_items)) + sum(varint_size(n) + n for n in witness_items)
+    return InputSize(name, base, witness)
+
+
+def p2wpkh_input() -> InputSize:
+    return _input("p2wpkh", 0, [SIG_SIZE, PUBKEY_SIZE])
+
+
+def p2sh_p2wpkh_input() -> InputSize:
+    # scriptSig: push redeemScript (OP_0 <20 байт>)
+    return _input("p2sh-p2wpkh", _push_size(22), [SIG_SIZE, PUBKEY_SIZE])
+
+
+def p2pkh_input() -> InputSize:
+    return _input("p2pkh", _push_size(SIG_SIZE) + _push_size(PUBKEY_SIZE), [])
+
+
+def multisig_script_size(n: int) -> int:
+    # OP_m <33>*n OP_n OP_CHECKMULTISIG
+    return 3 + n * (1 + PUBKEY_SIZE)
+
+
+def p2wsh_multisig_input(m: int, n: int, script_size: Optional[int] = None) -> InputSize:
+    # стек: пустой элемент (баг CHECKMULTISIG), m подписей, witnessScript.
+    # script_size — длина настоящего witnessScript; без неё считаем, что
+    # все ключи сжатые
+    size = script_size if script_size is not None else multisig_script_size(n)
+    return _input(f"p2wsh-{m}of{n}", 0, [0] + [SIG_SIZE] * m + [size])
+
+
+def output_size(script_pubkey_len: int) -> int:
+    return 8 + varint_size(script_pubkey_len) + script_pubkey_len
+
+
+def output_weight(script_pubkey: bytes) -> int:
+    return output_size(len(script_pubkey)) * WITNESS_SCALE
+
+
+def dust_threshold(script_pubkey: bytes, dust_relay_fee: int = 3) -> int:
+    # как GetDustThreshold в Bitcoin Core: выход плюс вход, который его
+    # потратит (witness-программа — 67 vB, остальное — 148 байт), по 3 sat/vB
+    spk = script_pubkey
+    witness_program = (4 <= len(spk) <= 42 and (spk[0] == 0 or 0x51 <= spk[0] <= 0x60)
+                       and spk[1] == len(spk) - 2)
+    return dust_relay_fee * (output_size(len(spk)) + (67 if witness_program else 148))
+
+
+def tx_weight(inputs: Sequence[InputSize], output_scripts: Sequence[bytes]) -> int:
+    segwit = any(i.witness for i in inputs)
+    weight = (4 + varint_size(len(inputs)) + varint_size(len(output_scripts)) + 4) * WITNESS_SCALE
+    weight += sum(output_weight(s) for s in output_scripts)
+    if segwit:
+        weight += 2  # marker + flag
+        weight += sum(i.weight for i in inputs)
+    else:
+        weight += sum(i.base * WITNESS_SCALE for i in inputs)
+    return weight
+
+
+def tx_vsize(inputs: Sequence[InputSize], output_scripts: Sequence[bytes]) -> int:
+    return (tx_weight(inputs, output_scripts) + 3) // 4
@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import json
+import os
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+# Локальный учёт собственных неподтверждённых транзакций: сразу после
+# broadcast их выходы (сдача) становятся доступны для следующей отправки,
+# не дожидаясь, пока их покажет API. Цепочки ограничиваются лимитами
+# mempool Bitcoin Core по предкам/потомкам (25 транзакций, 101 kvB).
+
+ANCESTOR_LIMIT = 25
+ANCESTOR_SIZE_LIMIT = 101_000  # vbytes
+MEMPOOL_EXPIRY = 14 * 24 * 3600  # столько Core держит транзакцию в mempool
+# свежая транзакция может ещё не дойти до узла за балансировщиком API:
+# «не найдена» раньше этого срока не значит «выпала из mempool»
+NOT_FOUND_GRACE = 600
+
+Outpoint = Tuple[str, int]
+
+
+def _op_key(txid: str, vout: int) -> str:
+    return f"{txid}:{vout}"
+
+
+class UtxoTracker:
+    """Состояние в JSON: pending-транзакции, их выходы и потраченные outpoint'ы."""
+
+    def __init__(self, path: str):
+        self.path = path
+        # txid -> {"vsize", "fee", "parents": [txid], "time"}
+        self.pending: Dict[str, dict] = {}
+        # "txid:vout" -> {"txid", "vout", "value"} — наши неподтверждённые выходы
+        self.outputs: Dict[str, dict] = {}
+        # outpoint, потраченный нашей транзакцией -> txid этой транзакции.
+        # API может снова показать его непотраченным (видит родителя, но ещё
+        # не нашу трату), поэтому запись живёт, пока трата не подтвердится
+        # или не выпадет из mempool
+        self.spent: Dict[str, Optional[str]] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                d = json.load(f)
+            self.pending = d.get("pending", {})
+            self.outputs = d.get("outputs", {})
+            spent = d.get("spent", {})
+            # старый формат — список без txid траты
+            self.spent = spent if isinstance(spent, dict) else dict.fromkeys(spent)
+
+    def save(self) -> None:
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"pending": self.pending, "outputs": self.outputs,
+                       "spent": dict(sorted(self.spent.items()))}, f, indent=1)
+        os.replace(tmp, self.path)
+
+    # ---- граф предков/потомков ----
+
+    def ancestors(self, txid: str, graph: Optional[Dict[str, dict]] = None) -> Set[str]:
+        """txid и все его неподтверждённые предки (только наши pending)."""
+        graph = graph if graph is not None else self.pending
+        seen: Set[str] = set()
+        stack = [txid]
+        while stack:
+            t = stack.pop()
+            if t in seen or t not in graph:
+                continue
+            seen.add(t)
+            stack.extend(graph[t]["parents"])
+        return seen
+
+    def _children(self, graph: Optional[Dict[str, dict]] = None) -> Dict[str, List[str]]:
+        children: Dict[str, List[str]] = {}
+        for txid, info in (graph if graph is not None else self.pending).items():
+            for p in info["parents"]:
+                children.setdefault(p, []).append(txid)
+        return children
+
+    def descendants(self, txid: str, children: Optional[Dict[str, List[str]]] = None) -> Set[str]:
+        children = children if children is not None else self._children()
+        seen: Set[str] = set()
+        stack = [txid]
+        while stack:
+            t = stack.pop()
+            if t in seen:
+                continue
+            seen.add(t)
+            stack.extend(children.get(t, []))
+        return seen
+
+    def limits_ok(self, parents: Iterable[str], vsize: int,
+                  planned: Optional[Dict[str, dict]] = None) -> bool:
+        """Примет ли mempool новую транзакцию размера vsize с такими родителями.
+
+        planned — ещё не отправленные транзакции той же партии ({txid: {"vsize",
+        "parents"}}): у общих предков они тоже потомки.
+        """
+        graph = {**self.pending, **planned} if planned else self.pending
+        anc: Set[str] = set()
+        for p in parents:
+            anc |= self.ancestors(p, graph)
+        if len(anc) + 1 > ANCESTOR_LIMIT:
+            return False
+        if sum(graph[t]["vsize"] for t in anc) + vsize > ANCESTOR_SIZE_LIMIT:
+            return False
+        # у каждого предка новая транзакция станет ещё одним потомком
+        children = self._children(graph)
+        for a in anc:
+            desc = self.descendants(a, children)
+            if len(desc) + 1 > ANCESTOR_LIMIT:
+                return False
+            if sum(graph[t]["vsize"] for t in desc) + vsize > ANCESTOR_SIZE_LIMIT:
+                return False
+        return True
+
+    # ---- синхронизация с API и выдача UTXO ----
+
+    def sync(self, api_utxos: Sequence[dict],
+             tx_status: Optional[Callable[[str], Optional[dict]]] = None) -> None:
+        """Убрать подтверждённое и выпавшее из mempool.
+
+        tx_status(txid) — статус транзакции из API ({"confirmed": ...}; None —
+        узел её не знает). Без него подтверждение видно только по выходам в
+        api_utxos, а транзакция без непотраченной сдачи ждёт MEMPOOL_EXPIRY.
+        """
+        confirmed = {u["txid"] for u in api_utxos if u.get("status", {}).get("confirmed")}
+        done: Set[str] = set()
+        for txid in confirmed & set(self.pending):
+            done |= self.ancestors(txid)  # предки подтверждённой тоже подтверждены
+        now = time.time()
+        done |= {t for t, info in self.pending.items() if now - info["time"] > MEMPOOL_EXPIRY}
+        if tx_status is not None:
+            # с концов цепочек: подтверждённый потомок снимает всех предков без запросов
+            children = self._children()
+            for txid in sorted(self.pending, key=lambda t: bool(children.get(t))):
+                if txid in done:
+                    continue
+                status = tx_status(txid)
+                if status is None:
+                    if now - self.pending[txid]["time"] > NOT_FOUND_GRACE:
+                        done.add(txid)  # вытеснена или заменена
+                elif status.get("confirmed"):
+                    done |= self.ancestors(txid)
+        for txid in done:
+            del self.pending[txid]
+        self.outputs = {k: v for k, v in self.outputs.items() if v["txid"] not in done}
+        # трата подтверждена или выпала — отслеживать outpoint больше не нужно;
+        # у записей старого формата трата неизвестна, они живут до пустого pending
+        self.spent = {k: t for k, t in self.spent.items()
+                      if (t in self.pending if t is not None else bool(self.pending))}
+
+    def available(self, api_utxos: Sequence[dict]) -> List[dict]:
+        """UTXO API без потраченных нами + наша неподтверждённая сдача.
+
+        Выходы транзакций, у которых цепочка уже упёрлась в лимит mempool,
+        не предлагаются: трата любого из них будет отвергнута.
+        """
+        out: Dict[str, dict] = {}
+        for u in api_utxos:
+            k = _op_key(u["txid"], int(u["vout"]))
+            if k not in self.spent:
+                out[k] = u
+        for k, u in self.outputs.items():
+            if k not in self.spent:
+                out.setdefault(k, u)
+        children = self._children()
+        blocked: Dict[str, bool] = {}
+        result = []
+        for u in out.values():
+            txid = u["txid"]
+            if txid in self.pending:
+                if txid not in blocked:
+                    anc = self.ancestors(txid)
+                    blocked[txid] = len(anc) + 1 > ANCESTOR_LIMIT or any(
+                        len(self.descendants(a, children)) + 1 > ANCESTOR_LIMIT for a in anc)
+                if blocked[txid]:
+                    continue
+            result.append(u)
+        return result
+
+    def record(self, txid: str, vsize: int, fee: int, inputs: Sequence[Outpoint],
+               outputs: Sequence[Tuple[int, int]]) -> None:
+        """Отметить отправленную транзакцию; outputs — наши выходы (vout, value)."""
+        parents = sorted({t for t, _ in inputs if t in self.pending})
+        self.pending[txid] = {"vsize": vsize, "fee": fee, "parents": parents, "time": time.time()}
+        for t, v in inputs:
+            k = _op_key(t, v)
+            self.spent[k] = txid
+            self.outputs.pop(k, None)
+        for vout, value in outputs:
+            self.outputs[_op_key(txid, vout)] = {
+                "txid": txid, "vout": vout, "value": value, "status": {"confirmed": False},
+            }
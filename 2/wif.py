@@ -1,85 +1,379 @@
 from __future__ import annotations
 
 import argparse
-from bip_utils import (
-    Bip39SeedGenerator,
-    Bip44, Bip49, Bip84,
-    Bip44Coins, Bip49Coins, Bip84Coins,
-    Bip44Changes,
+import json
+import multiprocessing as mp
+import os
+import signal
+import time
+from typing import Callable, FrozenSet, Iterator, List, Optional, Tuple
+
+from bip_utils import Bip39SeedGenerator
+
+from addrindex import AddrIndex, build_index
+from derive import (
+    SeedSource,
+    XpubSource,
+    decode_target,
+    path_str,
 )
-from bitcoinutils.setup import setup
-from bitcoinutils.keys import PrivateKey
+from discovery import discover, load_history_file, load_node_activity
+from ecbackend import hash160
+from progress import Checkpoint, ScanStats, targets_digest
 
 MNEMONIC = "potato..."
 MNEMONIC_PASSPHRASE = ""
 
-PURPOSES = [
-    ("BIP44", Bip44, Bip44Coins.BITCOIN_TESTNET),
-    ("BIP49", Bip49, Bip49Coins.BITCOIN_TESTNET),
-    ("BIP84", Bip84, Bip84Coins.BITCOIN_TESTNET),
-]
+# шард = (purpose, account, change, start, stop) — полуинтервал индексов
+Shard = Tuple[str, int, int, int, int]
+Hit = Tuple[str, int, int, int]
 
 
-def iter_paths(seed_bytes: bytes, account_max: int, scan: int, include_internal: bool):
-    for pur_name, PurCls, coin_enum in PURPOSES:
-        ctx = PurCls.FromSeed(seed_bytes, coin_enum)
-        base = ctx.Purpose().Coin()
+def iter_shards(source, account_max: int, scan: int, include_internal: bool, chunk: int) -> Iterator[Shard]:
+    # purpose -> account -> change -> индексы, нарезанные на куски по chunk.
+    # change-узел выводится один раз, дальше по одной публичной деривации на индекс
+    changes = [0, 1] if include_internal else [0]
+    for purpose in source.purposes():
+        for account in source.accounts(account_max):
+            for change in changes:
+                for start in range(0, scan + 1, chunk):
+                    yield purpose, account, change, start, min(start + chunk, scan + 1)
 
-        for account in range(account_max + 1):
-            acc = base.Account(account)
 
-            changes = [Bip44Changes.CHAIN_EXT]
-            if include_internal:
-                changes.append(Bip44Changes.CHAIN_INT)
+def load_targets(path: str) -> FrozenSet[bytes]:
+    # по адресу на строку; пустые строки и комментарии (#) пропускаются.
+    # В памяти держатся только 20-байтовые witness program, поиск — O(1)
+    targets = set()
+    with open(path, "r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            try:
+                targets.add(decode_target(line))
+            except ValueError as e:
+                raise SystemExit(f"{path}:{lineno}: {e}")
+    if not targets:
+        raise SystemExit(f"В {path} нет адресов")
+    return frozenset(targets)
 
-            for ch_enum in changes:
-                ch = acc.Change(ch_enum)
-                for index in range(scan + 1):
-                    wif = ch.AddressIndex(index).PrivateKey().ToWif()
-                    yield pur_name, account, (0 if ch_enum == Bip44Changes.CHAIN_EXT else 1), index, wif
 
+# состояние процесса-воркера (заполняется в _init_worker)
+_W_SOURCE = None
+_W_TARGETS: FrozenSet[bytes] = frozenset()
+_W_STOP = None
 
-def main():
+
+def _set_state(source, targets: FrozenSet[bytes], stop_event) -> None:
+    global _W_SOURCE, _W_TARGETS, _W_STOP
+    _W_SOURCE, _W_TARGETS, _W_STOP = source, targets, stop_event
+
+
+def _init_worker(source, targets: FrozenSet[bytes], stop_event) -> None:
+    # Ctrl-C и SIGTERM обрабатывает главный процесс (сохраняет чекпоинт),
+    # воркеры просто гасятся через pool.terminate()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    _set_state(source, targets, stop_event)
+
+
+def _scan_shard(shard: Shard) -> Tuple[Shard, int, List[Tuple[Hit, bytes]], Tuple[float, float, float]]:
+    purpose, account, change, start, stop = shard
+    hits: List[Tuple[Hit, bytes]] = []
+    if _W_STOP.is_set():
+        return shard, 0, hits, (0.0, 0.0, 0.0)
+    clock = time.perf_counter
+    t0 = clock()
+    # узлы кэшируются в источнике воркера: шарды одного чейна не выводят
+    # заново путь от seed
+    node = _W_SOURCE.chain(purpose, account, change)
+    targets = _W_TARGETS
+    t_derive = clock() - t0
+    t_hash = t_cmp = 0.0
+    checked = 0
+    for index in range(start, stop):
+        # отмена проверяется внутри шарда, чтобы не дожидаться его конца
+        if checked % 256 == 0 and _W_STOP.is_set():
+            break
+        checked += 1
+        t0 = clock()
+        pub = node.pubkey(index)
+        t1 = clock()
+        h160 = hash160(pub)
+        t2 = clock()
+        hit = h160 in targets
+        t3 = clock()
+        t_derive += t1 - t0
+        t_hash += t2 - t1
+        t_cmp += t3 - t2
+        if hit:
+            hits.append(((purpose, account, change, index), h160))
+            # единственная цель найдена — дальше искать нечего
+            if len(targets) == 1:
+                _W_STOP.set()
+                break
+    return shard, checked, hits, (t_derive, t_hash, t_cmp)
+
+
+def search(
+    source,
+    targets: FrozenSet[bytes],
+    shards: List[Shard],
+    workers: int,
+    stats: ScanStats,
+    checkpoint: Optional[Checkpoint] = None,
+    on_hit: Optional[Callable[[Hit], None]] = None,
+    report_every: float = 10.0,
+    stats_json: Optional[str] = None,
+    checkpoint_every: float = 30.0,
+) -> List[Hit]:
+    # При workers > 1 шарды раздаются из общей очереди пула по одному
+    # (chunksize=1): освободившийся воркер сразу забирает следующий, так что
+    # медленные шарды не тормозят остальных. Когда найдены все цели, общий
+    # Event останавливает воркеров, пул гасится.
+    # Чекпоинт хранит пройденные шарды; при прерывании (Ctrl-C, SIGTERM)
+    # он сохраняется в finally, недоделанные шарды пройдутся заново.
+    ctx = mp.get_context()
+    stop_event = ctx.Event()
+    found: List[Hit] = []
+    found_targets = set()
+    if checkpoint is not None:
+        found = [hit for hit, _ in checkpoint.found]
+        found_targets = {h160 for _, h160 in checkpoint.found}
+        shards = [s for s in shards if s[:4] not in checkpoint.done]
+    if len(found_targets) == len(targets):
+        shards = []
+
+    pool = None
+    if workers > 1 and shards:
+        pool = ctx.Pool(workers, initializer=_init_worker, initargs=(source, targets, stop_event))
+        results = pool.imap_unordered(_scan_shard, shards, chunksize=1)
+    else:
+        _set_state(source, targets, stop_event)
+        results = map(_scan_shard, shards)
+
+    last_report = time.monotonic()
+    try:
+        for shard, n, hits, times in results:
+            stats.add(n, times)
+            for hit, h160 in hits:
+                found.append(hit)
+                found_targets.add(h160)
+                stats.found += 1
+                if on_hit is not None:
+                    on_hit(hit)
+            if checkpoint is not None:
+                checkpoint.mark(shard[:4], n, hits)
+                if checkpoint.due(checkpoint_every):
+                    checkpoint.save()
+            if len(found_targets) == len(targets):
+                stop_event.set()
+                break
+            if time.monotonic() - last_report >= report_every:
+                last_report = time.monotonic()
+                print(stats.line())
+                if stats_json:
+                    stats.write_json(stats_json)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        if checkpoint is not None:
+            checkpoint.save()
+        if stats_json:
+            stats.write_json(stats_json)
+    return found
+
+
+def print_found(source, pur: str, account: int, change: int, index: int) -> None:
+    print("\nFOUND!")
+    print("purpose:", pur)
+    print("path:", path_str(pur, account, change, index))
+    if source is None:
+        return
+    wif = source.wif(pur, account, change, index)
+    if wif is not None:
+        print("wif:", wif)
+    else:
+        print("wif: недоступен (поиск по xpub)")
+
+
+def _raise_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
     ap = argparse.ArgumentParser()
-    ap.add_argument("--addr", required=True, help="tb1q... address to find")
+    group = ap.add_mutually_exclusive_group()
+    group.add_argument("--addr", help="tb1q... address to find")
+    group.add_argument("--addr-file", help="file with tb1q... addresses, one per line (report every match)")
     ap.add_argument("--scan", type=int, default=5000, help="max index to scan")
     ap.add_argument("--account-max", type=int, default=10, help="max account (0..N)")
     ap.add_argument("--include-internal", action="store_true", help="also scan change=1")
-    args = ap.parse_args()
+    ap.add_argument("--workers", type=int, default=1,
+                    help="worker processes (1 = serial, 0 = all cores)")
+    ap.add_argument("--chunk", type=int, default=500, help="indexes per shard (unit of work and checkpointing)")
+    ap.add_argument("--xpub", help="account-level xpub/tpub/vpub to scan instead of the mnemonic")
+    ap.add_argument("--purpose", choices=["BIP44", "BIP49", "BIP84"], default="BIP84",
+                    help="purpose of --xpub")
+    ap.add_argument("--build-index", metavar="PATH",
+                    help="write (or extend) an on-disk hash160 -> path index for the scanned range")
+    ap.add_argument("--index", metavar="PATH", help="look targets up in a prebuilt index instead of deriving")
+    ap.add_argument("--checkpoint", metavar="PATH", help="periodically save the scan cursor to PATH")
+    ap.add_argument("--checkpoint-every", type=float, default=30.0, help="seconds between checkpoints")
+    ap.add_argument("--resume", action="store_true", help="continue from --checkpoint instead of index 0")
+    ap.add_argument("--report-every", type=float, default=10.0, help="seconds between progress lines")
+    ap.add_argument("--stats-json", metavar="PATH", help="write keys/sec, ETA and per-stage timings as JSON")
+    ap.add_argument("--discover", action="store_true",
+                    help="gap-limit wallet discovery instead of a fixed --scan/--account-max range")
+    ap.add_argument("--history", metavar="PATH",
+                    help="address-activity file for --discover (address per line or JSONL with \"address\")")
+    ap.add_argument("--rpc-url", help="bitcoind wallet RPC URL to read address activity from for --discover")
+    ap.add_argument("--gap", type=int, default=20, help="unused addresses in a row that end a chain")
+    ap.add_argument("--discover-out", metavar="PATH", help="write discovered used paths as JSONL")
+    ap.add_argument("--ec-backend", choices=["coincurve", "ecdsa", "pure"],
+                    help="secp256k1 backend for derivation (default: fastest available / EC_BACKEND)")
+    args = ap.parse_args(argv)
+
+    if args.resume and not args.checkpoint:
+        ap.error("--resume requires --checkpoint")
+    if args.discover and not (args.history or args.rpc_url):
+        ap.error("--discover requires --history or --rpc-url")
+    # без мнемоники/xpub --index не даёт ключа-источника для деривации
+    if args.index and (args.build_index or args.discover):
+        ap.error("--index cannot be combined with --build-index or --discover")
+    if args.discover and args.build_index:
+        ap.error("--discover cannot be combined with --build-index")
+    # поиск по индексу ничего не перебирает и ключи не выводит: курсор и
+    # xpub ему не нужны, молча их игнорировать нельзя
+    if args.index:
+        ignored = [flag for flag, value in (("--checkpoint", args.checkpoint), ("--resume", args.resume),
+                                            ("--xpub", args.xpub)) if value]
+        if ignored:
+            ap.error(f"--index cannot be combined with {', '.join(ignored)}")
+    if not (args.discover or args.build_index or args.addr or args.addr_file):
+        ap.error("one of --addr/--addr-file is required")
+    return args
 
-    setup("testnet")
 
-    target = args.addr.strip().lower()
-    if not target.startswith("tb1q"):
-        raise SystemExit("Ожидается tb1q...")
+def main():
+    args = parse_args()
 
-    seed_bytes = Bip39SeedGenerator(MNEMONIC).Generate(MNEMONIC_PASSPHRASE)
+    if args.ec_backend:
+        # через окружение выбор доходит и до процессов-воркеров
+        os.environ["EC_BACKEND"] = args.ec_backend
 
-    checked = 0
-    for pur, account, change, index, wif in iter_paths(
-        seed_bytes,
-        args.account_max,
-        args.scan,
-        args.include_internal,
-    ):
-        checked += 1
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+
+    source = None
+    if args.xpub:
+        source = XpubSource(args.xpub, args.purpose)
+    elif not args.index:
+        source = SeedSource(Bip39SeedGenerator(MNEMONIC).Generate(MNEMONIC_PASSPHRASE))
+
+    if args.discover:
+        used = load_history_file(args.history) if args.history else load_node_activity(args.rpc_url)
+        paths = discover(source, used, gap=args.gap, include_internal=True)
+        for p in paths:
+            print(f"{path_str(p.purpose, p.account, p.change, p.index)}  {p.address}")
+        print(f"\nиспользованных путей: {len(paths)} (адресов в истории: {len(used)})")
+        if args.discover_out:
+            with open(args.discover_out, "w", encoding="utf-8") as f:
+                for p in paths:
+                    f.write(json.dumps({
+                        "purpose": p.purpose,
+                        "path": path_str(p.purpose, p.account, p.change, p.index),
+                        "address": p.address,
+                    }) + "\n")
+        return
+
+    if args.build_index:
+        header = build_index(
+            args.build_index,
+            source,
+            args.account_max,
+            args.scan,
+            args.include_internal,
+            workers,
+        )
+        print(f"index {args.build_index}: {header.count} keys, account_max={header.account_max} "
+              f"scan={header.scan} internal={header.include_internal}")
+        return
+
+    # адреса декодируются один раз; дальше сравниваются сырые 20 байт hash160,
+    # WIF кодируется только для найденных ключей
+    if args.addr_file:
+        targets = load_targets(args.addr_file)
+    else:
+        addr = args.addr.strip().lower()
+        if not addr.startswith("tb1q"):
+            raise SystemExit("Ожидается tb1q...")
+        try:
+            targets = frozenset([decode_target(addr)])
+        except ValueError as e:
+            raise SystemExit(str(e))
 
-        priv = PrivateKey(wif)
-        pub = priv.get_public_key()
-        addr = pub.get_segwit_address().to_string().lower()
+    if args.index:
+        # мнемоника не нужна: пути берутся из mmap-индекса
+        with AddrIndex(args.index) as idx:
+            found = [hit for t in targets for hit in idx.lookup(t)]
+        for hit in found:
+            print_found(None, *hit)
+    else:
+        chunk = max(1, args.chunk)
+        shards = list(iter_shards(source, args.account_max, args.scan, args.include_internal, chunk))
+        stats = ScanStats(sum(stop - start for *_, start, stop in shards))
 
-        if addr == target:
-            print("\nFOUND!")
-            print("purpose:", pur)
-            print("path:", f"m/{ {'BIP44':44,'BIP49':49,'BIP84':84}[pur] }'/1'/{account}'/{change}/{index}")
-            print("wif:", wif)
-            return
+        checkpoint = None
+        if args.checkpoint:
+            checkpoint = Checkpoint(args.checkpoint, {
+                "source": source.fingerprint().hex(),
+                "purposes": source.purposes(),
+                "account_max": args.account_max,
+                "scan": args.scan,
+                "include_internal": args.include_internal,
+                "chunk": chunk,
+                "targets": targets_digest(targets),
+            })
+            if args.resume and os.path.exists(args.checkpoint):
+                try:
+                    checkpoint.load()
+                except ValueError as e:
+                    raise SystemExit(str(e))
+                stats = ScanStats(stats.total_keys, checkpoint.checked)
+                stats.found = len(checkpoint.found)
+                print(f"resume: {len(checkpoint.done)} shards done, {checkpoint.checked} keys checked")
+                for hit, _ in checkpoint.found:
+                    print_found(source, *hit)
 
-        if checked % 50000 == 0:
-            print(f"checked {checked} keys... last={pur} a={account} c={change} i={index}")
+        # SIGTERM (вытеснение на общем хосте) обрабатывается как Ctrl-C:
+        # search() сохранит чекпоинт перед выходом
+        signal.signal(signal.SIGTERM, _raise_interrupt)
+        try:
+            found = search(
+                source,
+                targets,
+                shards,
+                workers,
+                stats,
+                checkpoint=checkpoint,
+                on_hit=lambda hit: print_found(source, *hit),
+                report_every=args.report_every,
+                stats_json=args.stats_json,
+                checkpoint_every=args.checkpoint_every,
+            )
+        except KeyboardInterrupt:
+            print("\nпрервано: " + stats.line())
+            if checkpoint is not None:
+                print(f"чекпоинт сохранён в {checkpoint.path}, продолжить: --resume")
+            raise SystemExit(130)
+        print(stats.line())
 
-    raise SystemExit(
-        "\nНЕ НАЙДЕНО.\n"
-    )
+    if not found:
+        raise SystemExit(
+            "\nНЕ НАЙДЕНО.\n"
+        )
+    if len(targets) > 1:
+        print(f"\nнайдено путей: {len(found)} (адресов в списке: {len(targets)})")
 if __name__ == "__main__":
     main()
@@ -2,7 +2,12 @@ from bitcoinrpc.authproxy import AuthServiceProxy, JSONRPCException
 import json
 from decimal import Decimal
 
+from sats_rpc import SatoshiRPC
+
 class BitcoinWalletAnalyzer:
+    RPC_BATCH_SIZE = 500       # вызовов в одном JSON-RPC пакете
+    LISTUNSPENT_CHUNK = 1000   # адресов в одном вызове listunspent
+    
     def __init__(self, rpc_user, rpc_password, rpc_host='127.0.0.1', rpc_port=8332, wallet_name=''):
         """
         Инициализация подключения к Bitcoin Core RPC
@@ -27,69 +32,96 @@ class BitcoinWalletAnalyzer:
             self.rpc_url = f"http://{rpc_user}:{rpc_password}@{rpc_host}:{rpc_port}/"
         
         self.rpc_connection = None
+        self.sats_rpc = None  # ответы с суммами сразу в целых сатоши
     
     def connect(self):
-        """Установить соединение с Bitcoin Core"""
+        """
+        Подготовить соединение с Bitcoin Core
+        
+        Запросов к узлу здесь нет: сеть и число блоков приходят в одном
+        пакете с балансом из get_wallet_overview().
+        """
         try:
             self.rpc_connection = AuthServiceProxy(self.rpc_url)
-            # Проверяем соединение
-            info = self.rpc_connection.getblockchaininfo()
-            print(f"✓ Подключено к {info['chain']} сети")
-            print(f"✓ Блоков: {info['blocks']}")
+            self.sats_rpc = SatoshiRPC(self.rpc_url)
             return True
         except Exception as e:
             print(f"✗ Ошибка подключения: {e}")
             return False
     
-    def get_address_utxo_sum(self, address):
+    def rpc_batch(self, calls, batch_size=None, sats=False):
         """
-        Получить сумму всех UTXO для указанного адреса
+        Выполнить много RPC-вызовов пакетами JSON-RPC: один HTTP-запрос на пакет
         
         Args:
-            address: Bitcoin адрес
+            calls: список вызовов вида ['метод', параметр1, параметр2, ...]
+            batch_size: вызовов в одном запросе (по умолчанию RPC_BATCH_SIZE)
+            sats: дробные числа ответа — суммы, разобрать сразу в целые сатоши
         
         Returns:
-            dict: {'total_btc': Decimal, 'total_satoshis': int, 'utxo_count': int, 'utxos': list}
+            list: результаты в порядке calls
+        """
+        size = batch_size or self.RPC_BATCH_SIZE
+        results = []
+        for i in range(0, len(calls), size):
+            part = calls[i:i + size]
+            if sats:
+                results.extend(self.sats_rpc.batch(part))
+            else:
+                # batch_ снимает имя метода с переданного списка — отдаём копии
+                results.extend(self.rpc_connection.batch_([list(call) for call in part]))
+        return results
+    
+    def get_utxo_sums(self, addresses):
+        """
+        Получить суммы UTXO сразу для многих адресов
+        
+        Адреса режутся на группы по LISTUNSPENT_CHUNK (listunspent принимает
+        список адресов), а вызовы listunspent уходят пакетами — 10 000 адресов
+        это 10 вызовов в одном HTTP-запросе.
+        
+        Args:
+            addresses: список Bitcoin адресов
+        
+        Returns:
+            dict: адрес -> {'total_btc', 'total_satoshis', 'utxo_count', 'utxos'}
         """
         if not self.rpc_connection:
             print("Сначала установите соединение с помощью метода connect()")
             return None
         
+        addresses = list(dict.fromkeys(addresses))
+        results = {a: {'address': a, 'total_satoshis': 0, 'utxos': []} for a in addresses}
+        
         try:
-            # Получаем все непотраченные выходы
-            unspent = self.rpc_connection.listunspent(0, 9999999, [address])
+            chunk = self.LISTUNSPENT_CHUNK
+            calls = [['listunspent', 0, 9999999, addresses[i:i + chunk]]
+                     for i in range(0, len(addresses), chunk)]
             
-            total_satoshis = 0
-            utxos = []
-            
-            for tx in unspent:
-                # Проверяем, что UTXO принадлежит нашему адресу
-                if tx['address'] == address:
-                    amount_sat = int(Decimal(tx['amount']) * Decimal('1e8'))
-                    total_satoshis += amount_sat
-                    
-                    utxo_info = {
+            # суммы приходят целыми сатоши — складываем int, без Decimal на каждый UTXO
+            for unspent in self.rpc_batch(calls, sats=True):
+                for tx in unspent:
+                    # Проверяем, что UTXO принадлежит одному из наших адресов
+                    result = results.get(tx.get('address'))
+                    if result is None:
+                        continue
+                    amount_sat = tx['amount']
+                    result['total_satoshis'] += amount_sat
+                    result['utxos'].append({
                         'txid': tx['txid'],
                         'vout': tx['vout'],
-                        'amount_btc': float(tx['amount']),
+                        'amount_btc': amount_sat / 1e8,
                         'amount_sat': amount_sat,
                         'confirmations': tx['confirmations'],
                         'spendable': tx['spendable'],
                         'safe': tx.get('safe', True)
-                    }
-                    utxos.append(utxo_info)
-            
-            total_btc = Decimal(total_satoshis) / Decimal('1e8')
+                    })
             
-            result = {
-                'address': address,
-                'total_btc': total_btc,
-                'total_satoshis': total_satoshis,
-                'utxo_count': len(utxos),
-                'utxos': utxos
-            }
+            for result in results.values():
+                result['total_btc'] = Decimal(result['total_satoshis']) / Decimal('1e8')
+                result['utxo_count'] = len(result['utxos'])
             
-            return result
+            return results
             
         except JSONRPCException as e:
             print(f"✗ RPC ошибка: {e}")
@@ -98,6 +130,39 @@ class BitcoinWalletAnalyzer:
             print(f"✗ Ошибка: {e}")
             return None
     
+    def get_address_utxo_sum(self, address):
+        """
+        Получить сумму всех UTXO для указанного адреса
+        
+        Args:
+            address: Bitcoin адрес
+        
+        Returns:
+            dict: {'total_btc': Decimal, 'total_satoshis': int, 'utxo_count': int, 'utxos': list}
+        """
+        results = self.get_utxo_sums([address])
+        return results[address] if results else None
+    
+    def get_wallet_overview(self):
+        """Состояние сети, баланс и адреса кошелька за один HTTP-запрос"""
+        try:
+            info, balance, received = self.rpc_batch([
+                ['getblockchaininfo'],
+                ['getbalance'],
+                ['listreceivedbyaddress', 0, True],
+            ])
+            return {
+                'chain': info['chain'],
+                'blocks': info['blocks'],
+                'total_balance_btc': Decimal(balance),
+                'total_balance_sat': int(Decimal(balance) * Decimal('1e8')),
+                'addresses': [{'address': r['address'], 'amount': r['amount'],
+                               'confirmations': r['confirmations']} for r in received]
+            }
+        except Exception as e:
+            print(f"✗ Ошибка получения данных кошелька: {e}")
+            return None
+    
     def get_wallet_balance(self):
         """Получить общий баланс кошелька"""
         try:
@@ -162,7 +227,7 @@ def main():
     RPC_USER = '***'
     RPC_PASSWORD = '***'
     RPC_HOST = '127.0.0.1'
-    RPC_PORT =   # Порт для testnet
+    RPC_PORT = 18332  # Порт для testnet
     WALLET_NAME = 'mywallet'  # Имя кошелька
     
     TARGET_ADDRESS = 'tb1qfzj8zf78efn054996k0twh9wfjpa9t5kxwu0qz'
@@ -179,15 +244,15 @@ def main():
         wallet_name=WALLET_NAME
     )
     
-    # Подключаемся к Bitcoin Core
-    if not analyzer.connect():
+    # Подключаемся к Bitcoin Core; сеть, баланс и адреса — одним пакетным запросом
+    overview = analyzer.get_wallet_overview() if analyzer.connect() else None
+    if not overview:
         print("Не удалось подключиться к Bitcoin Core")
         return
-    
-    # Получаем баланс кошелька
-    wallet_balance = analyzer.get_wallet_balance()
-    if wallet_balance:
-        print(f"Баланс кошелька: {wallet_balance['total_balance_btc']:.8f} BTC")
+    print(f"✓ Подключено к {overview['chain']} сети")
+    print(f"✓ Блоков: {overview['blocks']}")
+    print(f"Баланс кошелька: {overview['total_balance_btc']:.8f} BTC")
+    print(f"Адресов в кошельке: {len(overview['addresses'])}")
     
     # Получаем сумму UTXO для адреса
     print(f"\nАнализируем адрес: {TARGET_ADDRESS}")
@@ -2,6 +2,9 @@ from bitcoinrpc.authproxy import AuthServiceProxy, JSONRPCException
 from decimal import Decimal
 import time
 
+from amounts import format_btc
+from sats_rpc import SatoshiRPC
+
 # ========== НАСТРОЙКИ ==========
 RPC_USER = ""  
 RPC_PASSWORD = ""  
@@ -16,6 +19,7 @@ TO_ADDRESS = "tb1qe6lzszgmh4p9n7ndch9u99d4npmw7754ctzy3r"
 class BitcoinTx:
     def __init__(self):
         self.rpc = None
+        self.sats_rpc = None
         1
     def connect(self):
         """Подключиться к Bitcoin Core"""
@@ -25,6 +29,7 @@ class BitcoinTx:
                 url += f"wallet/{WALLET_NAME}"
             
             self.rpc = AuthServiceProxy(url)
+            self.sats_rpc = SatoshiRPC(url)  # суммы сразу целыми сатоши
             
             # Проверяем подключение
             info = self.rpc.getblockchaininfo()
@@ -54,23 +59,21 @@ class BitcoinTx:
             return 0
     
     def get_utxos(self):
-        """Получить все UTXO"""
+        """Получить все UTXO (поле amount — целые сатоши)"""
         try:
-            utxos = self.rpc.listunspent(1)  # минимум 1 подтверждение
-            total = Decimal('0')
+            utxos = self.sats_rpc.listunspent(1)  # минимум 1 подтверждение
+            total_sat = sum(utxo['amount'] for utxo in utxos)
             
             print(f"\nНайдено {len(utxos)} UTXO:")
             for i, utxo in enumerate(utxos[:10], 1):  # показываем первые 10
-                amount_sat = int(Decimal(str(utxo['amount'])) * Decimal('100000000'))
-                print(f"{i:2}. {utxo['txid'][:16]}... - {utxo['amount']:.8f} BTC "
+                amount_sat = utxo['amount']
+                print(f"{i:2}. {utxo['txid'][:16]}... - {format_btc(amount_sat)} BTC "
                       f"({amount_sat:,} sat) - {utxo['confirmations']} conf")
-                total += Decimal(str(utxo['amount']))
             
             if len(utxos) > 10:
                 print(f"... и еще {len(utxos) - 10} UTXO")
             
-            total_sat = int(total * Decimal('100000000'))
-            print(f"\nОбщая сумма UTXO: {total:.8f} BTC ({total_sat:,} сатоши)")
+            print(f"\nОбщая сумма UTXO: {format_btc(total_sat)} BTC ({total_sat:,} сатоши)")
             
             return utxos
         except Exception as e:
@@ -0,0 +1 @@
+../amounts.py
\ No newline at end of file
@@ -0,0 +1,34 @@
+# BTC amounts as integer satoshis, shared by balance_providers.py and the 3/
+# scripts (3/amounts.py is a symlink to this file). Bitcoin Core writes
+# amounts as JSON numbers; these go straight to int through
+# json.loads(parse_float=btc_to_sats), never through float.
+
+SATS_PER_BTC = 100_000_000
+
+
+def btc_to_sats(text):
+    """Exact BTC text ("0.00012345") -> satoshis (12345).
+
+    Raises ValueError if the amount is not a whole number of satoshis.
+    """
+    # Bitcoin Core always writes exactly 8 decimals
+    if text[-9:-8] == ".":
+        return int(text.replace(".", "", 1))
+    # general case: integer mantissa and exponent, still no float or Decimal
+    mantissa, _, exp = text.lower().partition("e")
+    whole, _, frac = mantissa.partition(".")
+    digits = int(whole + frac)
+    scale = 8 - len(frac) + int(exp or 0)
+    if scale >= 0:
+        return digits * 10 ** scale
+    sats, rest = divmod(digits, 10 ** -scale)
+    if rest:
+        raise ValueError(f"amount {text} is not a whole number of satoshis")
+    return sats
+
+
+def format_btc(sats):
+    """Integer satoshis -> BTC string with 8 decimals, no float."""
+    sign = "-" if sats < 0 else ""
+    whole, frac = divmod(abs(sats), SATS_PER_BTC)
+    return f"{sign}{whole}.{frac:08d}"
@@ -0,0 +1,409 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from amounts import btc_to_sats
+from ratelimit import RETRY_STATUS, TokenBucket, retry_after, retry_delay
+
+# One balance/UTXO interface over several backends:
+#   EsploraProvider        - mempool.space / blockstream.info style REST API
+#   BlockchainInfoProvider - blockchain.info (multi-address balance endpoint)
+#   BitcoindProvider       - local Bitcoin Core, scantxoutset over many
+#                            addr() descriptors in one call, no wallet needed
+# ProviderChain asks the fastest healthy provider first (moving average of
+# observed time per address) and falls over to the next one on any error; a
+# provider that failed sits out a growing cooldown. All HTTP providers send
+# their requests through one Pacer: a single rate limit, a single budget of
+# requests in flight, and retries on 429/5xx before an error reaches the chain.
+#
+# balances(addresses) -> {address: {"address", "balance_satoshis",
+#     "total_received", "total_sent", "transaction_count", "source"}}
+#     (fields a backend cannot know are None)
+# utxos(addresses) -> {address: [{"txid", "vout", "value", "confirmations"}]}
+
+ESPLORA_URL = "https://blockstream.info/api"
+BLOCKCHAIN_INFO_URL = "https://blockchain.info"
+
+
+class ProviderError(RuntimeError):
+    pass
+
+
+def _session(pool_size):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class Pacer:
+    def __init__(self, rate=5.0, concurrency=8, retries=5, backoff=1.0, max_backoff=60.0):
+        self.bucket = TokenBucket(rate)
+        self.concurrency = concurrency
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "retries": 0}
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def get(self, session, url, **kw):
+        """GET with pacing; the last response is returned once retries run out."""
+        for attempt in range(self.retries + 1):
+            self.bucket.wait()
+            response = None
+            with self.slots:
+                self._count("requests")
+                try:
+                    response = session.get(url, **kw)
+                    if response.status_code not in RETRY_STATUS:
+                        return response
+                except (requests.ConnectionError, requests.Timeout):
+                    if attempt == self.retries:
+                        raise
+            if attempt == self.retries:
+                return response
+            # the slot is free while we wait
+            self._count("retries")
+            server_delay = retry_after(response.headers) if response is not None else None
+            time.sleep(retry_delay(attempt, self.backoff, self.max_backoff, server_delay))
+
+
+def _chunks(items, size):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _summary(address, balance, received, sent, n_tx, source):
+    return {
+        "address": address,
+        "balance_satoshis": balance,
+        "balance_btc": balance / 100000000,
+        "total_received": received,
+        "total_sent": sent,
+        "transaction_count": n_tx,
+        "source": source
+    }
+
+
+class BalanceProvider:
+    name = "base"
+    BATCH = None  # addresses per call it handles best; None = any
+    pacer = None  # HTTP providers count their requests in the pacer's stats
+    stats = None  # ... the others keep their own {"requests": n}
+
+    def balances(self, addresses):
+        raise NotImplementedError
+
+    def utxos(self, addresses):
+        raise NotImplementedError
+
+    def ping(self):
+        """Cheapest request the backend has; used to rank providers."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class EsploraProvider(BalanceProvider):
+    name = "esplora"
+
+    def __init__(self, base_url=ESPLORA_URL, pacer=None, timeout=20):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.pacer = pacer or Pacer()
+        self.session = _session(self.pacer.concurrency)
+        # one call per address; the pacer's slots cap what is really in flight
+        self.pool = ThreadPoolExecutor(max_workers=self.pacer.concurrency)
+
+    def _get(self, path):
+        r = self.pacer.get(self.session, self.base_url + path, timeout=self.timeout)
+        if not r.ok:
+            raise ProviderError(f"{self.name} GET {path}: HTTP {r.status_code}")
+        return r.json()
+
+    def _balance(self, address):
+        d = self._get(f"/address/{address}")
+        chain, mempool = d["chain_stats"], d["mempool_stats"]
+        received = chain["funded_txo_sum"] + mempool["funded_txo_sum"]
+        sent = chain["spent_txo_sum"] + mempool["spent_txo_sum"]
+        return _summary(address, received - sent, received, sent,
+                        chain["tx_count"] + mempool["tx_count"], self.name)
+
+    def _utxos(self, address):
+        tip = None
+        out = []
+        for u in self._get(f"/address/{address}/utxo"):
+            status = u.get("status", {})
+            conf = 0
+            if status.get("confirmed"):
+                tip = tip if tip is not None else int(self._get("/blocks/tip/height"))
+                conf = tip - status["block_height"] + 1
+            out.append({"txid": u["txid"], "vout": u["vout"], "value": u["value"], "confirmations": conf})
+        return out
+
+    def balances(self, addresses):
+        addresses = list(addresses)
+        return dict(zip(addresses, self.pool.map(self._balance, addresses)))
+
+    def utxos(self, addresses):
+        addresses = list(addresses)
+        return dict(zip(addresses, self.pool.map(self._utxos, addresses)))
+
+    def ping(self):
+        self._get("/blocks/tip/height")
+
+    def close(self):
+        self.pool.shutdown()
+        self.session.close()
+
+
+class BlockchainInfoProvider(BalanceProvider):
+    name = "blockchain.info"
+    BATCH = 100  # addresses per /balance request
+
+    def __init__(self, base_url=BLOCKCHAIN_INFO_URL, pacer=None, timeout=30):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.pacer = pacer or Pacer()
+        self.session = _session(4)
+
+    def _get(self, path, params):
+        r = self.pacer.get(self.session, self.base_url + path, params=params, timeout=self.timeout)
+        if not r.ok:
+            raise ProviderError(f"{self.name} GET {path}: HTTP {r.status_code}")
+        return r.json()
+
+    def balances(self, addresses):
+        out = {}
+        for part in _chunks(addresses, self.BATCH):
+            data = self._get("/balance", {"active": "|".join(part)})
+            for address in part:
+                d = data[address]
+                received, balance = d["total_received"], d["final_balance"]
+                out[address] = _summary(address, balance, received, received - balance, d["n_tx"], self.name)
+        return out
+
+    def utxos(self, addresses):
+        # the multi-address form does not say which address an output is for
+        out = {}
+        for address in addresses:
+            r = self.pacer.get(self.session, self.base_url + "/unspent", timeout=self.timeout,
+                               params={"active": address, "limit": 1000, "confirmations": 0})
+            if r.status_code == 500 and "No free outputs" in r.text:
+                out[address] = []
+                continue
+            if not r.ok:
+                raise ProviderError(f"{self.name} GET /unspent: HTTP {r.status_code}")
+            out[address] = [
+                {"txid": u["tx_hash_big_endian"], "vout": u["tx_output_n"], "value": u["value"],
+                 "confirmations": u["confirmations"]}
+                for u in r.json()["unspent_outputs"]
+            ]
+        return out
+
+    def ping(self):
+        r = self.pacer.get(self.session, self.base_url + "/q/getblockcount", timeout=self.timeout)
+        if not r.ok:
+            raise ProviderError(f"{self.name}: HTTP {r.status_code}")
+
+    def close(self):
+        self.session.close()
+
+
+class BitcoindProvider(BalanceProvider):
+    # scantxoutset walks the node's UTXO set once for all descriptors: no
+    # wallet, no address index and no rate limits. It sees confirmed outputs
+    # only, and knows nothing about history, so received/sent/n_tx are None.
+    # A scan costs a full pass over the UTXO set however many descriptors it
+    # carries, so callers should hand over as many addresses as they can.
+    name = "bitcoind"
+    BATCH = 10000  # descriptors per scan
+
+    def __init__(self, url, user=None, password=None, timeout=600):
+        self.url = url
+        self.timeout = timeout
+        self.session = _session(2)
+        if user is not None:
+            self.session.auth = (user, password or "")
+        self._scan_lock = threading.Lock()  # the node runs one scan at a time
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0}  # no pacer here: a local node has no rate limit
+
+    def _rpc(self, calls, parse_float=float):
+        # calls: [(method, params)] sent as one JSON-RPC batch
+        body = [{"jsonrpc": "1.0", "id": i, "method": m, "params": p} for i, (m, p) in enumerate(calls)]
+        with self._lock:
+            self.stats["requests"] += 1
+        r = self.session.post(self.url, data=json.dumps(body), timeout=self.timeout)
+        if r.status_code in (401, 403):
+            raise ProviderError(f"{self.name}: HTTP {r.status_code} (check RPC credentials)")
+        try:
+            replies = json.loads(r.text, parse_float=parse_float)
+        except ValueError:
+            raise ProviderError(f"{self.name}: HTTP {r.status_code} {r.text[:200]}") from None
+        if not isinstance(replies, list):
+            # the node answers a batch it could not handle with one error object
+            error = replies.get("error") if isinstance(replies, dict) else None
+            message = error.get("message") if isinstance(error, dict) else error
+            raise ProviderError(f"{self.name}: HTTP {r.status_code} {message or r.text[:200]}")
+        replies.sort(key=lambda x: x["id"])
+        for reply in replies:
+            if reply.get("error"):
+                raise ProviderError(f"{self.name}: {reply['error'].get('message')}")
+        return [reply["result"] for reply in replies]
+
+    def _scan(self, addresses):
+        scripts = self._rpc([("validateaddress", [a]) for a in addresses])
+        by_script = {}
+        for address, info in zip(addresses, scripts):
+            if not info.get("isvalid"):
+                raise ProviderError(f"{self.name}: invalid address {address}")
+            by_script[info["scriptPubKey"]] = address
+        with self._scan_lock:
+            result, = self._rpc([("scantxoutset", ["start", [f"addr({a})" for a in addresses]])],
+                                parse_float=btc_to_sats)
+        if not result or not result.get("success", True):
+            raise ProviderError(f"{self.name}: scantxoutset failed")
+        found = {a: [] for a in addresses}
+        tip = result["height"]
+        for u in result["unspents"]:
+            found[by_script[u["scriptPubKey"]]].append({
+                "txid": u["txid"], "vout": u["vout"], "value": u["amount"],
+                "confirmations": tip - u["height"] + 1,
+            })
+        return found
+
+    def utxos(self, addresses):
+        out = {}
+        for part in _chunks(addresses, self.BATCH):
+            out.update(self._scan(part))
+        return out
+
+    def balances(self, addresses):
+        return {a: _summary(a, sum(u["value"] for u in lst), None, None, None, self.name)
+                for a, lst in self.utxos(addresses).items()}
+
+    def ping(self):
+        self._rpc([("getblockcount", [])])
+
+    def close(self):
+        self.session.close()
+
+
+class ProviderChain:
+    def __init__(self, providers, cooldown=30.0, max_cooldown=600.0, alpha=0.3):
+        if not providers:
+            raise ValueError("No balance providers configured")
+        self.providers = list(providers)
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        # moving average of seconds per address: batch sizes differ by provider
+        self.latency = {p.name: None for p in self.providers}
+        self.failures = {p.name: 0 for p in self.providers}
+        self.down_until = {p.name: 0.0 for p in self.providers}
+
+    def _record(self, provider, elapsed=None, error=False):
+        with self._lock:
+            name = provider.name
+            if error:
+                self.failures[name] += 1
+                pause = min(self.max_cooldown, self.cooldown * 2 ** (self.failures[name] - 1))
+                self.down_until[name] = time.monotonic() + pause
+                return
+            self.failures[name] = 0
+            old = self.latency[name]
+            self.latency[name] = elapsed if old is None else old + self.alpha * (elapsed - old)
+
+    def ranked(self):
+        # healthy first, then by latency (unmeasured ones get tried early)
+        now = time.monotonic()
+        with self._lock:
+            return sorted(self.providers, key=lambda p: (
+                self.down_until[p.name] > now,
+                self.latency[p.name] if self.latency[p.name] is not None else 0.0))
+
+    def requests(self):
+        """HTTP requests sent so far; providers sharing a pacer are counted once."""
+        counters = {}
+        for p in self.providers:
+            stats = p.pacer.stats if getattr(p, "pacer", None) else p.stats
+            counters[id(stats)] = stats
+        return sum(stats["requests"] for stats in counters.values())
+
+    def batch_size(self, default):
+        """How many addresses to hand the provider that will be asked first."""
+        return self.ranked()[0].BATCH or default
+
+    def probe(self):
+        """Time a ping on every provider to seed the ranking."""
+        for p in self.providers:
+            t0 = time.perf_counter()
+            try:
+                p.ping()
+            except (requests.RequestException, ProviderError, ValueError, KeyError):
+                self._record(p, error=True)
+            else:
+                self._record(p, time.perf_counter() - t0)
+        return {p.name: self.latency[p.name] for p in self.providers}
+
+    def _call(self, method, addresses):
+        addresses = list(addresses)
+        errors = []
+        for p in self.ranked():
+            t0 = time.perf_counter()
+            try:
+                result = getattr(p, method)(addresses)
+            except (requests.RequestException, ProviderError, ValueError, KeyError) as e:
+                self._record(p, error=True)
+                errors.append(f"{p.name}: {e}")
+                continue
+            self._record(p, (time.perf_counter() - t0) / max(1, len(addresses)))
+            return result
+        raise ProviderError("All balance providers failed: " + "; ".join(errors))
+
+    def balances(self, addresses):
+        return self._call("balances", addresses)
+
+    def utxos(self, addresses):
+        return self._call("utxos", addresses)
+
+    def close(self):
+        for p in self.providers:
+            p.close()
+
+
+def make_providers(names, esplora_url=ESPLORA_URL, blockchain_url=BLOCKCHAIN_INFO_URL,
+                   rpc_url=None, rpc_user=None, rpc_password=None, pacer=None):
+    """Build providers from names like "bitcoind,esplora,blockchain.info".
+
+    The HTTP providers share pacer (one is made if not given).
+    """
+    pacer = pacer or Pacer()
+    providers = []
+    for name in names:
+        name = name.strip().lower()
+        if name == "esplora":
+            providers.append(EsploraProvider(esplora_url, pacer))
+        elif name in ("blockchain", "blockchain.info"):
+            providers.append(BlockchainInfoProvider(blockchain_url, pacer))
+        elif name == "bitcoind":
+            if not rpc_url:
+                raise ValueError("bitcoind provider needs an RPC URL")
+            providers.append(BitcoindProvider(rpc_url, rpc_user, rpc_password))
+        elif name:
+            raise ValueError(f"Unknown balance provider: {name}")
+    return providers
@@ -0,0 +1,62 @@
+import asyncio
+import random
+import threading
+import time
+
+# Request pacing shared by 1.py, balance_providers.py and the 2/ scripts
+# (2/ratelimit.py is a symlink to this file): a token bucket that works from
+# threads and from asyncio, and the retry delay all of them use - the
+# server's Retry-After if it sent one, otherwise full jitter.
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    def __init__(self, rate, burst=None):
+        self.rate = rate  # requests per second, 0 = unlimited
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.burst
+        self.stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self):
+        # 0 if a token was taken, otherwise seconds until the next one
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def wait(self):
+        """Block the calling thread until a request may go out."""
+        if self.rate <= 0:
+            return
+        delay = self._take()
+        while delay:
+            time.sleep(delay)
+            delay = self._take()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        delay = self._take()
+        while delay:
+            await asyncio.sleep(delay)
+            delay = self._take()
+
+
+def retry_after(headers):
+    """Seconds from a Retry-After header, or None."""
+    value = headers.get("Retry-After", "") if headers is not None else ""
+    return float(value) if value.isdigit() else None
+
+
+def retry_delay(attempt, backoff, max_backoff, server_delay=None):
+    """Pause before retry number attempt (from 0)."""
+    if server_delay is not None:
+        return server_delay
+    # full jitter: uniform in [0, backoff * 2^attempt]
+    return random.uniform(0, min(max_backoff, backoff * (2 ** attempt)))
@@ -0,0 +1,44 @@
+import hashlib
+
+from addrindex import AddrIndex, build_index, read_header
+
+
+class _Chain:
+    def __init__(self, account, change):
+        self.prefix = f"{account}/{change}/".encode()
+
+    def hash160(self, i):
+        return hashlib.new("ripemd160", hashlib.sha256(self.prefix + str(i).encode()).digest()).digest()
+
+
+class _XpubLike:
+    """Источник с одним аккаунтом, как XpubSource."""
+
+    def __init__(self, account):
+        self.account = account
+
+    def fingerprint(self):
+        return b"\x01\x02\x03\x04"
+
+    def purposes(self):
+        return ["BIP84"]
+
+    def accounts(self, account_max):
+        return range(self.account, self.account + 1)
+
+    def chain(self, purpose, account, change):
+        return _Chain(account, change)
+
+
+def test_rebuild_with_account_above_account_max_is_idempotent(tmp_path):
+    path = str(tmp_path / "idx.bin")
+    source = _XpubLike(account=15)
+    first = build_index(path, source, account_max=10, scan=49, include_internal=False)
+    assert first.count == 50 and first.account_max == 15
+    again = build_index(path, source, account_max=10, scan=49, include_internal=False)
+    assert again == first == read_header(path)
+
+    grown = build_index(path, source, account_max=10, scan=99, include_internal=True)
+    assert grown.count == 200
+    with AddrIndex(path) as idx:
+        assert idx.lookup(_Chain(15, 1).hash160(7)) == [("BIP84", 15, 1, 7)]
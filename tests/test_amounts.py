@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+from amounts import btc_to_sats, format_btc
+
+
+@pytest.mark.parametrize("text, sats", [
+    ("0.00012345", 12345),
+    ("21000000.00000000", 2_100_000_000_000_000),
+    ("-0.50000000", -50_000_000),
+    ("0", 0),
+    ("1.5", 150_000_000),
+    ("1e-8", 1),
+    ("1.2E-7", 12),
+    ("-1e-8", -1),
+    ("5E+2", 50_000_000_000),
+    ("100e-10", 1),
+])
+def test_btc_to_sats_is_exact(text, sats):
+    assert btc_to_sats(text) == sats
+
+
+@pytest.mark.parametrize("text", ["0.000000001", "1e-9", "-1.5e-9", "0.123456789"])
+def test_sub_satoshi_amounts_are_rejected(text):
+    with pytest.raises(ValueError):
+        btc_to_sats(text)
+
+
+def test_parse_float_hook_keeps_integers_and_other_fields():
+    reply = json.loads('{"amount": 0.10000001, "height": 800000, "total": 2.1e-7}',
+                       parse_float=btc_to_sats)
+    assert reply == {"amount": 10_000_001, "height": 800000, "total": 21}
+
+
+def test_format_btc_round_trips():
+    for sats in (0, 1, 12345, -50_000_000, 2_100_000_000_000_000):
+        assert btc_to_sats(format_btc(sats)) == sats
+
+
+def test_providers_and_sats_rpc_share_one_implementation():
+    import balance_providers
+    import sats_rpc
+    assert balance_providers.btc_to_sats is btc_to_sats
+    assert sats_rpc.btc_to_sats is btc_to_sats
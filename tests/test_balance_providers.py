@@ -0,0 +1,201 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from balance_providers import (BitcoindProvider, EsploraProvider, Pacer, ProviderChain,
+                               ProviderError)
+
+
+class _Mock:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.throttle = 0       # ближайшие N GET получат 429
+        self.rpc_reply = None   # переопределить ответ JSON-RPC
+        self.scans = []
+
+
+@pytest.fixture
+def mock():
+    state = _Mock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, code, body, headers=()):
+            data = body.encode()
+            self.send_response(code)
+            for k, v in headers:
+                self.send_header(k, v)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            with state.lock:
+                state.in_flight += 1
+                state.max_in_flight = max(state.max_in_flight, state.in_flight)
+                throttled = state.throttle > 0
+                state.throttle -= throttled
+            time.sleep(0.01)
+            with state.lock:
+                state.in_flight -= 1
+            if throttled:
+                return self._send(429, "slow down", [("Retry-After", "0")])
+            stats = {"funded_txo_sum": 700, "spent_txo_sum": 200, "tx_count": 3}
+            empty = {"funded_txo_sum": 0, "spent_txo_sum": 0, "tx_count": 0}
+            self._send(200, json.dumps({"chain_stats": stats, "mempool_stats": empty}))
+
+        def do_POST(self):
+            calls = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            if state.rpc_reply is not None:
+                return self._send(500, json.dumps(state.rpc_reply))
+            out = []
+            for c in calls:
+                if c["method"] == "validateaddress":
+                    result = {"isvalid": True, "scriptPubKey": "0014" + c["params"][0].encode().hex()}
+                elif c["method"] == "scantxoutset":
+                    addrs = [d[5:-1] for d in c["params"][1]]
+                    state.scans.append(len(addrs))
+                    result = {"success": True, "height": 100, "unspents": [
+                        {"txid": "aa" * 32, "vout": 0, "scriptPubKey": "0014" + a.encode().hex(),
+                         "amount": "0.00000500", "height": 90} for a in addrs]}
+                else:
+                    result = 100
+                out.append({"id": c["id"], "result": result, "error": None})
+            self._send(200, json.dumps(out).replace('"0.00000500"', "0.00000500"))
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield state, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def test_esplora_retries_429_and_shares_one_in_flight_budget(mock):
+    state, url = mock
+    pacer = Pacer(rate=0, concurrency=3, retries=25, backoff=0.001)
+    provider = EsploraProvider(url, pacer)
+    chain = ProviderChain([provider])
+    state.throttle = 20
+    addresses = [f"a{i}" for i in range(60)]
+    results = {}
+
+    def worker(part):
+        results.update(chain.balances(part))
+
+    threads = [threading.Thread(target=worker, args=(addresses[i::4],)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    provider.close()
+    assert len(results) == 60 and all(r["balance_satoshis"] == 500 for r in results.values())
+    assert pacer.stats["retries"] == 20
+    assert state.max_in_flight <= 3
+
+
+def test_bitcoind_gets_full_batch_and_is_ranked_per_address(mock):
+    state, url = mock
+    bitcoind = BitcoindProvider(url)
+    chain = ProviderChain([bitcoind])
+    size = chain.batch_size(100)
+    assert size == BitcoindProvider.BATCH
+    balances = chain.balances([f"b{i}" for i in range(size)])
+    assert state.scans == [size]
+    assert balances["b7"]["balance_satoshis"] == 500
+    # время на адрес, а не на пакет из тысяч адресов
+    assert chain.latency["bitcoind"] < 0.01
+
+
+@pytest.mark.parametrize("reply", [
+    {"result": None, "error": {"code": -32700, "message": "Parse error"}, "id": None},
+    {"result": None, "error": None, "id": None},
+    "busy",
+])
+def test_bitcoind_single_error_object_is_provider_error(mock, reply):
+    state, url = mock
+    state.rpc_reply = reply
+    with pytest.raises(ProviderError):
+        BitcoindProvider(url).balances(["b1"])
+    chain = ProviderChain([BitcoindProvider(url)])
+    with pytest.raises(ProviderError, match="All balance providers failed"):
+        chain.balances(["b1"])
+
+
+def _bulk():
+    from conftest import load_script
+    return load_script("1.py", "one")
+
+
+def test_requests_stat_counts_http_requests_not_batches(mock):
+    state, url = mock
+    pacer = Pacer(rate=0, concurrency=4, retries=25, backoff=0.001)
+    esplora = EsploraProvider(url, pacer)
+    chain = ProviderChain([esplora])
+    state.throttle = 5
+    rows = []
+    stats = _bulk().fetch_via_providers(chain, [f"a{i}" for i in range(40)], rows.append, 10, 2, pacer)
+    esplora.close()
+    # 4 пакета, но 40 адресов по одному GET + 5 повторов после 429
+    assert stats["ok"] == 40 and stats["retries"] == 5
+    assert stats["requests"] == 45
+
+    bitcoind = BitcoindProvider(url)
+    chain = ProviderChain([bitcoind, EsploraProvider(url, pacer)])
+    before = pacer.stats["requests"]
+    stats = _bulk().fetch_via_providers(chain, [f"b{i}" for i in range(250)], rows.append, 10, 2, pacer)
+    chain.close()
+    # один пакет на весь список: validateaddress + scantxoutset; esplora не трогали
+    assert stats["ok"] == 250 and state.scans == [250]
+    assert stats["requests"] == before + 2
+
+
+class _RankingChain:
+    # batch_size меняется, как будто первым в рейтинге становится другой провайдер
+    def __init__(self, sizes):
+        self.sizes = iter(sizes)
+        self.parts = []
+        self.lock = threading.Lock()
+
+    def batch_size(self, default):
+        return next(self.sizes, default)
+
+    def balances(self, part):
+        time.sleep(0.01)
+        with self.lock:
+            self.parts.append(len(part))
+        return {a: {"address": a} for a in part}
+
+    def requests(self):
+        return len(self.parts)
+
+
+def test_batches_are_cut_lazily_within_a_bounded_window():
+    read = []
+
+    def addresses():
+        for i in range(1000):
+            read.append(i)
+            yield f"a{i}"
+
+    chain = _RankingChain([5, 50, 3])
+    written = []
+    lag = []
+
+    def write(row):
+        written.append(row)
+        lag.append(len(read) - len(written))
+
+    stats = _bulk().fetch_via_providers(chain, addresses(), write, 20, 2, Pacer(rate=0))
+    assert stats["ok"] == 1000 and len(written) == 1000
+    # каждый пакет нарезан по размеру лидера на момент запуска
+    assert sorted(chain.parts) == sorted([5, 50, 3] + [20] * 47 + [2])
+    # прочитано не больше двух пакетов сверх записанного, а не весь список
+    assert max(lag) <= 2 * 50
@@ -0,0 +1,110 @@
+import math
+import random
+from dataclasses import dataclass
+
+import pytest
+
+import coinselect
+from coinselect import DUST_CHANGE, FeeModel, select_coins
+from txsize import p2wpkh_input, tx_weight
+
+SPK = b"\x00\x14" + bytes(20)
+CHANGE = b"\x00\x14" + b"\x01" * 20
+
+
+@dataclass(frozen=True)
+class UTXO:
+    txid: str
+    vout: int
+    value: int
+
+
+def _utxos(values):
+    return [UTXO(f"{i:064x}", 0, v) for i, v in enumerate(values)]
+
+
+def _fees(rate=2.0):
+    return FeeModel.from_templates(rate, p2wpkh_input(), [SPK], CHANGE)
+
+
+@pytest.mark.parametrize("rate", [1.0, 2.5, 37.0])
+@pytest.mark.parametrize("n_in", [1, 2, 252, 253, 300])
+def test_fee_is_tx_weight_times_rate(rate, n_in):
+    fees = _fees(rate)
+    for change, outputs in ((False, [SPK]), (True, [SPK, CHANGE])):
+        weight = tx_weight([p2wpkh_input()] * n_in, outputs)
+        assert fees.weight(n_in, change) == weight
+        assert fees.fee(n_in, change) == math.ceil(rate * math.ceil(weight / 4))
+
+
+def test_bnb_exact_match_has_no_change():
+    fees = _fees()
+    in_fee = fees.input_fee()
+    amount = 50_000
+    need = amount + fees.fee(0, False)
+    # две монеты покрывают цель точно; остальные ей не подходят
+    coins = _utxos([30_000 + in_fee, need - 30_000 + in_fee, 1_000_000, 7_777, 123_456])
+    sel = select_coins(coins, amount, fees, rng=random.Random(1))
+    assert sel.algorithm == "bnb"
+    assert sel.change == 0
+    assert sorted(u.value for u in sel.picked) == sorted([30_000 + in_fee, need - 30_000 + in_fee])
+    assert sel.fee == sel.total - amount >= fees.fee(2, False)
+
+
+def test_knapsack_when_no_changeless_match():
+    fees = _fees()
+    coins = _utxos([100_000] * 10)
+    sel = select_coins(coins, 150_000, fees, rng=random.Random(1))
+    assert sel.algorithm == "knapsack"
+    assert len(sel.picked) == 2
+    assert sel.fee == fees.fee(2, True)
+    assert sel.change == sel.total - 150_000 - sel.fee >= DUST_CHANGE
+
+
+def test_largest_first_when_budgets_run_out(monkeypatch):
+    monkeypatch.setattr(coinselect, "BNB_MAX_TRIES", 1)
+    monkeypatch.setattr(coinselect, "KNAPSACK_BUDGET", 5)
+    fees = _fees()
+    values = [5_000 + 100 * i for i in range(50)]
+    sel = select_coins(_utxos(values), 40_000, fees, rng=random.Random(1))
+    assert sel.algorithm == "largest_first"
+    picked = sorted((u.value for u in sel.picked), reverse=True)
+    assert picked == sorted(values, reverse=True)[:len(picked)]
+    assert sel.change >= DUST_CHANGE
+    assert sel.total - sel.fee - sel.change == 40_000
+
+
+def test_dust_change_goes_to_fee(monkeypatch):
+    # на 253-м входе счётчик входов растёт до 3 байт; при высокой ставке
+    # это съедает запас input_fee, и сдача выходит меньше пыли
+    monkeypatch.setattr(coinselect, "BNB_MAX_TRIES", 1)
+    fees = FeeModel(fee_rate=1000, base_weight=8 * 4 + 2 + 124, input_weight=272,
+                    change_weight=124, change_spend_weight=272)
+    value = 200_000
+    eff = value - fees.input_fee()
+    amount = 253 * eff - 1_600 - fees.fee(0, True) - DUST_CHANGE
+    sel = select_coins(_utxos([value] * 300), amount, fees, rng=random.Random(1))
+    assert sel.algorithm == "knapsack"
+    assert len(sel.picked) == 253
+    assert 0 < sel.total - amount - fees.fee(253, True) < DUST_CHANGE
+    assert sel.change == 0
+    assert sel.fee == sel.total - amount >= fees.fee(253, False)
+
+
+def test_insufficient_funds_raise():
+    fees = _fees()
+    with pytest.raises(RuntimeError, match="Недостаточно"):
+        select_coins(_utxos([10_000] * 5), 50_000, fees)
+    # монеты дешевле собственного входа не считаются вовсе
+    with pytest.raises(RuntimeError):
+        select_coins(_utxos([100] * 1000), 1_000, fees)
+
+
+def test_large_fragmented_wallet_stays_fast():
+    import time
+    rng = random.Random(7)
+    coins = _utxos([rng.randrange(1_000, 200_000) for _ in range(100_000)])
+    t0 = time.monotonic()
+    sel = select_coins(coins, 5_000_000, _fees(), rng=rng)
+    assert time.monotonic() - t0 < 10
+    assert sel.total - sel.fee - sel.change == 5_000_000
@@ -0,0 +1,34 @@
+from consolidate import hold_reason, plan_consolidation
+from txsize import p2wpkh_input
+
+SPK = b"\x00\x14" + bytes(20)
+
+
+def _utxos(values):
+    return [{"txid": f"{i:064x}", "vout": 0, "value": v} for i, v in enumerate(values)]
+
+
+def _summary(fee_rate, future_fee_rate, values):
+    spend = p2wpkh_input()
+    plan = plan_consolidation(_utxos(values), "tb1q", spend, SPK, fee_rate, future_fee_rate)
+    return plan, plan.summary(spend)
+
+
+def test_profitable_plan_is_not_held():
+    plan, summary = _summary(1, 25, [10_000] * 50)
+    assert plan.sweeps and summary["projected_savings"] > 0
+    assert hold_reason(summary, max_fee_rate=5) is None
+
+
+def test_unprofitable_plan_is_held_unless_forced():
+    # сейчас дороже, чем ожидается потом: сметание только теряет деньги
+    plan, summary = _summary(4, 2, [10_000] * 50)
+    assert plan.sweeps and summary["projected_savings"] <= 0
+    assert "не окупается" in hold_reason(summary, max_fee_rate=5)
+    assert hold_reason(summary, max_fee_rate=5, force=True) is None
+
+
+def test_fee_ceiling_is_not_overridden_by_force():
+    _, summary = _summary(10, 50, [10_000] * 50)
+    assert summary["projected_savings"] > 0
+    assert "выше порога" in hold_reason(summary, max_fee_rate=5, force=True)
@@ -0,0 +1,75 @@
+import hashlib
+import hmac
+
+import pytest
+from bip_utils import Bip39SeedGenerator
+
+import derive
+from derive import PURPOSES, ChainNode, SeedSource, XpubSource, ckd_pub, parse_xpub
+from ecbackend import available_backends, get_backend
+
+MNEMONIC = "abandon abandon abandon abandon abandon abandon abandon abandon abandon abandon abandon about"
+SEED = Bip39SeedGenerator(MNEMONIC).Generate()
+
+
+def _account(purpose, account):
+    cls, coin = {name: (c, k) for name, c, k in PURPOSES}[purpose]
+    return cls.FromSeed(SEED, coin).Purpose().Coin().Account(account)
+
+
+@pytest.mark.parametrize("backend", available_backends())
+@pytest.mark.parametrize("purpose", ["BIP44", "BIP49", "BIP84"])
+def test_ckd_pub_matches_bip_utils_for_account_xpubs(monkeypatch, backend, purpose):
+    monkeypatch.setenv("EC_BACKEND", backend)
+    acc = _account(purpose, 1)
+    source = XpubSource(acc.PublicKey().ToExtended(), purpose)
+    assert source.account == 1
+    for change in (0, 1):
+        node = source.chain(purpose, 1, change)
+        ch = acc.Change(derive._change_enum(change))
+        for index in list(range(25)) + [1000, 2 ** 31 - 1]:
+            expected = ch.AddressIndex(index).PublicKey().RawCompressed().ToBytes()
+            assert node.pubkey(index) == expected, (purpose, change, index)
+
+
+def test_seed_and_xpub_sources_derive_the_same_chain():
+    seed = SeedSource(SEED)
+    for purpose in ("BIP44", "BIP49", "BIP84"):
+        xpub = XpubSource(_account(purpose, 0).PublicKey().ToExtended(), purpose)
+        for change in (0, 1):
+            a, b = seed.chain(purpose, 0, change), xpub.chain(purpose, 0, change)
+            assert [a.hash160(i) for i in range(10)] == [b.hash160(i) for i in range(10)]
+
+
+def test_ckd_pub_chain_code_matches_bip_utils():
+    acc = _account("BIP84", 0)
+    pub, cc = parse_xpub(acc.PublicKey().ToExtended())
+    child, child_cc = ckd_pub(pub, cc, 0)
+    ext = acc.Change(derive._change_enum(0)).Bip32Object()
+    assert child == ext.PublicKey().RawCompressed().ToBytes()
+    assert child_cc == ext.ChainCode().ToBytes()
+    with pytest.raises(ValueError, match="hardened"):
+        ckd_pub(pub, cc, 2 ** 31)
+
+
+class _InvalidAt:
+    # бэкенд, у которого tweak для одного индекса даёт I_L >= n
+    def __init__(self, bad_tweak):
+        self.bad_tweak = bad_tweak
+        self.real = get_backend()
+
+    def pub_tweak_add(self, pub, tweak):
+        if tweak == self.bad_tweak:
+            raise ValueError("tweak вне диапазона")
+        return self.real.pub_tweak_add(pub, tweak)
+
+
+def test_invalid_child_index_is_an_error_not_another_key():
+    source = XpubSource(_account("BIP84", 0).PublicKey().ToExtended(), "BIP84")
+    node: ChainNode = source.chain("BIP84", 0, 0)
+    bad = hmac.new(node._chain_code, node._parent + (7).to_bytes(4, "big"), hashlib.sha512).digest()[:32]
+    node._ec = _InvalidAt(bad)
+    good = node.pubkey(8)
+    with pytest.raises(ValueError, match=r"m/84'/1'/0'/0/7"):
+        node.pubkey(7)
+    assert node.pubkey(8) == good
@@ -0,0 +1,46 @@
+import hashlib
+
+import pytest
+
+from bench_ec import check_agreement
+from ecbackend import N, available_backends, get_backend
+
+
+def _vector(i):
+    return (hashlib.sha256(b"key" + i.to_bytes(4, "big")).digest(),
+            hashlib.sha256(b"msg" + i.to_bytes(4, "big")).digest())
+
+
+def test_backends_sign_identically_across_thousands_of_vectors():
+    names = available_backends()
+    if len(names) < 2:
+        pytest.skip("нужно хотя бы два бэкенда")
+    backends = [get_backend(n) for n in names]
+    lengths = set()
+    for i in range(3000):
+        secret, digest = _vector(i)
+        sigs = {b.name: b.sign(secret, digest) for b in backends}
+        assert len(set(sigs.values())) == 1, (i, sigs)
+        lengths.add(len(next(iter(sigs.values()))))
+    # среди векторов есть подписи с коротким r или s — именно на них бэкенды
+    # раньше расходились
+    assert min(lengths) < 71 and max(lengths) <= 71
+
+
+def test_signatures_are_low_r_low_s_and_verify():
+    names = available_backends()
+    for i in range(50):
+        secret, digest = _vector(i)
+        for name in names:
+            b = get_backend(name)
+            sig = b.sign(secret, digest)
+            rlen = sig[3]
+            r = int.from_bytes(sig[4:4 + rlen], "big")
+            s = int.from_bytes(sig[6 + rlen:], "big")
+            assert r < 2 ** 255 and s <= N // 2
+            for other in names:
+                assert get_backend(other).verify(b.pubkey(secret), digest, sig)
+
+
+def test_check_agreement_accepts_installed_backends():
+    check_agreement(available_backends(), vectors=64)
@@ -0,0 +1,45 @@
+import pytest
+
+from esplora import EsploraClient, EsploraError
+from mock_esplora import MockState, serve
+from txbuilder import Tx, TxIn, TxOut
+
+
+@pytest.fixture
+def mock():
+    state = MockState({})
+    server = serve(state)
+    yield state, f"http://127.0.0.1:{server.server_address[1]}/api"
+    server.shutdown()
+
+
+def _raw():
+    tx = Tx([TxIn.from_hex("11" * 32, 0)], [TxOut(1000, b"\x00\x14" + bytes(20))])
+    return tx.serialize().hex(), tx.txid()
+
+
+def test_repeated_broadcast_is_success(mock):
+    state, url = mock
+    raw, txid = _raw()
+    with EsploraClient(url) as client:
+        assert client.broadcast(raw) == txid
+        # как повтор POST после таймаута, когда первая попытка дошла
+        assert client.broadcast(raw) == txid
+    assert list(state.mempool) == [txid]
+
+
+def test_other_broadcast_errors_still_raise(mock):
+    _, url = mock
+    with EsploraClient(url) as client, pytest.raises(EsploraError) as e:
+        client.broadcast("00")
+    assert e.value.status == 400
+
+
+def test_tx_status(mock):
+    state, url = mock
+    state.mempool["ab" * 32] = ""
+    state.confirmed["cd" * 32] = 100
+    with EsploraClient(url) as client:
+        assert client.tx_status("ab" * 32) == {"confirmed": False}
+        assert client.tx_status("cd" * 32) == {"confirmed": True, "block_height": 100}
+        assert client.tx_status("ef" * 32) is None
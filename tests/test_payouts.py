@@ -0,0 +1,71 @@
+from dataclasses import dataclass
+
+import pytest
+from bip_utils import Base58Encoder, SegwitBech32Encoder
+
+from payouts import Payout, load_payouts, plan_batches
+from txsize import p2wpkh_input
+
+H160 = bytes(range(20))
+SPK = b"\x00\x14" + H160
+TB = SegwitBech32Encoder.Encode("tb", 0, H160)
+BC = SegwitBech32Encoder.Encode("bc", 0, H160)
+M1 = Base58Encoder.CheckEncode(b"\x6f" + H160)  # testnet P2PKH
+ONE = Base58Encoder.CheckEncode(b"\x00" + H160)  # mainnet P2PKH
+
+
+@dataclass(frozen=True)
+class UTXO:
+    txid: str
+    vout: int
+    value: int
+
+
+def _utxos(n, value):
+    return [UTXO(f"{i:064x}", 0, value) for i in range(n)]
+
+
+def test_fragmented_wallet_is_split_instead_of_aborting():
+    # первая попытка требует входов в разы больше лимита веса
+    payouts = [Payout(TB, 20_000, SPK) for _ in range(300)]
+    batches = plan_batches(payouts, _utxos(3000, 4000), 3, p2wpkh_input(), SPK, max_weight=40_000)
+    assert sum(len(chunk) for chunk, _ in batches) == 300
+    assert [p for chunk, _ in batches for p in chunk] == payouts
+    for chunk, sel in batches:
+        assert sel.total - sel.fee - sel.change == sum(p.amount for p in chunk)
+        assert len(chunk) > 1
+    used = [(u.txid, u.vout) for _, sel in batches for u in sel.picked]
+    assert len(used) == len(set(used))
+
+
+def test_plan_batches_respects_max_weight():
+    from coinselect import FeeModel
+    payouts = [Payout(TB, 20_000, SPK) for _ in range(300)]
+    for chunk, sel in plan_batches(payouts, _utxos(3000, 4000), 3, p2wpkh_input(), SPK, max_weight=40_000):
+        fees = FeeModel.from_templates(3, p2wpkh_input(), [p.script for p in chunk], SPK)
+        assert fees.weight(len(sel.picked), sel.change > 0) <= 40_000
+
+
+def _load(tmp_path, text):
+    path = tmp_path / "payouts.csv"
+    path.write_text(text)
+    return load_payouts(str(path))
+
+
+def test_load_payouts_accepts_testnet(tmp_path):
+    payouts = _load(tmp_path, f"address,amount\n{TB},1000\n{M1},600\n")
+    assert [(p.address, p.amount) for p in payouts] == [(TB, 1000), (M1, 600)]
+
+
+@pytest.mark.parametrize("line, message", [
+    (f"{BC},1000", "не из сети"),
+    (f"{ONE},1000", "не из сети"),
+    (f"{TB[:-1]}{'p' if TB[-1] != 'p' else 'q'},1000", "контрольная сумма"),
+    (f"{M1[:-1]}{'2' if M1[-1] != '2' else '3'},1000", "контрольная сумма"),
+    (TB, "2 колонки"),
+    (f"{TB},293", "пыли"),
+])
+def test_load_payouts_rejects_with_location(tmp_path, line, message):
+    with pytest.raises(ValueError, match=message) as e:
+        _load(tmp_path, f"address,amount\n{TB},1000\n{line}\n")
+    assert "payouts.csv:3:" in str(e.value)
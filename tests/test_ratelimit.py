@@ -0,0 +1,36 @@
+import asyncio
+import time
+
+from ratelimit import TokenBucket, retry_after, retry_delay
+
+
+def test_bucket_paces_threads_and_asyncio_alike():
+    bucket = TokenBucket(rate=50, burst=1)
+    t0 = time.monotonic()
+    for _ in range(11):
+        bucket.wait()
+    assert 0.18 < time.monotonic() - t0 < 0.5
+
+    async def take(n):
+        for _ in range(n):
+            await bucket.acquire()
+
+    t0 = time.monotonic()
+    asyncio.run(take(10))
+    assert 0.18 < time.monotonic() - t0 < 0.5
+
+
+def test_unlimited_bucket_never_waits():
+    bucket = TokenBucket(rate=0)
+    t0 = time.monotonic()
+    for _ in range(1000):
+        bucket.wait()
+    assert time.monotonic() - t0 < 0.1
+
+
+def test_retry_delay_prefers_server_hint():
+    assert retry_after({"Retry-After": "7"}) == 7.0
+    assert retry_after({"Retry-After": "Wed, 21 Oct 2026 07:28:00 GMT"}) is None
+    assert retry_after(None) is None
+    assert retry_delay(3, 0.5, 30, server_delay=7.0) == 7.0
+    assert all(0 <= retry_delay(10, 0.5, 2.0) <= 2.0 for _ in range(100))
@@ -0,0 +1,82 @@
+import random
+import struct
+
+from bitcoinutils.script import Script
+from bitcoinutils.setup import setup
+from bitcoinutils.transactions import Transaction, TxInput, TxOutput
+
+from sighash import SegwitSigHasher, compact_size, hash256
+from txbuilder import Tx, TxIn, TxOut
+
+# BIP143, "Native P2WPKH": неподписанная транзакция, вход 1 (P2WPKH, 6 BTC)
+BIP143_UNSIGNED = bytes.fromhex(
+    "0100000002fff7f7881a8099afa6940d42d1e7f6362bec38171ea3edf433541db4e4ad969f0000000000eeffffff"
+    "ef51e1b804cc89d182d279655c3aa89e815b1b309fe287d9b2b55d57b90ec68a0100000000ffffffff02202cb206"
+    "000000001976a9148280b37df378db99f66f85c95a783a76ac7a6d5988ac9093510d000000001976a9143bde42db"
+    "ee7e4dbe6a21b2d50ce2f0167faa815988ac11000000")
+BIP143_SCRIPT_CODE = bytes.fromhex("76a9141d0f172a0ecb48aee1be1f2687d2963ae33f71a188ac")
+
+
+def test_bip143_native_p2wpkh_vector():
+    hasher = Tx.parse(BIP143_UNSIGNED).sighasher()
+    assert hasher.hash_prevouts.hex() == "96b827c8483d4e9b96712b6713a7b68d6e8003a781feba36c31143470b4efd37"
+    assert hasher.hash_sequence.hex() == "52b0a642eea2fb7ae638c36f6252b6750293dbe574a806984b8e4d8548339a3b"
+    assert hasher.hash_outputs.hex() == "863ef3e1a92afbfdb97f31ad0fc7683ee943e9abcf2501590ff8f6551f47e5e5"
+    digest = hasher.digest(1, BIP143_SCRIPT_CODE, 600_000_000)
+    assert digest.hex() == "c37af31116d1b27caf68aae9e3ac82f1477929014d5b917657d0eb49478cb670"
+
+
+def uncached_digest(tx, index, script_code, amount):
+    # BIP143 по тексту спецификации, всё заново на каждый вызов
+    prevouts = b"".join(i.txid + struct.pack("<I", i.vout) for i in tx.inputs)
+    sequences = b"".join(struct.pack("<I", i.sequence) for i in tx.inputs)
+    outputs = b"".join(struct.pack("<q", o.value) + compact_size(len(o.script_pubkey)) + o.script_pubkey
+                       for o in tx.outputs)
+    txin = tx.inputs[index]
+    return hash256(
+        struct.pack("<i", tx.version)
+        + hash256(prevouts) + hash256(sequences)
+        + txin.txid + struct.pack("<I", txin.vout)
+        + compact_size(len(script_code)) + script_code
+        + struct.pack("<q", amount)
+        + struct.pack("<I", txin.sequence)
+        + hash256(outputs)
+        + struct.pack("<I", tx.locktime)
+        + struct.pack("<I", 1)
+    )
+
+
+def _random_tx(rng, n_in, n_out):
+    inputs = [TxIn(rng.randbytes(32), rng.randrange(8), rng.choice([0xFFFFFFFF, 0xFFFFFFFD, 0xFFFFFFFE]))
+              for _ in range(n_in)]
+    outputs = [TxOut(rng.randrange(546, 10 ** 9), b"\x00\x14" + rng.randbytes(20)) for _ in range(n_out)]
+    return Tx(inputs, outputs, version=rng.choice([1, 2]), locktime=rng.randrange(2 ** 32))
+
+
+def test_cached_digests_match_uncached():
+    rng = random.Random(143)
+    for n_in, n_out in [(1, 1), (3, 2), (40, 7), (260, 300)]:
+        tx = _random_tx(rng, n_in, n_out)
+        hasher = tx.sighasher()
+        for index in range(n_in):
+            script_code = b"\x76\xa9\x14" + rng.randbytes(20) + b"\x88\xac"
+            if index % 2:
+                script_code = rng.randbytes(rng.choice([71, 105, 300]))  # witnessScript
+            amount = rng.randrange(1, 21 * 10 ** 14)
+            assert hasher.digest(index, script_code, amount) == uncached_digest(tx, index, script_code, amount)
+
+
+def test_from_tx_matches_bitcoinutils():
+    setup("testnet")
+    rng = random.Random(11)
+    tx = _random_tx(rng, 4, 3)
+    bu = Transaction(
+        [TxInput(i.txid[::-1].hex(), i.vout, sequence=struct.pack("<I", i.sequence)) for i in tx.inputs],
+        [TxOutput(o.value, Script.from_raw(o.script_pubkey.hex())) for o in tx.outputs],
+        locktime=struct.pack("<I", tx.locktime), version=struct.pack("<i", tx.version), has_segwit=True)
+    cached = SegwitSigHasher.from_tx(bu)
+    script_code = bytes.fromhex("5221") + rng.randbytes(33) + b"\x21" + rng.randbytes(33) + bytes.fromhex("52ae")
+    for index in range(4):
+        expected = bu.get_transaction_segwit_digest(index, Script.from_raw(script_code.hex()), 50_000 + index)
+        assert cached.digest(index, script_code, 50_000 + index) == expected
+        assert tx.sighasher().digest(index, script_code, 50_000 + index) == expected
@@ -0,0 +1,121 @@
+import hashlib
+import json
+
+import pytest
+
+from ecbackend import get_backend
+from signpipe import PartialTx, finalize, merge, parse_multisig, sign_partial, verify_partial, witness_stacks
+from txbuilder import Tx, TxIn, TxOut
+
+SECRETS = [hashlib.sha256(b"cosigner %d" % i).digest() for i in range(3)]
+PUBS = [get_backend().pubkey(s) for s in SECRETS]
+# ключи в скрипте нарочно не в порядке cosigner'ов: 2, 0, 1
+ORDER = [2, 0, 1]
+WITNESS_SCRIPT = b"\x52" + b"".join(b"\x21" + PUBS[i] for i in ORDER) + b"\x53\xae"
+
+
+def _partial(n_inputs=5, amount=100_000):
+    tx = Tx([TxIn(hashlib.sha256(bytes([i])).digest(), i) for i in range(n_inputs)],
+            [TxOut(amount * n_inputs - 5_000, b"\x00\x14" + b"\x11" * 20)])
+    return PartialTx.from_tx(tx, [amount] * n_inputs, WITNESS_SCRIPT)
+
+
+def _copy(ptx):
+    return PartialTx.from_json(json.loads(json.dumps(ptx.to_json())))
+
+
+def test_parse_multisig_keeps_script_order():
+    m, pubs = parse_multisig(WITNESS_SCRIPT)
+    assert m == 2 and pubs == [PUBS[i] for i in ORDER]
+
+
+def test_merge_in_either_order_gives_the_same_signatures():
+    base = _partial()
+    a, b = _copy(base), _copy(base)
+    assert sign_partial(a, [SECRETS[0]]) == 5
+    assert sign_partial(b, [SECRETS[1]]) == 5
+    ab, ba = merge([a, b]), merge([b, a])
+    assert ab.to_json() == ba.to_json()
+    assert all(len(sigs) == 2 for sigs in ab.sigs.values())
+    verify_partial(ab)
+    assert finalize(ab).serialize() == finalize(ba).serialize()
+
+
+def test_finalize_orders_signatures_by_witness_script():
+    ptx = _partial(n_inputs=3)
+    # подписываем ключами 1 и 2 — в скрипте ключ 2 стоит первым
+    sign_partial(ptx, [SECRETS[1], SECRETS[2]])
+    verify_partial(ptx)
+    tx = finalize(ptx)
+    for idx, txin in enumerate(tx.inputs):
+        assert txin.witness[0] == b""
+        assert txin.witness[-1] == WITNESS_SCRIPT
+        sigs = ptx.sigs[idx]
+        assert txin.witness[1:3] == [bytes.fromhex(sigs[PUBS[2].hex()]), bytes.fromhex(sigs[PUBS[1].hex()])]
+    # txid финальной транзакции — тот же, что у неподписанной
+    assert tx.txid() == ptx.txid()
+
+
+def test_finalize_needs_m_signatures():
+    ptx = _partial(n_inputs=2)
+    sign_partial(ptx, [SECRETS[0]])
+    with pytest.raises(ValueError, match="подписей 1 из 2"):
+        witness_stacks(ptx)
+
+
+def test_parallel_signing_matches_serial():
+    serial, parallel = _partial(n_inputs=40), _partial(n_inputs=40)
+    sign_partial(serial, SECRETS[:2])
+    sign_partial(parallel, SECRETS[:2], workers=2, chunk=8)
+    assert serial.sigs == parallel.sigs
+    # повторная подпись ничего не добавляет
+    assert sign_partial(serial, SECRETS[:2]) == 0
+
+
+def test_verify_partial_rejects_wrong_key():
+    ptx = _partial(n_inputs=2)
+    sign_partial(ptx, [SECRETS[0]])
+    # подпись ключа 0 выдана за подпись ключа 1
+    ptx.sigs[1][PUBS[1].hex()] = ptx.sigs[1].pop(PUBS[0].hex())
+    with pytest.raises(ValueError, match="входа 1"):
+        verify_partial(ptx)
+
+
+def test_verify_partial_rejects_wrong_digest():
+    ptx = _partial(n_inputs=2)
+    # cosigner подписал другую сумму входа — digest BIP143 другой
+    other = _copy(ptx)
+    other.inputs[0] = dict(other.inputs[0], amount=other.inputs[0]["amount"] + 1)
+    sign_partial(other, [SECRETS[0]])
+    ptx.sigs[0] = other.sigs[0]
+    with pytest.raises(ValueError, match="входа 0"):
+        verify_partial(ptx)
+    # и merge такой файл не примет
+    with pytest.raises(ValueError):
+        merge([ptx, other])
+
+
+def test_verify_partial_rejects_wrong_sighash_type():
+    ptx = _partial(n_inputs=1)
+    sign_partial(ptx, [SECRETS[0]])
+    sig = ptx.sigs[0][PUBS[0].hex()]
+    ptx.sigs[0][PUBS[0].hex()] = sig[:-2] + "03"
+    with pytest.raises(ValueError):
+        verify_partial(ptx)
+
+
+def test_sign_rejects_foreign_key():
+    with pytest.raises(ValueError, match="не входит"):
+        sign_partial(_partial(), [hashlib.sha256(b"stranger").digest()])
+
+
+def test_json_round_trip_checks_txid(tmp_path):
+    ptx = _partial()
+    sign_partial(ptx, [SECRETS[2]])
+    path = str(tmp_path / "p.json")
+    ptx.save(path)
+    assert PartialTx.load(path).to_json() == ptx.to_json()
+    d = ptx.to_json()
+    d["outputs"][0]["amount"] -= 1
+    with pytest.raises(ValueError, match="txid"):
+        PartialTx.from_json(d)
@@ -0,0 +1,109 @@
+import json
+
+import pytest
+
+from conftest import load_script
+
+one = load_script("1.py", "one")
+
+SUMMARY = {"final_balance": 1500, "total_received": 123456789012, "total_sent": 123456787512, "n_tx": 42}
+BODY = json.dumps({
+    "hash160": "00" * 20,
+    "address": "1Адрес\"[{",  # multi-byte UTF-8 and brackets inside a string
+    "tags": [{"note": "]}\"", "n": [1, [2, {"x": "}"}]]}],
+    "meta": {},
+    **SUMMARY,
+    "txs": [{"hash": "ab" * 32}] * 1000,
+}, ensure_ascii=False).encode("utf-8")
+
+
+def feed_in_chunks(parser, data, size):
+    for i in range(0, len(data), size):
+        if parser.feed(data[i:i + size]):
+            return i + size
+    return len(data)
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, len(BODY)])
+def test_fields_survive_any_chunk_split(size):
+    parser = one.SummaryParser()
+    feed_in_chunks(parser, BODY, size)
+    assert parser.done
+    assert parser.fields == {"hash160": "00" * 20, "address": "1Адрес\"[{", **SUMMARY}
+
+
+def test_stops_before_the_transaction_list():
+    parser = one.SummaryParser()
+    consumed = feed_in_chunks(parser, BODY, 16)
+    assert consumed < BODY.index(b'"txs"') + 32
+    assert "tags" not in parser.fields and "txs" not in parser.fields
+
+
+def test_stops_at_txs_even_when_fields_are_missing():
+    body = b'{"final_balance": 7, "txs": [' + b'{"hash": "00"},' * 1000
+    parser = one.SummaryParser()
+    assert feed_in_chunks(parser, body, 8) < 64
+    assert parser.fields == {"final_balance": 7}
+
+
+def test_nested_values_are_skipped_not_stored():
+    parser = one.SummaryParser(wanted=(), stop_keys=())
+    parser.feed(b'{"a": [1, {"b": 2}], "c": "x", "d": null, "e": true}')
+    assert parser.done
+    assert parser.fields == {"c": "x", "d": None, "e": True}
+
+
+def test_number_at_chunk_end_waits_for_delimiter():
+    parser = one.SummaryParser(wanted=("n_tx",))
+    parser.feed(b'{"n_tx": 12')
+    assert "n_tx" not in parser.fields
+    assert parser.feed(b'34}')
+    assert parser.fields == {"n_tx": 1234}
+
+
+@pytest.mark.parametrize("body", [b'[1, 2]', b'{"a" 1}', b'{"a": 1 "b": 2}', b'{a: 1}',
+                                  b'{"a":,}', b'{"a": }', b'{"a": ]}', b'{"a": tru, "b": 1}'])
+def test_malformed_object_raises(body):
+    with pytest.raises(ValueError):
+        one.SummaryParser().feed(body)
+
+
+class _Response:
+    def __init__(self, body):
+        self.body = body
+        self.read = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, size):
+        for i in range(0, len(self.body), size):
+            self.read = i + size
+            yield self.body[i:i + size]
+
+
+class _Session:
+    def __init__(self, body):
+        self.response = _Response(body)
+
+    def get(self, url, **kw):
+        assert kw.get("stream")
+        return self.response
+
+
+def test_fetch_summary_closes_early():
+    session = _Session(BODY)
+    assert one.fetch_summary("addr", session=session, chunk_size=256).items() >= SUMMARY.items()
+    assert session.response.read < len(BODY) // 10
+
+
+def test_fetch_summary_reports_missing_field():
+    body = json.dumps({"final_balance": 1, "total_received": 1, "txs": []}).encode()
+    with pytest.raises(KeyError, match="total_sent"):
+        one.fetch_summary("addr", session=_Session(body))
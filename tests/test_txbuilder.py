@@ -0,0 +1,94 @@
+import hashlib
+import random
+import struct
+
+import pytest
+from bitcoinutils.script import Script
+from bitcoinutils.setup import setup
+from bitcoinutils.transactions import Transaction, TxInput, TxOutput, TxWitnessInput
+
+from txbuilder import SEQUENCE_RBF, Tx, TxIn, TxOut
+
+# генезис-coinbase: legacy, txid известен
+GENESIS = bytes.fromhex(
+    "01000000010000000000000000000000000000000000000000000000000000000000000000ffffffff4d04ffff001d"
+    "0104455468652054696d65732030332f4a616e2f32303039204368616e63656c6c6f72206f6e206272696e6b206f66"
+    "207365636f6e64206261696c6f757420666f722062616e6b73ffffffff0100f2052a01000000434104678afdb0fe55"
+    "48271967f1a67130b7105cd6a828e03909a67962e0ea1f61deb649f6bc3f4cef38c4f35504e51ec112de5c384df7ba"
+    "0b8d578a4c702b6bf11d5fac00000000")
+GENESIS_TXID = "4a5e1e4baab89f3a32518a88c31bc87f618f76673e2cc77ab2127b7afdeda33b"
+
+# BIP143 "Native P2WPKH", подписанная: P2PK-вход со scriptSig и P2WPKH-вход с witness
+BIP143_SIGNED = bytes.fromhex(
+    "01000000000102fff7f7881a8099afa6940d42d1e7f6362bec38171ea3edf433541db4e4ad969f000000004948304502"
+    "21008b9d1dc26ba6a9cb62127b02742fa9d754cd3bebf337f7a55d114c8e5cdd30be022040529b194ba3f9281a99f2b1"
+    "c0a19c0489bc22ede944ccf4ecbab4cc618ef3ed01eeffffffef51e1b804cc89d182d279655c3aa89e815b1b309fe287"
+    "d9b2b55d57b90ec68a0100000000ffffffff02202cb206000000001976a9148280b37df378db99f66f85c95a783a76ac"
+    "7a6d5988ac9093510d000000001976a9143bde42dbee7e4dbe6a21b2d50ce2f0167faa815988ac000247304402203609"
+    "e17b84f6a7d30c80bfa610b5b4542f32a8a0d5447a12fb1366d7f01cc44a0220573a954c4518331561406f90300e8f33"
+    "58f51928d43c212a8caed02de67eebee0121025476c2e83188368da1ff3e292e7acafcdb3566bb0ad253f62fc70f07ae"
+    "ee635711000000")
+
+
+def _sha256d_hex(data):
+    return hashlib.sha256(hashlib.sha256(data).digest()).digest()[::-1].hex()
+
+
+@pytest.mark.parametrize("raw", [GENESIS, BIP143_SIGNED])
+def test_parse_serialize_round_trip(raw):
+    tx = Tx.parse(raw)
+    assert bytes(tx.serialize()) == raw
+    assert tx.total_size() == len(raw)
+    assert bytes(Tx.parse(tx.serialize()).serialize()) == raw
+
+
+def test_legacy_txid_equals_wtxid():
+    tx = Tx.parse(GENESIS)
+    assert not tx.has_witness()
+    assert tx.txid() == tx.wtxid() == GENESIS_TXID
+    assert (tx.weight(), tx.vsize()) == (816, 204)
+
+
+def test_segwit_txid_excludes_witness():
+    tx = Tx.parse(BIP143_SIGNED)
+    assert tx.has_witness()
+    assert tx.wtxid() == _sha256d_hex(BIP143_SIGNED)
+    assert tx.txid() == "e8151a2af31c368a35053ddd4bdb285a8595c769a3ad83e0fa02314a602d4609"
+    stripped = Tx.parse(BIP143_SIGNED)
+    for i in stripped.inputs:
+        i.witness = []
+    assert stripped.txid() == stripped.wtxid() == tx.txid()
+    assert stripped.total_size() == tx.base_size() == 233
+    # 233 базовых байта * 4 + 110 байт marker, flag и witness'ов
+    assert (tx.weight(), tx.vsize()) == (1042, 261)
+
+
+def test_parse_rejects_truncated_and_trailing_bytes():
+    with pytest.raises(ValueError):
+        Tx.parse(BIP143_SIGNED[:-5])
+    with pytest.raises(ValueError):
+        Tx.parse(GENESIS + b"\x00")
+
+
+def test_matches_bitcoinutils_byte_for_byte():
+    setup("testnet")
+    rng = random.Random(13)
+    for segwit in (False, True):
+        ins = [TxIn(rng.randbytes(32), rng.randrange(4), SEQUENCE_RBF,
+                    b"" if segwit else b"\x48" + rng.randbytes(72) + b"\x21" + rng.randbytes(33))
+               for _ in range(3)]
+        outs = [TxOut(rng.randrange(546, 10 ** 8), b"\x00\x14" + rng.randbytes(20)) for _ in range(2)]
+        if segwit:
+            for i in ins:
+                i.witness = [rng.randbytes(72), rng.randbytes(33)]
+        tx = Tx(ins, outs, version=2, locktime=800_000)
+        bu = Transaction(
+            [TxInput(i.txid[::-1].hex(), i.vout, Script.from_raw(i.script_sig.hex()) if i.script_sig else Script([]),
+                     sequence=struct.pack("<I", i.sequence)) for i in ins],
+            [TxOutput(o.value, Script.from_raw(o.script_pubkey.hex())) for o in outs],
+            locktime=struct.pack("<I", 800_000), version=struct.pack("<i", 2), has_segwit=segwit,
+            witnesses=[TxWitnessInput([w.hex() for w in i.witness]) for i in ins] if segwit else None)
+        assert tx.serialize().hex() == bu.serialize()
+        assert tx.txid() == bu.get_txid()
+        assert tx.wtxid() == bu.get_wtxid()
+        assert tx.vsize() == bu.get_vsize()
@@ -0,0 +1,18 @@
+from txsize import SIG_SIZE, p2wsh_multisig_input, varint_size
+
+
+def _witness_size(items):
+    return varint_size(len(items)) + sum(varint_size(len(i)) + len(i) for i in items)
+
+
+def test_multisig_input_uses_actual_witness_script_length():
+    # 1-of-2 с несжатыми ключами: скрипт 135 байт, а не 71
+    script = bytes([0x51]) + (bytes([65]) + b"\x04" * 65) * 2 + bytes([0x52, 0xAE])
+    spend = p2wsh_multisig_input(1, 2, len(script))
+    assert spend.witness == _witness_size([b"", b"s" * SIG_SIZE, script])
+    assert spend.witness - p2wsh_multisig_input(1, 2).witness == 2 * 32
+
+
+def test_multisig_input_default_assumes_compressed_keys():
+    script = bytes([0x52]) + (bytes([33]) + b"\x02" * 33) * 3 + bytes([0x53, 0xAE])
+    assert p2wsh_multisig_input(2, 3) == p2wsh_multisig_input(2, 3, len(script))
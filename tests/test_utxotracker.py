@@ -0,0 +1,108 @@
+import time
+
+from utxotracker import ANCESTOR_LIMIT, MEMPOOL_EXPIRY, NOT_FOUND_GRACE, UtxoTracker
+
+FUND = "aa" * 32
+
+
+def _utxo(txid, vout, value, confirmed):
+    return {"txid": txid, "vout": vout, "value": value, "status": {"confirmed": confirmed}}
+
+
+def _tx(n):
+    return f"{n:064x}"
+
+
+def test_spent_outpoint_is_not_offered_when_api_lists_it_again(tmp_path):
+    tracker = UtxoTracker(str(tmp_path / "chain.json"))
+    tracker.record(_tx(1), 141, 500, [(FUND, 0)], [(1, 40_000)])
+    tracker.record(_tx(2), 141, 500, [(_tx(1), 1)], [(1, 30_000)])
+
+    # API на время перестал показывать исходный выход, потом снова видит
+    # нашу неподтверждённую сдачу, но ещё не видит трату второй транзакцией
+    tracker.sync([], lambda txid: {"confirmed": False})
+    listed = [_utxo(_tx(1), 1, 40_000, False)]
+    tracker.sync(listed, lambda txid: {"confirmed": False})
+    offered = {(u["txid"], u["vout"]) for u in tracker.available(listed)}
+    assert (_tx(1), 1) not in offered
+    assert (FUND, 0) not in offered
+    assert offered == {(_tx(2), 1)}
+
+
+def test_spent_is_released_once_spender_confirms(tmp_path):
+    tracker = UtxoTracker(str(tmp_path / "chain.json"))
+    tracker.record(_tx(1), 141, 500, [(FUND, 0)], [])
+    tracker.sync([_utxo(FUND, 0, 50_000, True)], lambda txid: {"confirmed": True})
+    assert tracker.pending == {}
+    assert tracker.spent == {}
+
+
+def test_tx_without_change_is_confirmed_by_status(tmp_path):
+    tracker = UtxoTracker(str(tmp_path / "chain.json"))
+    tracker.record(_tx(1), 141, 500, [(FUND, 0)], [])
+    tracker.record(_tx(2), 141, 500, [(FUND, 1)], [(1, 1000)])
+    asked = []
+
+    def status(txid):
+        asked.append(txid)
+        return {"confirmed": txid == _tx(1)}
+
+    tracker.sync([], status)
+    assert set(tracker.pending) == {_tx(2)}
+    assert set(asked) == {_tx(1), _tx(2)}
+
+
+def test_confirmed_child_confirms_ancestors_without_requests(tmp_path):
+    tracker = UtxoTracker(str(tmp_path / "chain.json"))
+    tracker.record(_tx(1), 141, 500, [(FUND, 0)], [(1, 40_000)])
+    tracker.record(_tx(2), 141, 500, [(_tx(1), 1)], [(1, 30_000)])
+    asked = []
+    tracker.sync([], lambda txid: asked.append(txid) or {"confirmed": True})
+    assert tracker.pending == {}
+    assert asked == [_tx(2)]
+
+
+def test_unknown_tx_is_dropped_only_after_grace(tmp_path):
+    tracker = UtxoTracker(str(tmp_path / "chain.json"))
+    tracker.record(_tx(1), 141, 500, [(FUND, 0)], [(1, 40_000)])
+    tracker.sync([], lambda txid: None)
+    assert _tx(1) in tracker.pending
+    tracker.pending[_tx(1)]["time"] -= NOT_FOUND_GRACE + 1
+    tracker.sync([], lambda txid: None)
+    assert tracker.pending == {} and tracker.outputs == {} and tracker.spent == {}
+
+
+def test_expiry_without_status_source(tmp_path):
+    tracker = UtxoTracker(str(tmp_path / "chain.json"))
+    tracker.record(_tx(1), 141, 500, [(FUND, 0)], [])
+    tracker.sync([])
+    assert _tx(1) in tracker.pending
+    tracker.pending[_tx(1)]["time"] = time.time() - MEMPOOL_EXPIRY - 1
+    tracker.sync([])
+    assert tracker.pending == {} and tracker.spent == {}
+
+
+def test_state_roundtrip_and_legacy_spent_list(tmp_path):
+    path = str(tmp_path / "chain.json")
+    tracker = UtxoTracker(path)
+    tracker.record(_tx(1), 141, 500, [(FUND, 0)], [(1, 40_000)])
+    tracker.save()
+    assert UtxoTracker(path).spent == {f"{FUND}:0": _tx(1)}
+
+    (tmp_path / "chain.json").write_text('{"pending": {}, "outputs": {}, "spent": ["%s:0"]}' % FUND)
+    legacy = UtxoTracker(path)
+    assert legacy.spent == {f"{FUND}:0": None}
+    legacy.sync([_utxo(FUND, 0, 50_000, True)], lambda txid: None)
+    assert legacy.spent == {}
+
+
+def test_limits_ok_counts_planned_siblings(tmp_path):
+    tracker = UtxoTracker(str(tmp_path / "chain.json"))
+    tracker.record(_tx(1), 200, 500, [(FUND, 0)], [(v, 10_000) for v in range(ANCESTOR_LIMIT)])
+    planned = {}
+    for n in range(2, ANCESTOR_LIMIT + 1):
+        assert tracker.limits_ok({_tx(1)}, 200, planned)
+        planned[_tx(n)] = {"vsize": 200, "parents": [_tx(1)]}
+    # у _tx(1) уже 24 потомка в партии: 25-й превысит лимит потомков
+    assert tracker.limits_ok({_tx(1)}, 200)
+    assert not tracker.limits_ok({_tx(1)}, 200, planned)
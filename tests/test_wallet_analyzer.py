@@ -0,0 +1,139 @@
+from decimal import Decimal
+
+import pytest
+from bitcoinrpc.authproxy import JSONRPCException
+
+from conftest import load_script
+
+wallet = load_script("3/3.1.py", "wallet_31")
+
+A1 = "tb1qfzj8zf78efn054996k0twh9wfjpa9t5kxwu0qz"
+A2 = "tb1qw508d6qejxtdg4y5r3zarvary0c5xw7kxpjzsx"
+
+
+class StubNode:
+    """Ответы узла по имени метода; ошибка — {'error': {...}}."""
+
+    def __init__(self, handlers):
+        self.handlers = handlers
+        self.requests = []  # по одному списку вызовов на HTTP-запрос
+
+    def reply(self, calls):
+        self.requests.append([list(c) for c in calls])
+        out = []
+        for method, *params in calls:
+            result = self.handlers[method](*params)
+            if isinstance(result, dict) and "error" in result:
+                raise JSONRPCException(result["error"])
+            out.append(result)
+        return out
+
+
+class StubProxy:
+    # как AuthServiceProxy.batch_: снимает имя метода с переданного списка
+    def __init__(self, node):
+        self.node = node
+
+    def batch_(self, calls):
+        replies = self.node.reply(calls)
+        for call in calls:
+            call.pop(0)
+        return replies
+
+
+class StubSats:
+    def __init__(self, node):
+        self.node = node
+
+    def batch(self, calls):
+        return self.node.reply(calls)
+
+
+def analyzer(handlers, batch_size=None):
+    node = StubNode(handlers)
+    a = wallet.BitcoinWalletAnalyzer("u", "p", rpc_port=18332)
+    a.rpc_connection = StubProxy(node)
+    a.sats_rpc = StubSats(node)
+    if batch_size:
+        a.RPC_BATCH_SIZE = batch_size
+    return a, node
+
+
+def test_rpc_batch_chunks_calls_and_keeps_order():
+    a, node = analyzer({"echo": lambda x: x}, batch_size=3)
+    calls = [["echo", i] for i in range(8)]
+    assert a.rpc_batch(calls) == list(range(8))
+    assert [len(r) for r in node.requests] == [3, 3, 2]
+    # вызывающему возвращаются нетронутые списки вызовов
+    assert calls[0] == ["echo", 0]
+
+
+def test_rpc_batch_sats_goes_through_satoshi_client():
+    a, node = analyzer({"getbalance": lambda: 150_000_000})
+    a.rpc_connection = None
+    assert a.rpc_batch([["getbalance"]], sats=True) == [150_000_000]
+
+
+def test_rpc_batch_raises_on_error_object():
+    error = {"code": -5, "message": "Invalid address"}
+    a, _ = analyzer({"ok": lambda: 1, "bad": lambda: {"error": error}})
+    with pytest.raises(JSONRPCException) as e:
+        a.rpc_batch([["ok"], ["bad"]])
+    assert e.value.error == error
+
+
+def _listunspent(utxos):
+    def handler(minconf, maxconf, addresses):
+        return [u for u in utxos if u["address"] in addresses]
+    return handler
+
+
+def _utxo(address, txid, sats):
+    return {"address": address, "txid": txid, "vout": 0, "amount": sats,
+            "confirmations": 3, "spendable": True}
+
+
+def test_get_utxo_sums_groups_addresses_into_listunspent_calls():
+    addresses = [f"addr{i}" for i in range(2500)]
+    utxos = [_utxo("addr0", "aa" * 32, 10_000), _utxo("addr0", "bb" * 32, 5),
+             _utxo("addr2499", "cc" * 32, 2_100_000_000_000_000),
+             _utxo("stranger", "dd" * 32, 1)]
+    a, node = analyzer({"listunspent": _listunspent(utxos)}, batch_size=2)
+    sums = a.get_utxo_sums(addresses + ["addr0"])
+    # 2500 адресов -> 3 вызова listunspent -> 2 HTTP-запроса по 2 вызова
+    assert [len(r) for r in node.requests] == [2, 1]
+    assert [len(c[3]) for r in node.requests for c in r] == [1000, 1000, 500]
+    assert len(sums) == 2500
+    assert sums["addr0"]["total_satoshis"] == 10_005
+    assert sums["addr0"]["utxo_count"] == 2
+    assert sums["addr0"]["total_btc"] == Decimal("0.00010005")
+    assert sums["addr2499"]["total_btc"] == Decimal(21_000_000)
+    assert sums["addr1"]["utxo_count"] == 0
+    assert "stranger" not in sums
+
+
+def test_get_utxo_sums_returns_none_on_rpc_error(capsys):
+    a, _ = analyzer({"listunspent": lambda *p: {"error": {"code": -8, "message": "boom"}}})
+    assert a.get_utxo_sums([A1, A2]) is None
+    assert a.get_address_utxo_sum(A1) is None
+    assert "boom" in capsys.readouterr().out
+
+
+def test_wallet_overview_is_one_request():
+    a, node = analyzer({
+        "getblockchaininfo": lambda: {"chain": "test", "blocks": 2_500_000},
+        "getbalance": lambda: Decimal("1.23456789"),
+        "listreceivedbyaddress": lambda minconf, empty: [
+            {"address": A1, "amount": Decimal("0.5"), "confirmations": 1, "label": ""}],
+    })
+    overview = a.get_wallet_overview()
+    assert len(node.requests) == 1
+    assert overview["chain"] == "test" and overview["blocks"] == 2_500_000
+    assert overview["total_balance_sat"] == 123_456_789
+    assert overview["addresses"] == [{"address": A1, "amount": Decimal("0.5"), "confirmations": 1}]
+
+
+def test_connect_makes_no_requests():
+    a = wallet.BitcoinWalletAnalyzer("u", "p", rpc_port=18332, wallet_name="w")
+    assert a.connect()
+    assert a.rpc_url.endswith(":18332/wallet/w")
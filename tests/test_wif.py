@@ -0,0 +1,100 @@
+import pytest
+from bip_utils import Bip39SeedGenerator, Bip84, Bip84Coins
+
+import wif
+from derive import XpubSource
+from progress import Checkpoint, ScanStats, targets_digest
+
+SEED = Bip39SeedGenerator("abandon abandon abandon abandon abandon abandon abandon abandon "
+                          "abandon abandon abandon about").Generate()
+XPUB = Bip84.FromSeed(SEED, Bip84Coins.BITCOIN_TESTNET).Purpose().Coin().Account(0).PublicKey().ToExtended()
+
+
+@pytest.mark.parametrize("argv, message", [
+    (["--index", "i.idx", "--addr", "tb1q", "--checkpoint", "c.json"], "--checkpoint"),
+    (["--index", "i.idx", "--addr", "tb1q", "--checkpoint", "c.json", "--resume"], "--checkpoint, --resume"),
+    (["--index", "i.idx", "--addr", "tb1q", "--xpub", XPUB], "--xpub"),
+    (["--index", "i.idx", "--build-index", "j.idx"], "--build-index"),
+    (["--index", "i.idx", "--discover", "--history", "h"], "--discover"),
+    (["--discover", "--history", "h", "--build-index", "j.idx"], "--build-index"),
+    (["--resume"], "--resume requires --checkpoint"),
+    (["--scan", "10"], "--addr"),
+])
+def test_conflicting_flags_are_rejected(capsys, argv, message):
+    with pytest.raises(SystemExit) as e:
+        wif.parse_args(argv)
+    assert e.value.code == 2
+    assert message in capsys.readouterr().err
+
+
+def test_valid_flag_sets_parse():
+    assert wif.parse_args(["--index", "i.idx", "--addr", "tb1q"]).index == "i.idx"
+    args = wif.parse_args(["--xpub", XPUB, "--addr", "tb1q", "--checkpoint", "c.json", "--resume"])
+    assert args.resume and args.checkpoint == "c.json"
+    assert wif.parse_args(["--build-index", "j.idx"]).build_index == "j.idx"
+
+
+def _setup(tmp_path, target_index=1234, scan=1999, chunk=100):
+    source = XpubSource(XPUB, "BIP84")
+    target = source.chain("BIP84", 0, 0).hash160(target_index)
+    targets = frozenset([target])
+    shards = list(wif.iter_shards(source, 0, scan, False, chunk))
+    params = {"source": source.fingerprint().hex(), "scan": scan, "chunk": chunk,
+              "targets": targets_digest(targets)}
+    return source, targets, shards, params, str(tmp_path / "cp.json")
+
+
+def test_resume_skips_finished_shards(tmp_path, monkeypatch):
+    source, targets, shards, params, path = _setup(tmp_path)
+
+    # первый запуск «прерван» после пяти шардов
+    first = Checkpoint(path, params)
+    stats = ScanStats(2000)
+    assert wif.search(source, targets, shards[:5], 1, stats, checkpoint=first) == []
+    assert len(first.done) == 5 and first.checked == 500
+
+    scanned = []
+    real = wif._scan_shard
+
+    def spy(shard):
+        scanned.append(shard[:4])
+        return real(shard)
+
+    monkeypatch.setattr(wif, "_scan_shard", spy)
+    resumed = Checkpoint(path, params)
+    resumed.load()
+    stats = ScanStats(2000, resumed.checked)
+    found = wif.search(source, targets, shards, 1, stats, checkpoint=resumed)
+    assert found == [("BIP84", 0, 0, 1234)]
+    assert not set(scanned) & {s[:4] for s in shards[:5]}
+    assert scanned[0] == shards[5][:4] and scanned[-1] == ("BIP84", 0, 0, 1200)
+    # 500 из чекпоинта + шарды 500..1199 + индексы 1200..1234 (цель одна — стоп)
+    assert stats.checked == 1235
+
+    # всё найдено — третий запуск не сканирует ничего и отдаёт находку из чекпоинта
+    scanned.clear()
+    again = Checkpoint(path, params)
+    again.load()
+    assert wif.search(source, targets, shards, 1, ScanStats(2000, again.checked), checkpoint=again) == found
+    assert scanned == []
+
+
+@pytest.mark.parametrize("change", [{"scan": 2999}, {"chunk": 50}, {"targets": "00" * 32}])
+def test_resume_refuses_checkpoint_with_other_params(tmp_path, change):
+    source, targets, shards, params, path = _setup(tmp_path)
+    cp = Checkpoint(path, params)
+    wif.search(source, targets, shards[:2], 1, ScanStats(2000), checkpoint=cp)
+    other = Checkpoint(path, dict(params, **change))
+    with pytest.raises(ValueError, match="другими параметрами"):
+        other.load()
+    assert other.done == set() and other.checked == 0
+
+
+def test_scan_stats_eta_and_shares():
+    stats = ScanStats(total_keys=1000, done_keys=400)
+    stats.add(100, (3.0, 1.0, 0.0))
+    d = stats.as_dict()
+    assert d["checked"] == 500 and d["total"] == 1000
+    assert d["stages_share"] == {"derive": 0.75, "hash": 0.25, "compare": 0.0}
+    # скорость — только по ключам этого запуска, без учтённых из чекпоинта
+    assert stats.keys_per_sec() == pytest.approx(100 / stats.elapsed(), rel=0.1)